@@ -1,60 +1,713 @@
-import time
+import json
+import mmap
 import os
+import time
+import zlib
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+BLOCK_SIZE_IN_BYTES = 64 * 1024
+INDEX_FILE_NAME = ".cache_index.jsonl"
 
 
 class Cache:
-    def __init__(self, cache_working_directory: Path):
+    """
+    Files are cached in fixed-size blocks. The cached copy of a file is a sparse file in the cache working directory,
+    and only the blocks recorded in `resident_blocks` hold valid content.
+
+    The index of the cache, which is the version, size, resident blocks, block checksums and validation timestamp of
+    every entry, is kept in `INDEX_FILE_NAME` in the cache working directory and loaded again when the cache is
+    created, so a restarted client only has to validate its entries instead of fetching them again. Every change of an
+    entry is appended to the index after the cached copy is written, with the CRC-32 of the blocks the change touched,
+    so a change costs as much as the blocks it touched however large the file is. Loading the index does not read the
+    cached copies. Instead, each block is checked against its checksum the first time it is looked up afterwards, and a
+    block that no longer matches, as after a crash between the two writes, is dropped and fetched again. The index is
+    rewritten without the superseded records when it is loaded and once it has grown to several times the number of
+    entries.
+
+    The cache can be limited to `maximum_size_in_bytes` of resident blocks and to `maximum_number_of_files` entries,
+    where 0 means no limit. Entries are evicted with a segmented LRU policy. New entries start in a probationary
+    segment and are promoted to a protected segment when they are read a second time, so files that are read once,
+    such as by a scan over a directory, are evicted before files that are read repeatedly. The protected segment is
+    limited to `PROTECTED_FRACTION` of the capacity, and its least recently used entries are moved back to the
+    probationary segment once it is full. Pinned files are never evicted.
+
+    Files of up to `maximum_memory_file_size_in_bytes` that are read from the cache are also kept in memory, up to
+    `maximum_memory_size_in_bytes` in total with the least recently read evicted first, so repeated reads of hot files
+    are served without opening the cached copy. Larger files are read through a memory map of their cached copy
+    instead, for up to `maximum_number_of_mapped_files` files with the least recently read unmapped first, so repeated
+    reads of ranges of a large file are served from the page cache without a seek and read each. The copy in memory and
+    the mapping are dropped whenever the cached copy changes.
+
+    Writes made with `write_to_cache` only change the cached copy and are kept as dirty ranges until they are sent to
+    the server and marked as flushed. Dirty ranges are recorded in the index, so they survive a restart, and entries
+    with dirty ranges are never evicted.
+    """
+
+    MINIMUM_NUMBER_OF_INDEX_RECORDS_BEFORE_COMPACTION = 1024
+    PROTECTED_FRACTION = 0.8
+
+    def __init__(
+        self,
+        cache_working_directory: Path,
+        block_size_in_bytes: int = BLOCK_SIZE_IN_BYTES,
+        maximum_size_in_bytes: int = 0,
+        maximum_number_of_files: int = 0,
+        pinned_file_paths: Iterable[Path] = (),
+        maximum_memory_size_in_bytes: int = 16 * 1024 * 1024,
+        maximum_memory_file_size_in_bytes: int = 1024 * 1024,
+        maximum_number_of_mapped_files: int = 64,
+    ):
         self.cache_working_directory: Path = cache_working_directory
+        self.block_size_in_bytes: int = block_size_in_bytes
+        self.maximum_size_in_bytes: int = maximum_size_in_bytes
+        self.maximum_number_of_files: int = maximum_number_of_files
+        self.pinned_file_paths: Set[Path] = set(pinned_file_paths)
         self.validation_timestamps: Dict[Path, int] = {}
-        self.modification_timestamps: Dict[Path, int] = {}
+        self.versions: Dict[Path, int] = {}
+        self.file_sizes: Dict[Path, int] = {}
+        self.resident_blocks: Dict[Path, Set[int]] = {}
+        # CRC-32 of every resident block of the cached copy of each file, as recorded in the index.
+        self.block_checksums: Dict[Path, Dict[int, int]] = {}
+        # Blocks loaded from the index that have not been checked against their checksums yet.
+        self.unverified_blocks: Dict[Path, Set[int]] = {}
+        self.index_file_path: Path = cache_working_directory / INDEX_FILE_NAME
+        self.number_of_index_records: int = 0
+        # Both segments are ordered from least to most recently used. Probationary entries map to the number of times
+        # they were read.
+        self.probationary_file_paths: OrderedDict[Path, int] = OrderedDict()
+        self.protected_file_paths: OrderedDict[Path, None] = OrderedDict()
+        # Bytes held by the resident blocks of each entry.
+        self.resident_sizes_in_bytes: Dict[Path, int] = {}
+        self.size_in_bytes: int = 0
+        self.protected_size_in_bytes: int = 0
+        self.number_of_evictions: int = 0
+        self.maximum_memory_size_in_bytes: int = maximum_memory_size_in_bytes
+        self.maximum_memory_file_size_in_bytes: int = maximum_memory_file_size_in_bytes
+        # Content of the cached copies kept in memory, ordered from least to most recently read.
+        self.file_contents_in_memory: OrderedDict[Path, bytes] = OrderedDict()
+        self.memory_size_in_bytes: int = 0
+        self.maximum_number_of_mapped_files: int = maximum_number_of_mapped_files
+        # Memory maps of the cached copies of larger files, ordered from least to most recently read.
+        self.mapped_files: OrderedDict[Path, mmap.mmap] = OrderedDict()
+        self.number_of_memory_hits: int = 0
+        self.number_of_memory_misses: int = 0
+        # Ranges of the cached copies written to but not yet sent to the server, as sorted, disjoint and non-adjacent
+        # (offset, number_of_bytes) pairs.
+        self.dirty_ranges: Dict[Path, List[Tuple[int, int]]] = {}
+        self._load_index()
 
     def is_in_cache(self, file_path: Path) -> bool:
         return file_path in self.validation_timestamps
 
-    def put_in_cache(
-        self, file_path: Path, file_content: bytes, validation_timestamp: int, modification_timestamp: int
-    ) -> None:
+    def get_file_paths(self) -> List[Path]:
+        return list(self.validation_timestamps)
+
+    def is_older_than_cached_copy(self, file_path: Path, version: int) -> bool:
+        """
+        Versions only grow on the server, so content of a lower version than the cached copy arrived late.
+        """
+        return self.is_in_cache(file_path) and version < self.versions[file_path]
+
+    def put_in_cache(self, file_path: Path, file_content: bytes, validation_timestamp: int, version: int) -> bool:
+        """
+        Returns whether the content was cached, which it is not if it is older than the cached copy.
+        """
+        if self.is_older_than_cached_copy(file_path, version):
+            logger.debug(f"Dropping version {version} of {file_path}, as version {self.versions[file_path]} is cached.")
+            return False
+        self._remove_from_memory(file_path)
         full_file_path = self.cache_working_directory.joinpath(file_path)
         full_file_path.parent.mkdir(parents=True, exist_ok=True)
         with open(full_file_path, "wb") as file:
             file.write(file_content)
 
         self.validation_timestamps[file_path] = validation_timestamp
-        self.modification_timestamps[file_path] = modification_timestamp
+        self.versions[file_path] = version
+        self.file_sizes[file_path] = len(file_content)
+        self.resident_blocks[file_path] = set(range(self._get_number_of_blocks(len(file_content))))
+        self.block_checksums[file_path] = {}
+        self.unverified_blocks.pop(file_path, None)
+        self._record_in_index(file_path, self._update_block_checksums(file_path, 0, len(file_content)))
+        self._admit(file_path)
+        return True
 
-    def remove_from_cache(self, file_path: Path) -> None:
+    def put_range_in_cache(
+        self,
+        file_path: Path,
+        offset: int,
+        file_content: bytes,
+        file_size: int,
+        validation_timestamp: int,
+        version: int,
+    ) -> bool:
+        """
+        Caches a range of a file. Blocks cached for an older version of the file are discarded first, and a range of an
+        older version than the cached copy is dropped. Returns whether the range was cached.
+        """
+        if self.is_older_than_cached_copy(file_path, version):
+            logger.debug(f"Dropping version {version} of {file_path}, as version {self.versions[file_path]} is cached.")
+            return False
+        self._remove_from_memory(file_path)
         full_file_path = self.cache_working_directory.joinpath(file_path)
         full_file_path.parent.mkdir(parents=True, exist_ok=True)
-        os.remove(full_file_path)
+        if not self.is_in_cache(file_path) or self.versions[file_path] != version:
+            with open(full_file_path, "wb"):
+                pass
+            self.resident_blocks[file_path] = set()
+            self.block_checksums[file_path] = {}
+            self.unverified_blocks.pop(file_path, None)
+        else:
+            # Blocks the range only partly covers keep the rest of their content, which has to be checked first.
+            self._verify_blocks(file_path, offset, len(file_content))
+
+        with open(full_file_path, "r+b") as file:
+            file.seek(offset)
+            file.write(file_content)
+            file.truncate(file_size)
+
+        self.validation_timestamps[file_path] = validation_timestamp
+        self.versions[file_path] = version
+        self.file_sizes[file_path] = file_size
+        self._mark_range_as_resident(file_path, offset, len(file_content), previous_file_size=file_size)
+        self._record_in_index(file_path, self._update_block_checksums(file_path, offset, len(file_content)))
+        self._admit(file_path)
+        return True
+
+    def remove_from_cache(self, file_path: Path) -> None:
+        self._remove_from_memory(file_path)
+        full_file_path = self.cache_working_directory.joinpath(file_path)
+        full_file_path.unlink(missing_ok=True)
 
         del self.validation_timestamps[file_path]
-        del self.modification_timestamps[file_path]
+        del self.versions[file_path]
+        self.file_sizes.pop(file_path, None)
+        self.resident_blocks.pop(file_path, None)
+        self.block_checksums.pop(file_path, None)
+        self.unverified_blocks.pop(file_path, None)
+        self.dirty_ranges.pop(file_path, None)
+        self._append_to_index([{"path": file_path.as_posix(), "is_removed": True}])
+        self._set_resident_size(file_path, 0)
+        del self.resident_sizes_in_bytes[file_path]
+        self.probationary_file_paths.pop(file_path, None)
+        self.protected_file_paths.pop(file_path, None)
 
     def update_cache_after_write(self, file_path: Path, offset: int, file_content: bytes) -> None:
+        self._record_in_index(file_path, self._write_to_cached_copy(file_path, offset, file_content))
+        self._admit(file_path)
+
+    def write_to_cache(self, file_path: Path, offset: int, file_content: bytes) -> None:
+        """
+        Writes to the cached copy only. The range is merged with the overlapping and adjacent dirty ranges of the file,
+        so that it is sent to the server together with them.
+        """
+        changed_block_checksums: Dict[int, int] = self._write_to_cached_copy(file_path, offset, file_content)
+        dirty_ranges: List[Tuple[int, int]] = []
+        start, end = offset, offset + len(file_content)
+        for dirty_range_offset, dirty_range_number_of_bytes in self.dirty_ranges.get(file_path, []):
+            dirty_range_end: int = dirty_range_offset + dirty_range_number_of_bytes
+            if dirty_range_end < start or dirty_range_offset > end:
+                dirty_ranges.append((dirty_range_offset, dirty_range_number_of_bytes))
+            else:
+                start, end = min(start, dirty_range_offset), max(end, dirty_range_end)
+        dirty_ranges.append((start, end - start))
+        self.dirty_ranges[file_path] = sorted(dirty_ranges)
+        self._record_in_index(file_path, changed_block_checksums)
+        self._admit(file_path)
+
+    def is_dirty(self, file_path: Path) -> bool:
+        return file_path in self.dirty_ranges
+
+    def get_dirty_file_paths(self) -> List[Path]:
+        return list(self.dirty_ranges)
+
+    def get_dirty_size(self) -> int:
+        return sum(
+            number_of_bytes for dirty_ranges in self.dirty_ranges.values() for _, number_of_bytes in dirty_ranges
+        )
+
+    def get_dirty_writes(self, file_path: Path, maximum_gap_in_bytes: int = 0) -> List[Tuple[int, bytes]]:
+        """
+        Returns the (offset, content) of every dirty range of the file, read from the cached copy. Dirty ranges that
+        are at most `maximum_gap_in_bytes` apart, with only resident blocks between them, are returned as a single
+        write that includes the content in between. That content is the same on the server as long as the file is at
+        the version of the cached copy, which is the condition the writes are sent with.
+        """
+        merged_ranges: List[Tuple[int, int]] = []
+        for offset, number_of_bytes in self.dirty_ranges.get(file_path, []):
+            if merged_ranges:
+                previous_offset, previous_number_of_bytes = merged_ranges[-1]
+                gap_start: int = previous_offset + previous_number_of_bytes
+                if offset - gap_start <= maximum_gap_in_bytes and not self.get_missing_ranges(
+                    file_path, gap_start, offset - gap_start
+                ):
+                    merged_ranges[-1] = (previous_offset, offset + number_of_bytes - previous_offset)
+                    continue
+            merged_ranges.append((offset, number_of_bytes))
+
+        full_file_path = self.cache_working_directory.joinpath(file_path)
+        dirty_writes: List[Tuple[int, bytes]] = []
+        with open(full_file_path, "rb") as file:
+            for offset, number_of_bytes in merged_ranges:
+                file.seek(offset)
+                dirty_writes.append((offset, file.read(number_of_bytes)))
+        return dirty_writes
+
+    def mark_as_flushed(self, file_path: Path, offset: int, number_of_bytes: int, version: int) -> None:
+        """
+        Called once the dirty ranges within the range were written to the server, which made the file the given
+        version.
+        """
+        self.dirty_ranges[file_path] = [
+            (dirty_range_offset, dirty_range_number_of_bytes)
+            for dirty_range_offset, dirty_range_number_of_bytes in self.dirty_ranges[file_path]
+            if dirty_range_offset < offset
+            or dirty_range_offset + dirty_range_number_of_bytes > offset + number_of_bytes
+        ]
+        if not self.dirty_ranges[file_path]:
+            del self.dirty_ranges[file_path]
+        self.versions[file_path] = version
+        self.validation_timestamps[file_path] = int(time.time())
+        self._record_in_index(file_path, {})
+
+    def _write_to_cached_copy(self, file_path: Path, offset: int, file_content: bytes) -> Dict[int, int]:
+        """
+        Returns the checksums of the blocks that changed.
+        """
+        self._remove_from_memory(file_path)
+        self._verify_blocks(file_path, offset, len(file_content))
         full_file_path = self.cache_working_directory.joinpath(file_path)
         full_file_path.parent.mkdir(parents=True, exist_ok=True)
         with open(full_file_path, "r+b") as file:
             file.seek(offset)
             file.write(file_content)
 
+        previous_file_size: int = self.file_sizes[file_path]
+        self.file_sizes[file_path] = max(previous_file_size, offset + len(file_content))
+        self._mark_range_as_resident(file_path, offset, len(file_content), previous_file_size)
+        return self._update_block_checksums(file_path, offset, len(file_content))
+
+    def apply_update(
+        self,
+        file_path: Path,
+        offset: int,
+        file_content: bytes,
+        validation_timestamp: int,
+        version: int,
+    ) -> None:
+        """
+        Applies a change made on the server to the cached copy, which becomes the copy of the given version.
+        """
+        changed_block_checksums: Dict[int, int] = self._write_to_cached_copy(file_path, offset, file_content)
+        self.validation_timestamps[file_path] = validation_timestamp
+        self.versions[file_path] = version
+        self._record_in_index(file_path, changed_block_checksums)
+        self._admit(file_path)
+
     def update_cache_after_append(self, file_path: Path, file_content: bytes) -> None:
-        full_file_path = self.cache_working_directory.joinpath(file_path)
-        full_file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(full_file_path, "ab") as file:
-            file.write(file_content)
+        self.update_cache_after_write(file_path, self.file_sizes[file_path], file_content)
+
+    def get_missing_ranges(self, file_path: Path, offset: int, number_of_bytes: int) -> List[Tuple[int, int]]:
+        """
+        Returns the block-aligned (offset, number_of_bytes) ranges that have to be fetched before the requested range
+        can be read from the cache. Adjacent missing blocks are coalesced into a single range. Blocks of the range that
+        were loaded from the index are checked against their checksums first.
+        """
+        end: int = min(offset + number_of_bytes, self.file_sizes[file_path])
+        if offset >= end:
+            return []
+        self._verify_blocks(file_path, offset, end - offset)
+        resident_blocks: Set[int] = self.resident_blocks[file_path]
+        missing_ranges: List[Tuple[int, int]] = []
+        for block_number in range(offset // self.block_size_in_bytes, (end - 1) // self.block_size_in_bytes + 1):
+            if block_number in resident_blocks:
+                continue
+            block_offset: int = block_number * self.block_size_in_bytes
+            if missing_ranges and sum(missing_ranges[-1]) == block_offset:
+                previous_offset, previous_number_of_bytes = missing_ranges.pop()
+                missing_ranges.append((previous_offset, previous_number_of_bytes + self.block_size_in_bytes))
+            else:
+                missing_ranges.append((block_offset, self.block_size_in_bytes))
+        return missing_ranges
+
+    def get_resident_ranges(self, file_path: Path, offset: int, number_of_bytes: int) -> List[Tuple[int, int]]:
+        """
+        Returns the (offset, number_of_bytes) ranges of the requested range that are cached, with adjacent resident
+        blocks coalesced into a single range.
+        """
+        end: int = min(offset + number_of_bytes, self.file_sizes[file_path])
+        resident_ranges: List[Tuple[int, int]] = []
+        position: int = offset
+        for missing_offset, missing_number_of_bytes in self.get_missing_ranges(file_path, offset, number_of_bytes):
+            if position < missing_offset:
+                resident_ranges.append((position, missing_offset - position))
+            position = max(position, missing_offset + missing_number_of_bytes)
+        if position < end:
+            resident_ranges.append((position, end - position))
+        return resident_ranges
+
+    def get_file_content(self, file_path: Path, offset: int = 0, number_of_bytes: int = -1) -> bytes:
+        self._promote(file_path)
+        end: int = offset + number_of_bytes if number_of_bytes >= 0 else self.file_sizes[file_path]
+        if file_path in self.file_contents_in_memory:
+            self.file_contents_in_memory.move_to_end(file_path)
+            self.number_of_memory_hits += 1
+            return self.file_contents_in_memory[file_path][offset:end]
+        if file_path in self.mapped_files:
+            self.mapped_files.move_to_end(file_path)
+            self.number_of_memory_hits += 1
+            return self.mapped_files[file_path][offset:end]
+        self.number_of_memory_misses += 1
 
-    def get_file_content(self, file_path: Path) -> bytes:
         full_file_path = self.cache_working_directory.joinpath(file_path)
         with open(full_file_path, "rb") as file:
-            return file.read()
+            if not self._can_keep_in_memory(self.file_sizes[file_path]):
+                if self.maximum_number_of_mapped_files <= 0 or self.file_sizes[file_path] == 0:
+                    file.seek(offset)
+                    return file.read(number_of_bytes)
+                mapping: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.mapped_files[file_path] = mapping
+                if len(self.mapped_files) > self.maximum_number_of_mapped_files:
+                    self._remove_from_memory(next(iter(self.mapped_files)))
+                return mapping[offset:end]
+            file_content: bytes = file.read()
+        self.file_contents_in_memory[file_path] = file_content
+        self.memory_size_in_bytes += len(file_content)
+        while self.memory_size_in_bytes > self.maximum_memory_size_in_bytes:
+            self._remove_from_memory(next(iter(self.file_contents_in_memory)))
+        return file_content[offset:end]
 
     def get_validation_timestamp(self, file_path: Path) -> int:
         return self.validation_timestamps[file_path]
 
     def validate_cache_for(self, file_path: Path) -> None:
         self.validation_timestamps[file_path] = int(time.time())
+        self._record_in_index(file_path, {})
+
+    def invalidate_cache_for(self, file_path: Path) -> None:
+        """
+        Keeps the cached blocks, but the entry is validated with the server before it is read again.
+        """
+        if file_path in self.validation_timestamps:
+            self.validation_timestamps[file_path] = 0
+            self._record_in_index(file_path, {})
+
+    def get_version(self, file_path: Path) -> int:
+        return self.versions[file_path]
+
+    def get_file_size(self, file_path: Path) -> int:
+        return self.file_sizes[file_path]
+
+    def pin(self, file_path: Path) -> None:
+        self.pinned_file_paths.add(file_path)
+
+    def unpin(self, file_path: Path) -> None:
+        self.pinned_file_paths.discard(file_path)
+        self._evict(excluded_file_path=None)
+
+    def get_statistics(self) -> Dict[str, int]:
+        return {
+            "number_of_files": len(self.validation_timestamps),
+            "size_in_bytes": self.size_in_bytes,
+            "number_of_protected_files": len(self.protected_file_paths),
+            "number_of_pinned_files": len(self.pinned_file_paths & self.validation_timestamps.keys()),
+            "number_of_evictions": self.number_of_evictions,
+            "number_of_files_in_memory": len(self.file_contents_in_memory),
+            "memory_size_in_bytes": self.memory_size_in_bytes,
+            "number_of_mapped_files": len(self.mapped_files),
+            "number_of_memory_hits": self.number_of_memory_hits,
+            "number_of_memory_misses": self.number_of_memory_misses,
+        }
+
+    def _can_keep_in_memory(self, file_size: int) -> bool:
+        return file_size <= min(self.maximum_memory_file_size_in_bytes, self.maximum_memory_size_in_bytes)
+
+    def _remove_from_memory(self, file_path: Path) -> None:
+        file_content: Optional[bytes] = self.file_contents_in_memory.pop(file_path, None)
+        if file_content is not None:
+            self.memory_size_in_bytes -= len(file_content)
+        mapping: Optional[mmap.mmap] = self.mapped_files.pop(file_path, None)
+        if mapping is not None:
+            mapping.close()
 
-    def get_modification_timestamp(self, file_path: Path) -> int:
-        return self.modification_timestamps[file_path]
+    def _admit(self, file_path: Path) -> None:
+        """
+        Called after an entry was added or changed. Other entries are evicted if the cache is over capacity, but not
+        this one, as the caller is still using it.
+        """
+        self._set_resident_size(file_path, self._get_resident_size(file_path))
+        if file_path in self.protected_file_paths:
+            self.protected_file_paths.move_to_end(file_path)
+        else:
+            self.probationary_file_paths[file_path] = self.probationary_file_paths.get(file_path, 0)
+            self.probationary_file_paths.move_to_end(file_path)
+        self._evict(excluded_file_path=file_path)
+
+    def _promote(self, file_path: Path) -> None:
+        if file_path in self.protected_file_paths:
+            self.protected_file_paths.move_to_end(file_path)
+            return
+        # The first read is usually the one that fetched the file.
+        self.probationary_file_paths[file_path] += 1
+        self.probationary_file_paths.move_to_end(file_path)
+        if self.probationary_file_paths[file_path] < 2:
+            return
+        del self.probationary_file_paths[file_path]
+        self.protected_file_paths[file_path] = None
+        self.protected_size_in_bytes += self.resident_sizes_in_bytes[file_path]
+        while len(self.protected_file_paths) > 1 and (
+            self._is_over_capacity(
+                self.protected_size_in_bytes, len(self.protected_file_paths), fraction=self.PROTECTED_FRACTION
+            )
+        ):
+            demoted_file_path, _ = self.protected_file_paths.popitem(last=False)
+            self.protected_size_in_bytes -= self.resident_sizes_in_bytes[demoted_file_path]
+            self.probationary_file_paths[demoted_file_path] = 0
+
+    def _evict(self, excluded_file_path: Optional[Path]) -> None:
+        while self._is_over_capacity(self.size_in_bytes, len(self.validation_timestamps)):
+            evicted_file_path: Optional[Path] = next(
+                (
+                    file_path
+                    for segment in (self.probationary_file_paths, self.protected_file_paths)
+                    for file_path in segment
+                    if file_path != excluded_file_path
+                    and file_path not in self.pinned_file_paths
+                    and file_path not in self.dirty_ranges
+                ),
+                None,
+            )
+            if evicted_file_path is None:
+                return
+            logger.debug(f"Evicting {evicted_file_path} from the cache.")
+            self.remove_from_cache(evicted_file_path)
+            self.number_of_evictions += 1
+
+    def _is_over_capacity(self, size_in_bytes: int, number_of_files: int, fraction: float = 1.0) -> bool:
+        return (0 < self.maximum_size_in_bytes * fraction < size_in_bytes) or (
+            0 < self.maximum_number_of_files * fraction < number_of_files
+        )
+
+    def _set_resident_size(self, file_path: Path, resident_size_in_bytes: int) -> None:
+        size_difference_in_bytes: int = resident_size_in_bytes - self.resident_sizes_in_bytes.get(file_path, 0)
+        self.resident_sizes_in_bytes[file_path] = resident_size_in_bytes
+        self.size_in_bytes += size_difference_in_bytes
+        if file_path in self.protected_file_paths:
+            self.protected_size_in_bytes += size_difference_in_bytes
+
+    def _get_resident_size(self, file_path: Path) -> int:
+        resident_blocks: Set[int] = self.resident_blocks[file_path]
+        resident_size_in_bytes: int = len(resident_blocks) * self.block_size_in_bytes
+        file_size: int = self.file_sizes[file_path]
+        if file_size and (file_size - 1) // self.block_size_in_bytes in resident_blocks:
+            resident_size_in_bytes -= -file_size % self.block_size_in_bytes
+        return resident_size_in_bytes
+
+    def _load_index(self) -> None:
+        """
+        Later records of an entry replace earlier ones, except for the block checksums, as each record only holds those
+        of the blocks its change touched. A record that cannot be parsed, as the last one would be if the client
+        stopped while appending it, is skipped. Resident blocks without a checksum are dropped.
+        """
+        if not self.index_file_path.exists():
+            return
+        index_records: Dict[str, dict] = {}
+        block_checksums: Dict[str, Dict[int, int]] = {}
+        with open(self.index_file_path, "r", encoding="utf-8") as index_file:
+            for line in index_file:
+                try:
+                    index_record: dict = json.loads(line)
+                    relative_file_path: str = index_record["path"]
+                    changed_block_checksums: Dict[int, int] = {
+                        block_number: checksum for block_number, checksum in index_record.get("block_checksums", [])
+                    }
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Skipping a damaged record in the cache index {self.index_file_path}.")
+                    continue
+                index_records[relative_file_path] = index_record
+                if index_record.get("is_removed"):
+                    block_checksums.pop(relative_file_path, None)
+                else:
+                    block_checksums.setdefault(relative_file_path, {}).update(changed_block_checksums)
+
+        for relative_file_path, index_record in index_records.items():
+            if index_record.get("is_removed"):
+                continue
+            file_path: Path = Path(relative_file_path)
+            if not self.cache_working_directory.joinpath(file_path).exists():
+                logger.warning(f"Cached copy of {file_path} is missing and its cache index entry is dropped.")
+                continue
+            try:
+                self.validation_timestamps[file_path] = index_record["validation_timestamp"]
+                self.versions[file_path] = index_record["version"]
+                self.file_sizes[file_path] = index_record["file_size"]
+                self.resident_blocks[file_path] = {
+                    block_number
+                    for first_block_number, last_block_number in index_record["resident_blocks"]
+                    for block_number in range(first_block_number, last_block_number + 1)
+                    if block_number in block_checksums[relative_file_path]
+                }
+                self.block_checksums[file_path] = {
+                    block_number: block_checksums[relative_file_path][block_number]
+                    for block_number in self.resident_blocks[file_path]
+                }
+                self.unverified_blocks[file_path] = set(self.resident_blocks[file_path])
+                if index_record.get("dirty_ranges"):
+                    self.dirty_ranges[file_path] = [
+                        (dirty_range_offset, dirty_range_number_of_bytes)
+                        for dirty_range_offset, dirty_range_number_of_bytes in index_record["dirty_ranges"]
+                    ]
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Skipping the damaged cache index entry of {file_path}.")
+                for entries in (self.validation_timestamps, self.versions, self.file_sizes, self.resident_blocks):
+                    entries.pop(file_path, None)
+                self.block_checksums.pop(file_path, None)
+                self.unverified_blocks.pop(file_path, None)
+        logger.info(f"Loaded {len(self.validation_timestamps)} entries from the cache index {self.index_file_path}.")
+        for file_path in sorted(self.validation_timestamps, key=self.validation_timestamps.__getitem__):
+            self._set_resident_size(file_path, self._get_resident_size(file_path))
+            self.probationary_file_paths[file_path] = 0
+        self._evict(excluded_file_path=None)
+        self._compact_index()
+
+    def _record_in_index(self, file_path: Path, changed_block_checksums: Dict[int, int]) -> None:
+        self._append_to_index([self._get_index_record(file_path, changed_block_checksums)])
+        if self.number_of_index_records > max(
+            self.MINIMUM_NUMBER_OF_INDEX_RECORDS_BEFORE_COMPACTION, 4 * len(self.validation_timestamps)
+        ):
+            self._compact_index()
+
+    def _get_index_record(self, file_path: Path, block_checksums: Dict[int, int]) -> dict:
+        # Resident blocks are stored as runs of consecutive block numbers, as most files are cached as a whole.
+        resident_block_runs: List[List[int]] = []
+        for block_number in sorted(self.resident_blocks[file_path]):
+            if resident_block_runs and resident_block_runs[-1][1] == block_number - 1:
+                resident_block_runs[-1][1] = block_number
+            else:
+                resident_block_runs.append([block_number, block_number])
+        index_record: dict = {
+            "path": file_path.as_posix(),
+            "version": self.versions[file_path],
+            "file_size": self.file_sizes[file_path],
+            "resident_blocks": resident_block_runs,
+            "block_checksums": sorted(block_checksums.items()),
+            "validation_timestamp": self.validation_timestamps[file_path],
+        }
+        if file_path in self.dirty_ranges:
+            index_record["dirty_ranges"] = self.dirty_ranges[file_path]
+        return index_record
+
+    def _append_to_index(self, index_records: List[dict]) -> None:
+        self.cache_working_directory.mkdir(parents=True, exist_ok=True)
+        with open(self.index_file_path, "a", encoding="utf-8") as index_file:
+            for index_record in index_records:
+                index_file.write(json.dumps(index_record, separators=(",", ":")) + "\n")
+        self.number_of_index_records += len(index_records)
+
+    def _compact_index(self) -> None:
+        """
+        The compacted index is written to a temporary file that then replaces the index, so a crash leaves either the
+        old or the new index.
+        """
+        temporary_index_file_path: Path = self.index_file_path.with_name(INDEX_FILE_NAME + ".tmp")
+        with open(temporary_index_file_path, "w", encoding="utf-8") as index_file:
+            for file_path in self.validation_timestamps:
+                index_record: dict = self._get_index_record(file_path, self.block_checksums[file_path])
+                index_file.write(json.dumps(index_record, separators=(",", ":")) + "\n")
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(temporary_index_file_path, self.index_file_path)
+        self.number_of_index_records = len(self.validation_timestamps)
+
+    def _update_block_checksums(self, file_path: Path, offset: int, number_of_bytes: int) -> Dict[int, int]:
+        """
+        Computes the checksums of the resident blocks the range touches again, reading only those blocks from the
+        cached copy, and forgets the checksums of the blocks it touches that are not resident. Returns the checksums
+        that were computed.
+        """
+        changed_block_checksums: Dict[int, int] = {}
+        if number_of_bytes <= 0:
+            return changed_block_checksums
+        block_checksums: Dict[int, int] = self.block_checksums.setdefault(file_path, {})
+        resident_blocks: Set[int] = self.resident_blocks[file_path]
+        with open(self.cache_working_directory.joinpath(file_path), "rb") as file:
+            for block_number in range(
+                offset // self.block_size_in_bytes, (offset + number_of_bytes - 1) // self.block_size_in_bytes + 1
+            ):
+                if block_number not in resident_blocks:
+                    block_checksums.pop(block_number, None)
+                    continue
+                file.seek(block_number * self.block_size_in_bytes)
+                block_checksums[block_number] = zlib.crc32(file.read(self.block_size_in_bytes))
+                changed_block_checksums[block_number] = block_checksums[block_number]
+        return changed_block_checksums
+
+    def _verify_blocks(self, file_path: Path, offset: int, number_of_bytes: int) -> None:
+        """
+        Checks the blocks of the range that were loaded from the index and not checked yet against their checksums.
+        Blocks that do not match are no longer resident.
+        """
+        unverified_blocks: Optional[Set[int]] = self.unverified_blocks.get(file_path)
+        if not unverified_blocks or number_of_bytes <= 0:
+            return
+        block_numbers: List[int] = [
+            block_number
+            for block_number in range(
+                offset // self.block_size_in_bytes, (offset + number_of_bytes - 1) // self.block_size_in_bytes + 1
+            )
+            if block_number in unverified_blocks
+        ]
+        if not block_numbers:
+            return
+        block_checksums: Dict[int, int] = self.block_checksums[file_path]
+        corrupt_block_numbers: List[int] = []
+        with open(self.cache_working_directory.joinpath(file_path), "rb") as file:
+            for block_number in block_numbers:
+                unverified_blocks.discard(block_number)
+                file.seek(block_number * self.block_size_in_bytes)
+                if zlib.crc32(file.read(self.block_size_in_bytes)) != block_checksums[block_number]:
+                    corrupt_block_numbers.append(block_number)
+        if not unverified_blocks:
+            del self.unverified_blocks[file_path]
+        if not corrupt_block_numbers:
+            return
+
+        logger.warning(
+            f"Blocks {corrupt_block_numbers} of the cached copy of {file_path} do not match the cache index."
+        )
+        self._remove_from_memory(file_path)
+        for block_number in corrupt_block_numbers:
+            self.resident_blocks[file_path].discard(block_number)
+            del block_checksums[block_number]
+        self._set_resident_size(file_path, self._get_resident_size(file_path))
+        self._record_in_index(file_path, {})
+
+    def _get_number_of_blocks(self, file_size: int) -> int:
+        return -(-file_size // self.block_size_in_bytes)
+
+    def _mark_range_as_resident(
+        self, file_path: Path, offset: int, number_of_bytes: int, previous_file_size: int
+    ) -> None:
+        """
+        A block is resident when all of its bytes up to the end of the file are valid. That is the case if the new
+        range covers it, or if it was already resident and the new range continues it without leaving a gap.
+        """
+        file_size: int = self.file_sizes[file_path]
+        resident_blocks: Set[int] = self.resident_blocks[file_path]
+        end: int = offset + number_of_bytes
+        first_block_number: int = offset // self.block_size_in_bytes
+        for block_number in range(first_block_number, self._get_number_of_blocks(end)):
+            block_offset: int = block_number * self.block_size_in_bytes
+            block_end: int = min(block_offset + self.block_size_in_bytes, file_size)
+            previous_block_end: int = min(block_offset + self.block_size_in_bytes, previous_file_size)
+            if block_number in resident_blocks:
+                is_resident = previous_block_end >= block_end or (offset <= previous_block_end and end >= block_end)
+            else:
+                is_resident = offset <= block_offset and end >= block_end
+            if is_resident:
+                resident_blocks.add(block_number)
+            else:
+                resident_blocks.discard(block_number)
@@ -3,7 +3,7 @@ from typing import List, Optional
 
 from colorama import init, Fore
 
-from remote_file_system.client_interface import Client
+from remote_file_system.client_interface import Client, WriteConflict
 
 
 class ClientCommandLineInterface:
@@ -14,6 +14,8 @@ class ClientCommandLineInterface:
     append [file_path] [content]
     delete [file_path]
     subscribe [file_path] [monitoring_interval_in_seconds]
+    validate
+    flush
     help
     exit"""
 
@@ -46,6 +48,10 @@ class ClientCommandLineInterface:
             self._parse_delete_command(command_args)
         elif command_type == "subscribe":
             self._parse_subscribe_command(command_args)
+        elif command_type == "validate":
+            self._parse_validate_command(command_args)
+        elif command_type == "flush":
+            self._parse_flush_command(command_args)
         else:
             print(Fore.RED + f"Unrecognised command: {command}")
 
@@ -199,6 +205,32 @@ class ClientCommandLineInterface:
             file_path=file_path, monitoring_interval_in_seconds=monitoring_interval_in_seconds
         )
 
+    def _parse_validate_command(self, command_args: List[str]) -> None:
+        if command_args:
+            print(Fore.RED + "Validate command does not take any arguments.")
+            return
+
+        removed_file_paths: Optional[List[Path]] = self.client.validate_cache()
+        if removed_file_paths is None:
+            print("Validate command was unsuccessful.")
+            return
+        print(f"Validate command was successful. {len(removed_file_paths)} outdated cache entries were removed.")
+
+    def _parse_flush_command(self, command_args: List[str]) -> None:
+        if command_args:
+            print(Fore.RED + "Flush command does not take any arguments.")
+            return
+
+        write_conflicts: Optional[List[WriteConflict]] = self.client.flush()
+        if write_conflicts is None:
+            print("Flush command was unsuccessful.")
+            return
+        print("Flush command was successful.")
+        for write_conflict in write_conflicts:
+            print(
+                Fore.RED + f"Writes to {write_conflict.file_path} were discarded, as the file changed on the server."
+            )
+
     @staticmethod
     def _parse_offset(offset: str) -> int:
         try:
@@ -1,32 +1,76 @@
+import threading
 import time
+import zlib
 from ipaddress import IPv4Address
 from pathlib import Path
-from socket import socket, AF_INET, SOCK_DGRAM, gethostbyname, gethostname, timeout
-from typing import Tuple, Optional
+from socket import gethostbyname, gethostname, timeout
+from typing import Dict, Iterable, List, Sequence, Set, Tuple, Optional
 from uuid import uuid4
 from loguru import logger
 
 from remote_file_system.client_cache import Cache
-from remote_file_system.communications import send_message_and_wait_for_reply
+from remote_file_system.communications import Endpoint, send_message_and_wait_for_reply
+from remote_file_system.compression import get_codec_ids, MINIMUM_COMPRESSED_SIZE_IN_BYTES
+from remote_file_system.delta import (
+    apply_delta,
+    compute_block_hashes,
+    get_block_size,
+    BlockHash,
+    MAXIMUM_SYNCHRONIZED_SIZE_IN_BYTES,
+)
 from remote_file_system.message import (
     Message,
-    ReadFileRequest,
-    ReadFileResponse,
+    ReadFileRangeRequest,
+    ReadFileRangeResponse,
+    ConditionalReadFileRangeRequest,
+    ConditionalWriteFileRequest,
+    NotModifiedResponse,
+    ValidateFilesRequest,
+    ValidateFilesResponse,
+    LeaseRevocationNotification,
     WriteFileRequest,
     WriteFileResponse,
     SubscribeToUpdatesRequest,
     SubscribeToUpdatesResponse,
     UpdateNotification,
-    ModifiedTimestampRequest,
-    ModifiedTimestampResponse,
+    UpdateDeltaNotification,
     DeleteFileRequest,
     DeleteFileResponse,
     AppendFileRequest,
     AppendFileResponse,
+    RenewSubscriptionRequest,
+    RenewSubscriptionResponse,
+    UnsubscribeFromUpdatesRequest,
+    UnsubscribeFromUpdatesResponse,
+    NegotiateCompressionRequest,
+    NegotiateCompressionResponse,
+    SynchronizeFileRangeRequest,
+    SynchronizeFileRangeResponse,
 )
 
 
+class WriteConflict:
+    """
+    Writes kept in the cache that were discarded rather than flushed, as the file changed on the server after it was
+    cached. A server version of 0 means the file no longer exists.
+    """
+
+    def __init__(
+        self, file_path: Path, cached_version: int, server_version: int, unflushed_writes: List[Tuple[int, bytes]]
+    ):
+        self.file_path: Path = file_path
+        self.cached_version: int = cached_version
+        self.server_version: int = server_version
+        # Offset and content of each discarded write.
+        self.unflushed_writes: List[Tuple[int, bytes]] = unflushed_writes
+
+
 class Client:
+    MAXIMUM_ATTEMPTS_TO_FILL_CACHE = 3
+    # Dirty ranges of a file this close to each other are flushed in a single write, if the content between them is
+    # cached.
+    MAXIMUM_FLUSH_GAP_IN_BYTES = 64 * 1024
+
     def __init__(
         self,
         client_port_number: int,
@@ -34,35 +78,230 @@ class Client:
         server_port_number: int,
         cache_working_directory: Path,
         freshness_interval_in_seconds: int,
+        lease_duration_in_seconds: int = 0,
+        maximum_cache_size_in_bytes: int = 0,
+        maximum_number_of_cached_files: int = 0,
+        pinned_file_paths: Iterable[Path] = (),
+        maximum_memory_cache_size_in_bytes: int = 16 * 1024 * 1024,
+        write_back_delay_in_seconds: float = 0,
+        maximum_unflushed_size_in_bytes: int = 1024 * 1024,
+        compression_codec_names: Sequence[str] = (),
+        minimum_compressed_size_in_bytes: int = MINIMUM_COMPRESSED_SIZE_IN_BYTES,
+        minimum_delta_synchronization_size_in_bytes: int = 64 * 1024,
     ):
+        """
+        With a `lease_duration_in_seconds`, the client asks the server for a lease on every file it reads. While it
+        holds the lease, it reads the file from its cache without asking the server, as the server tells it when the
+        file changes. Without one, cache entries are trusted for the freshness interval and then validated.
+
+        The cache is limited to `maximum_cache_size_in_bytes` and `maximum_number_of_cached_files`, 0 for no limit.
+        Files in `pinned_file_paths` are never evicted from it. Up to `maximum_memory_cache_size_in_bytes` of the
+        files read from the cache are also kept in memory.
+
+        With a `write_back_delay_in_seconds`, writes and appends to cached files are made to the cache only and sent to
+        the server that long after the first unflushed write, once more than `maximum_unflushed_size_in_bytes` are
+        unflushed, or on `flush` and `close`. Each write is sent with the version the cached copy was of, and writes to
+        files that changed on the server in the meantime are discarded and reported as a `WriteConflict`. Without a
+        delay, every write is sent to the server straight away.
+
+        With `compression_codec_names`, the client offers the server these codecs, in order of preference, and the
+        messages carrying at least `minimum_compressed_size_in_bytes` of file content are compressed with the one the
+        server picks. Without any, nothing is compressed.
+
+        A range of a cached file that changed on the server is refreshed with a delta, as rsync does, if at least
+        `minimum_delta_synchronization_size_in_bytes` of it are cached, so that only the parts that changed are sent.
+        With 0, the whole range is fetched again.
+        """
         self.client_ip_address: IPv4Address = IPv4Address(gethostbyname(gethostname()))
         self.client_port_number: int = client_port_number
         self.server_ip_address: IPv4Address = server_ip_address
         self.server_port_number: int = server_port_number
-        self.cache: Cache = Cache(cache_working_directory)
+        self.cache: Cache = Cache(
+            cache_working_directory,
+            maximum_size_in_bytes=maximum_cache_size_in_bytes,
+            maximum_number_of_files=maximum_number_of_cached_files,
+            pinned_file_paths=pinned_file_paths,
+            maximum_memory_size_in_bytes=maximum_memory_cache_size_in_bytes,
+        )
         self.freshness_interval_in_seconds: int = freshness_interval_in_seconds
+        # Requests are sent from one socket that is opened on first use and kept until the client is closed.
+        self.endpoint: Optional[Endpoint] = None
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+        # Monotonic time at which the lease on each file expires.
+        self.lease_expirations: Dict[Path, float] = {}
+        # Files whose leases were revoked while the current request was outstanding. The reply may have been read
+        # before the change that revoked them, so no lease is taken from it.
+        self.lease_revocations_during_request: Set[Path] = set()
+        self.write_back_delay_in_seconds: float = write_back_delay_in_seconds
+        self.maximum_unflushed_size_in_bytes: int = maximum_unflushed_size_in_bytes
+        self.flush_timer: Optional[threading.Timer] = None
+        # Set once the client is closed, after which flushes are no longer scheduled.
+        self.is_closed: bool = False
+        self.write_conflicts: List[WriteConflict] = []
+        # Flushes on the timer run on another thread, so operations that use the cache hold this lock.
+        self.lock: threading.RLock = threading.RLock()
+        self.compression_codec_ids: List[int] = get_codec_ids(compression_codec_names)
+        self.minimum_compressed_size_in_bytes: int = minimum_compressed_size_in_bytes
+        self.minimum_delta_synchronization_size_in_bytes: int = minimum_delta_synchronization_size_in_bytes
+
+    def close(self) -> None:
+        """
+        Writes that cannot be flushed now are kept in the cache, and flushed by a client created on it later.
+        """
+        with self.lock:
+            self.is_closed = True
+            self.flush()
+            if self.endpoint is not None:
+                self.endpoint.close()
+                self.endpoint = None
 
     def read_file(self, file_path: Path, offset: int, number_of_bytes: int) -> Optional[bytes]:
+        with self.lock:
+            return self._read_file(file_path, offset, number_of_bytes)
+
+    def _read_file(self, file_path: Path, offset: int, number_of_bytes: int) -> Optional[bytes]:
         logger.debug(f"Reading {number_of_bytes} bytes from {file_path} at an offset of {offset}.")
+        if self.cache.is_dirty(file_path):
+            # The cached copy holds writes the server has not seen yet, so it is read without being validated. It is
+            # flushed first if blocks are missing, as fetching them from a newer version would discard those writes.
+            if not self.cache.get_missing_ranges(file_path, offset, number_of_bytes):
+                return self.cache.get_file_content(file_path, offset, number_of_bytes)
+            if not self._flush_file(file_path):
+                return None
 
+        block_size_in_bytes: int = self.cache.block_size_in_bytes
+        first_block_offset: int = offset - offset % block_size_in_bytes
+        end_of_last_block: int = -(-(offset + number_of_bytes) // block_size_in_bytes) * block_size_in_bytes
+        number_of_bytes_in_blocks: int = end_of_last_block - first_block_offset
         if not self.cache.is_in_cache(file_path):
             logger.debug(f"No cache entry exists for {file_path}.")
-            entire_file_content: bytes = self._get_file_from_server(file_path)
-            if not entire_file_content:
+            if not self._get_file_range_from_server(file_path, first_block_offset, number_of_bytes_in_blocks):
+                return None
+        elif not self._holds_lease(file_path) and not self._check_validity_on_client(file_path):
+            if not self._revalidate_file_range_with_server(file_path, first_block_offset, number_of_bytes_in_blocks):
                 return None
-            desired_file_content = entire_file_content[offset : offset + number_of_bytes]
-            return desired_file_content
 
-        if self._check_validity_on_client(file_path):
-            return self.cache.get_file_content(file_path)[offset : offset + number_of_bytes]
+        # Blocks fetched earlier are discarded if the file changes in between, so keep fetching until none are missing.
+        for _ in range(self.MAXIMUM_ATTEMPTS_TO_FILL_CACHE):
+            missing_ranges: List[Tuple[int, int]] = self.cache.get_missing_ranges(file_path, offset, number_of_bytes)
+            if not missing_ranges:
+                return self.cache.get_file_content(file_path, offset, number_of_bytes)
+            for missing_offset, missing_number_of_bytes in missing_ranges:
+                if not self._get_file_range_from_server(file_path, missing_offset, missing_number_of_bytes):
+                    return None
 
-        if self._check_validity_on_server(file_path):
-            self.cache.validate_cache_for(file_path)
-            return self.cache.get_file_content(file_path)[offset : offset + number_of_bytes]
+        logger.warning(f"{file_path} kept changing on the server while its blocks were being fetched.")
+        return None
+
+    def _get_endpoint(self) -> Endpoint:
+        if self.endpoint is None:
+            self.endpoint = Endpoint(minimum_compressed_size_in_bytes=self.minimum_compressed_size_in_bytes)
+            self.endpoint.unsolicited_message_handler = self._handle_unsolicited_message
+            self._negotiate_compression(self.endpoint)
+        return self.endpoint
 
-        entire_file_content: bytes = self._get_file_from_server(file_path)
-        desired_file_content = entire_file_content[offset : offset + number_of_bytes]
-        return desired_file_content
+    def _negotiate_compression(self, endpoint: Endpoint) -> None:
+        """
+        The codec is negotiated for each socket of the client, as the server keeps it by address. Messages are sent
+        uncompressed if the server supports none of the codecs offered or does not answer.
+        """
+        if not self.compression_codec_ids:
+            return
+        outgoing_message: Message = NegotiateCompressionRequest(
+            request_id=uuid4(), codec_ids=self.compression_codec_ids
+        )
+        incoming_message: NegotiateCompressionResponse | None = send_message_and_wait_for_reply(
+            message=outgoing_message,
+            recipient_ip_address=self.server_ip_address,
+            recipient_port_number=self.server_port_number,
+            max_attempts_to_send_message=3,
+            timeout_in_seconds=5,
+            endpoint=endpoint,
+        )
+        if incoming_message is None or incoming_message.codec_id == 0:
+            logger.warning("Client could not agree on a compression codec with the server.")
+            return
+        endpoint.set_compression_codec(
+            (str(self.server_ip_address), int(self.server_port_number)), incoming_message.codec_id
+        )
+
+    def _holds_lease(self, file_path: Path) -> bool:
+        """
+        Revocations are sent to the socket requests are sent from, so the ones that arrived since the last request are
+        processed first. This only reads from the socket and sends nothing.
+        """
+        if self.lease_duration_in_seconds <= 0:
+            return False
+        for pending_message in self._get_endpoint().receive_pending_messages():
+            self._handle_unsolicited_message(pending_message)
+        return time.monotonic() < self.lease_expirations.get(file_path, 0)
+
+    def _handle_unsolicited_message(self, message: Message) -> None:
+        if not isinstance(message, LeaseRevocationNotification):
+            logger.debug(f"Dropping {message} as no request is waiting for it.")
+            return
+        logger.debug(f"Lease on {message.file_name} was revoked.")
+        file_path: Path = Path(message.file_name)
+        self.lease_expirations.pop(file_path, None)
+        self.lease_revocations_during_request.add(file_path)
+        # The file changed on the server, so the cached copy is outdated even within the freshness interval.
+        self.cache.invalidate_cache_for(file_path)
+
+    def _record_lease(self, file_path: Path, lease_duration_in_seconds: int, request_timestamp: float) -> None:
+        """
+        The lease is counted from when the request was sent, so it expires on the client before it does on the server.
+        """
+        if lease_duration_in_seconds <= 0 or file_path in self.lease_revocations_during_request:
+            self.lease_expirations.pop(file_path, None)
+            return
+        self.lease_expirations[file_path] = request_timestamp + lease_duration_in_seconds
+
+    def validate_cache(self) -> Optional[List[Path]]:
+        """
+        Validates every cache entry whose freshness interval has expired with a single request. Entries that are still
+        up to date are marked as validated. Entries of files that changed or were deleted on the server are removed,
+        so they are fetched again when they are next read. Returns the paths of the removed entries, or None if the
+        server did not respond. Entries with unflushed writes are validated when they are flushed instead.
+        """
+        with self.lock:
+            return self._validate_cache()
+
+    def _validate_cache(self) -> Optional[List[Path]]:
+        expired_file_paths: List[Path] = [
+            file_path
+            for file_path in self.cache.get_file_paths()
+            if not self.cache.is_dirty(file_path) and not self._check_validity_on_client(file_path)
+        ]
+        if not expired_file_paths:
+            return []
+
+        logger.debug(f"Validating {len(expired_file_paths)} cache entries.")
+        outgoing_message: Message = ValidateFilesRequest(
+            request_id=uuid4(),
+            file_versions=[(str(file_path), self.cache.get_version(file_path)) for file_path in expired_file_paths],
+        )
+        incoming_message: ValidateFilesResponse | None = send_message_and_wait_for_reply(
+            message=outgoing_message,
+            recipient_ip_address=self.server_ip_address,
+            recipient_port_number=self.server_port_number,
+            max_attempts_to_send_message=3,
+            timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
+        )
+        if incoming_message is None:
+            logger.warning("Server did not respond to a cache validation.")
+            return None
+
+        changed_file_paths: Set[Path] = {Path(file_name) for file_name, _ in incoming_message.changed_file_versions}
+        removed_file_paths: List[Path] = []
+        for file_path in expired_file_paths:
+            if file_path in changed_file_paths:
+                logger.debug(f"Cache entry for {file_path} is outdated.")
+                self.cache.remove_from_cache(file_path)
+                removed_file_paths.append(file_path)
+            else:
+                self.cache.validate_cache_for(file_path)
+        return removed_file_paths
 
     def _check_validity_on_client(self, file_path: Path) -> bool:
         logger.debug(f"Checking validation timestamp on cache entry for {file_path}.")
@@ -70,51 +309,176 @@ class Client:
         validation_timestamp: int = self.cache.get_validation_timestamp(file_path)
         return current_timestamp - validation_timestamp < self.freshness_interval_in_seconds
 
-    def _check_validity_on_server(self, file_path: Path) -> bool:
-        logger.debug(f"Checking server modification timestamp on cache entry for {file_path}.")
-        cache_modification_timestamp: int = self.cache.get_modification_timestamp(file_path)
-        server_modification_timestamp: int = self._get_modification_timestamp_from_server(file_path)
-        return cache_modification_timestamp == server_modification_timestamp
+    def _revalidate_file_range_with_server(self, file_path: Path, offset: int, number_of_bytes: int) -> bool:
+        """
+        Validates the cache entry and fetches a range of the file in a single round trip. The server only sends the
+        range if the file is no longer at the cached version, in which case the range replaces the cached copy. Returns
+        whether the file could be read.
+        """
+        cached_ranges: List[Tuple[int, int]] = self.cache.get_resident_ranges(file_path, offset, number_of_bytes)
+        cached_size_in_bytes: int = sum(cached_number_of_bytes for _, cached_number_of_bytes in cached_ranges)
+        if (
+            0 < self.minimum_delta_synchronization_size_in_bytes <= cached_size_in_bytes
+            and number_of_bytes <= MAXIMUM_SYNCHRONIZED_SIZE_IN_BYTES
+        ):
+            return self._synchronize_file_range_with_server(file_path, offset, number_of_bytes, cached_ranges)
 
-    def _get_file_from_server(self, file_path: Path) -> Optional[bytes]:
-        logger.debug(f"Client retrieving {file_path} from server.")
-        outgoing_message: Message = ReadFileRequest(request_id=uuid4(), filename=str(file_path))
-        incoming_message: ReadFileResponse | None = send_message_and_wait_for_reply(
+        logger.debug(f"Checking server version on cache entry for {file_path}.")
+        outgoing_message: Message = ConditionalReadFileRangeRequest(
+            request_id=uuid4(),
+            file_name=str(file_path),
+            offset=offset,
+            number_of_bytes=number_of_bytes,
+            version=self.cache.get_version(file_path),
+            lease_duration_in_seconds=self.lease_duration_in_seconds,
+        )
+        self.lease_revocations_during_request.clear()
+        request_timestamp: float = time.monotonic()
+        incoming_message: NotModifiedResponse | ReadFileRangeResponse | None = send_message_and_wait_for_reply(
             message=outgoing_message,
             recipient_ip_address=self.server_ip_address,
             recipient_port_number=self.server_port_number,
             max_attempts_to_send_message=3,
             timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
         )
+        if isinstance(incoming_message, NotModifiedResponse):
+            self.cache.validate_cache_for(file_path)
+            self._record_lease(file_path, incoming_message.lease_duration_in_seconds, request_timestamp)
+            return True
+        if incoming_message is not None:
+            logger.debug(f"Cache entry for {file_path} is outdated.")
+            self.cache.remove_from_cache(file_path)
+        return self._put_file_range_in_cache(file_path, incoming_message, request_timestamp)
+
+    def _synchronize_file_range_with_server(
+        self, file_path: Path, offset: int, number_of_bytes: int, cached_ranges: List[Tuple[int, int]]
+    ) -> bool:
+        """
+        Like `_revalidate_file_range_with_server`, but the hashes of the cached blocks of the range are sent along, and
+        if the file changed, the server replies with the blocks to copy from the cached copy and the data in between.
+        The range rebuilt from them is checked against the checksum of the range on the server, and fetched whole if
+        it does not match. The server sends the range whole in the first place if too few of the blocks match.
+        """
+        logger.debug(f"Synchronizing {number_of_bytes} bytes of {file_path} at an offset of {offset} with server.")
+        block_size_in_bytes: int = get_block_size(number_of_bytes)
+        cached_content: bytes = self.cache.get_file_content(file_path, offset, number_of_bytes)
+        block_hashes: List[BlockHash] = []
+        for cached_offset, cached_number_of_bytes in cached_ranges:
+            cached_start: int = cached_offset - offset
+            block_hashes.extend(
+                compute_block_hashes(
+                    memoryview(cached_content)[cached_start : cached_start + cached_number_of_bytes],
+                    cached_offset,
+                    block_size_in_bytes,
+                )
+            )
+        outgoing_message: Message = SynchronizeFileRangeRequest(
+            request_id=uuid4(),
+            file_name=str(file_path),
+            offset=offset,
+            number_of_bytes=number_of_bytes,
+            version=self.cache.get_version(file_path),
+            block_size_in_bytes=block_size_in_bytes,
+            block_hashes=block_hashes,
+            lease_duration_in_seconds=self.lease_duration_in_seconds,
+        )
+        self.lease_revocations_during_request.clear()
+        request_timestamp: float = time.monotonic()
+        incoming_message: NotModifiedResponse | SynchronizeFileRangeResponse | ReadFileRangeResponse | None = (
+            send_message_and_wait_for_reply(
+                message=outgoing_message,
+                recipient_ip_address=self.server_ip_address,
+                recipient_port_number=self.server_port_number,
+                max_attempts_to_send_message=3,
+                timeout_in_seconds=5,
+                endpoint=self._get_endpoint(),
+            )
+        )
+        if isinstance(incoming_message, NotModifiedResponse):
+            self.cache.validate_cache_for(file_path)
+            self._record_lease(file_path, incoming_message.lease_duration_in_seconds, request_timestamp)
+            return True
         if not incoming_message:
             logger.warning("No response from server.")
-            return None
-        entire_file_content: bytes = incoming_message.content
-        server_modification_timestamp: int = incoming_message.modification_timestamp
-        self.cache.put_in_cache(
-            file_path=Path(file_path),
-            file_content=entire_file_content,
+            return False
+
+        logger.debug(f"Cache entry for {file_path} is outdated.")
+        self.cache.remove_from_cache(file_path)
+        if isinstance(incoming_message, ReadFileRangeResponse):
+            return self._put_file_range_in_cache(file_path, incoming_message, request_timestamp)
+        if not incoming_message.is_successful:
+            logger.warning(f"Server responded that {file_path} could not be read.")
+            return False
+        file_content: bytes = apply_delta(incoming_message.instructions, cached_content, offset, block_size_in_bytes)
+        if zlib.crc32(file_content) != incoming_message.checksum:
+            logger.warning(f"Range of {file_path} rebuilt from the cached copy is corrupt, so it is fetched again.")
+            return self._get_file_range_from_server(file_path, offset, number_of_bytes)
+        self.cache.put_range_in_cache(
+            file_path=file_path,
+            offset=incoming_message.offset,
+            file_content=file_content,
+            file_size=incoming_message.file_size,
             validation_timestamp=int(time.time()),
-            modification_timestamp=server_modification_timestamp,
+            version=incoming_message.version,
         )
-        return entire_file_content
+        self._record_lease(file_path, incoming_message.lease_duration_in_seconds, request_timestamp)
+        return True
 
-    def _get_modification_timestamp_from_server(self, file_path: Path) -> int:
-        outgoing_message: Message = ModifiedTimestampRequest(request_id=uuid4(), file_path=str(file_path))
-        incoming_message: ModifiedTimestampResponse | None = send_message_and_wait_for_reply(
+    def _get_file_range_from_server(self, file_path: Path, offset: int, number_of_bytes: int) -> bool:
+        """
+        Fetches a range of the file and puts it in the cache. Returns whether the range could be read.
+        """
+        logger.debug(f"Client retrieving {number_of_bytes} bytes of {file_path} at an offset of {offset} from server.")
+        outgoing_message: Message = ReadFileRangeRequest(
+            request_id=uuid4(),
+            file_name=str(file_path),
+            offset=offset,
+            number_of_bytes=number_of_bytes,
+            lease_duration_in_seconds=self.lease_duration_in_seconds,
+        )
+        self.lease_revocations_during_request.clear()
+        request_timestamp: float = time.monotonic()
+        incoming_message: ReadFileRangeResponse | None = send_message_and_wait_for_reply(
             message=outgoing_message,
             recipient_ip_address=self.server_ip_address,
             recipient_port_number=self.server_port_number,
             max_attempts_to_send_message=3,
             timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
         )
-        if incoming_message.is_successful:
-            return incoming_message.modification_timestamp
-        else:
-            logger.warning("Couldn't get modification timestamp")
-            return incoming_message.modification_timestamp
+        return self._put_file_range_in_cache(file_path, incoming_message, request_timestamp)
+
+    def _put_file_range_in_cache(
+        self, file_path: Path, incoming_message: ReadFileRangeResponse | None, request_timestamp: float
+    ) -> bool:
+        if not incoming_message:
+            logger.warning("No response from server.")
+            return False
+        if not incoming_message.is_successful:
+            logger.warning(f"Server responded that {file_path} could not be read.")
+            return False
+
+        if not self.cache.put_range_in_cache(
+            file_path=Path(file_path),
+            offset=incoming_message.offset,
+            file_content=incoming_message.content,
+            file_size=incoming_message.file_size,
+            validation_timestamp=int(time.time()),
+            version=incoming_message.version,
+        ):
+            # The range is older than the cached copy, so it is fetched again if it is still missing.
+            return True
+        self._record_lease(file_path, incoming_message.lease_duration_in_seconds, request_timestamp)
+        return True
 
     def write_file(self, file_path: Path, offset: int, content: bytes):
+        with self.lock:
+            if self.write_back_delay_in_seconds > 0 and self.cache.is_in_cache(file_path):
+                return self._write_to_cache(file_path, offset, content)
+            return self._write_file(file_path, offset, content)
+
+    def _write_file(self, file_path: Path, offset: int, content: bytes):
         logger.debug(f"Writing {len(content)} bytes of {content} to {file_path} at an offset of {offset}.")
         outgoing_message: Message = WriteFileRequest(
             request_id=uuid4(), offset=offset, file_name=str(file_path), content=content
@@ -125,6 +489,7 @@ class Client:
             recipient_port_number=self.server_port_number,
             max_attempts_to_send_message=3,
             timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
         )
         if not incoming_message:
             logger.warning("Server did not respond to a Write File operation.")
@@ -143,6 +508,12 @@ class Client:
         return incoming_message.is_successful
 
     def append_file(self, file_path: Path, content: bytes):
+        with self.lock:
+            if self.write_back_delay_in_seconds > 0 and self.cache.is_in_cache(file_path):
+                return self._write_to_cache(file_path, self.cache.get_file_size(file_path), content)
+            return self._append_file(file_path, content)
+
+    def _append_file(self, file_path: Path, content: bytes):
         logger.debug(f"Appending {content} to {file_path}.")
         outgoing_message: Message = AppendFileRequest(request_id=uuid4(), file_name=str(file_path), content=content)
         incoming_message: AppendFileResponse | None = send_message_and_wait_for_reply(
@@ -151,6 +522,7 @@ class Client:
             recipient_port_number=self.server_port_number,
             max_attempts_to_send_message=3,
             timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
         )
         if not incoming_message:
             logger.warning("Server did not respond to a Append File operation.")
@@ -168,6 +540,10 @@ class Client:
         return incoming_message.is_successful
 
     def delete_file_in_server(self, file_path: Path) -> bool:
+        with self.lock:
+            return self._delete_file_in_server(file_path)
+
+    def _delete_file_in_server(self, file_path: Path) -> bool:
         logger.debug(f"Deleting {file_path}.")
         if self.cache.is_in_cache(file_path):
             self.cache.remove_from_cache(file_path=file_path)
@@ -179,12 +555,93 @@ class Client:
             recipient_port_number=self.server_port_number,
             max_attempts_to_send_message=3,
             timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
         )
         is_successful = incoming_message.is_successful
         if not is_successful:
             logger.warning("Delete Failed.")
         return is_successful
 
+    def _write_to_cache(self, file_path: Path, offset: int, content: bytes) -> bool:
+        logger.debug(f"Writing {len(content)} bytes to the cached copy of {file_path} at an offset of {offset}.")
+        if offset < 0 or offset > self.cache.get_file_size(file_path):
+            logger.warning(f"Offset of {offset} is not within the cached copy of {file_path}.")
+            return False
+        self.cache.write_to_cache(file_path, offset, content)
+        if self.cache.get_dirty_size() > self.maximum_unflushed_size_in_bytes:
+            self.flush()
+        else:
+            self._schedule_flush()
+        return True
+
+    def flush(self) -> Optional[List[WriteConflict]]:
+        """
+        Sends the writes kept in the cache to the server. Returns the conflicts found, or None if the server did not
+        respond, in which case the remaining writes are kept and flushed again later. Conflicts found by flushes on the
+        timer are kept in `write_conflicts`.
+        """
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            number_of_earlier_write_conflicts: int = len(self.write_conflicts)
+            for file_path in self.cache.get_dirty_file_paths():
+                if not self._flush_file(file_path):
+                    self._schedule_flush()
+                    return None
+            return self.write_conflicts[number_of_earlier_write_conflicts:]
+
+    def _schedule_flush(self) -> None:
+        if self.write_back_delay_in_seconds <= 0 or self.flush_timer is not None or self.is_closed:
+            return
+        self.flush_timer = threading.Timer(self.write_back_delay_in_seconds, self._flush_on_timer)
+        self.flush_timer.daemon = True
+        self.flush_timer.start()
+
+    def _flush_on_timer(self) -> None:
+        with self.lock:
+            self.flush_timer = None
+            # The timer may have fired while the client was being closed.
+            if not self.is_closed:
+                self.flush()
+
+    def _flush_file(self, file_path: Path) -> bool:
+        """
+        Each dirty range is written on the condition that the file is still at the version the previous write made it,
+        starting from the version of the cached copy. Nearby dirty ranges are written together, so most files are
+        flushed in a single request. Returns False if the server did not respond.
+        """
+        version: int = self.cache.get_version(file_path)
+        for offset, content in self.cache.get_dirty_writes(file_path, self.MAXIMUM_FLUSH_GAP_IN_BYTES):
+            logger.debug(f"Flushing {len(content)} bytes to {file_path} at an offset of {offset}.")
+            outgoing_message: Message = ConditionalWriteFileRequest(
+                request_id=uuid4(), offset=offset, file_name=str(file_path), content=content, version=version
+            )
+            incoming_message: WriteFileResponse | None = send_message_and_wait_for_reply(
+                message=outgoing_message,
+                recipient_ip_address=self.server_ip_address,
+                recipient_port_number=self.server_port_number,
+                max_attempts_to_send_message=3,
+                timeout_in_seconds=5,
+                endpoint=self._get_endpoint(),
+            )
+            if not incoming_message:
+                logger.warning(f"Server did not respond to a flush of {file_path}.")
+                return False
+            if not incoming_message.is_successful:
+                logger.warning(
+                    f"Unflushed writes to {file_path} are discarded, as the file is at version "
+                    f"{incoming_message.version} on the server rather than at version {version}."
+                )
+                self.write_conflicts.append(
+                    WriteConflict(file_path, version, incoming_message.version, self.cache.get_dirty_writes(file_path))
+                )
+                self.cache.remove_from_cache(file_path)
+                return True
+            version = incoming_message.version
+            self.cache.mark_as_flushed(file_path, offset, len(content), version)
+        return True
+
     def subscribe_to_updates(self, file_path: Path, monitoring_interval_in_seconds: int) -> None:
         logger.debug(f"Subscribing to updates to {file_path} for {monitoring_interval_in_seconds} seconds.")
         outgoing_message: Message = SubscribeToUpdatesRequest(
@@ -201,6 +658,7 @@ class Client:
             recipient_port_number=self.server_port_number,
             max_attempts_to_send_message=3,
             timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
         )
 
         if not incoming_message.is_successful:
@@ -208,11 +666,91 @@ class Client:
             return
         self.listen_for_updates(monitoring_interval_in_seconds)
 
+    def renew_subscription(self, file_path: Path, monitoring_interval_in_seconds: int) -> bool:
+        """
+        Extends the subscription to updates to the file by another monitoring interval from now. Fails if the
+        subscription has already expired.
+        """
+        logger.debug(f"Renewing the subscription to {file_path} for {monitoring_interval_in_seconds} seconds.")
+        outgoing_message: Message = RenewSubscriptionRequest(
+            request_id=uuid4(),
+            client_ip_address=self.client_ip_address,
+            client_port_number=self.client_port_number,
+            monitoring_interval_in_seconds=monitoring_interval_in_seconds,
+            file_name=str(file_path),
+        )
+        incoming_message: RenewSubscriptionResponse | None = send_message_and_wait_for_reply(
+            message=outgoing_message,
+            recipient_ip_address=self.server_ip_address,
+            recipient_port_number=self.server_port_number,
+            max_attempts_to_send_message=3,
+            timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
+        )
+        if incoming_message is None or not incoming_message.is_successful:
+            logger.warning(f"Client failed to renew the subscription to {file_path}.")
+            return False
+        return True
+
+    def unsubscribe_from_updates(self, file_path: Path) -> bool:
+        logger.debug(f"Unsubscribing from updates to {file_path}.")
+        outgoing_message: Message = UnsubscribeFromUpdatesRequest(
+            request_id=uuid4(),
+            client_ip_address=self.client_ip_address,
+            client_port_number=self.client_port_number,
+            file_name=str(file_path),
+        )
+        incoming_message: UnsubscribeFromUpdatesResponse | None = send_message_and_wait_for_reply(
+            message=outgoing_message,
+            recipient_ip_address=self.server_ip_address,
+            recipient_port_number=self.server_port_number,
+            max_attempts_to_send_message=3,
+            timeout_in_seconds=5,
+            endpoint=self._get_endpoint(),
+        )
+        if incoming_message is None or not incoming_message.is_successful:
+            logger.warning(f"Client failed to unsubscribe from updates to {file_path}.")
+            return False
+        return True
+
+    def _apply_update_delta_notification(self, update_delta_notification: UpdateDeltaNotification) -> None:
+        """
+        The change is applied to the cached copy if that copy is of the version it was made to. It is dropped if the
+        cached copy is of that version or a later one already, as notifications can arrive out of order. Otherwise an
+        earlier change was missed, so the whole file is fetched again.
+        """
+        file_path: Path = Path(update_delta_notification.file_name)
+        if self.cache.is_in_cache(file_path) and self.cache.get_version(file_path) >= update_delta_notification.version:
+            logger.debug(f"Dropping {update_delta_notification}, as the cached copy of {file_path} is as new.")
+            return
+        if (
+            self.cache.is_in_cache(file_path)
+            and self.cache.get_version(file_path) == update_delta_notification.previous_version
+        ):
+            self.cache.apply_update(
+                file_path=file_path,
+                offset=update_delta_notification.offset,
+                file_content=update_delta_notification.content,
+                validation_timestamp=int(time.time()),
+                version=update_delta_notification.version,
+            )
+            return
+
+        logger.debug(f"Cache entry for {file_path} missed an update, so the whole file is fetched.")
+        if self.cache.is_in_cache(file_path):
+            self.cache.remove_from_cache(file_path)
+        self._get_file_range_from_server(file_path, 0, update_delta_notification.file_size)
+
     def listen_for_updates(self, monitoring_interval_in_seconds: int) -> bool:
-        sock = socket(AF_INET, SOCK_DGRAM)
-        client_address: Tuple[str, int] = (str(self.client_ip_address), int(self.client_port_number))
-        sock.bind(client_address)
-        sock.settimeout(monitoring_interval_in_seconds)
+        endpoint: Endpoint = Endpoint(
+            str(self.client_ip_address),
+            int(self.client_port_number),
+            minimum_compressed_size_in_bytes=self.minimum_compressed_size_in_bytes,
+        )
+        server_address: Tuple[str, int] = (str(self.server_ip_address), int(self.server_port_number))
+        # Notifications are sent to this socket, so the server has to know the codec for it as well.
+        self._negotiate_compression(endpoint)
+        endpoint.settimeout(monitoring_interval_in_seconds)
 
         try:
             while True:
@@ -220,24 +758,33 @@ class Client:
                     f"Client is subscribed for updates and waiting at "
                     f"{self.client_ip_address}:{self.client_port_number}."
                 )
-                incoming_bytes, sender_address = sock.recvfrom(4096)
+                incoming_message, sender_address = endpoint.receive_message(server_address)
                 sender_ip_address, sender_port_number = sender_address
-                logger.info(f"Received {len(incoming_bytes)} bytes from {sender_ip_address}:{sender_port_number}.")
-
-                if incoming_bytes:
-                    incoming_message: UpdateNotification = Message.unmarshall(incoming_bytes)
-                    logger.debug(f"Received {incoming_message.content}.")
-                    server_modification_timestamp: int = incoming_message.modification_timestamp
-                    self.cache.put_in_cache(
-                        file_path=Path(incoming_message.file_name),
-                        file_content=incoming_message.content,
-                        validation_timestamp=int(time.time()),
-                        modification_timestamp=server_modification_timestamp,
-                    )
+
+                if not isinstance(incoming_message, (UpdateNotification, UpdateDeltaNotification)):
+                    continue
+                logger.info(f"Received {incoming_message} from {sender_ip_address}:{sender_port_number}.")
+                with self.lock:
+                    if self.cache.is_dirty(Path(incoming_message.file_name)):
+                        # Flushing the unflushed writes will fail on the new version and report the conflict.
+                        logger.warning(
+                            f"Update of {incoming_message.file_name} is not applied, as its cached copy has unflushed "
+                            f"writes."
+                        )
+                    elif isinstance(incoming_message, UpdateNotification):
+                        logger.debug(f"Received {incoming_message.content}.")
+                        self.cache.put_in_cache(
+                            file_path=Path(incoming_message.file_name),
+                            file_content=incoming_message.content,
+                            validation_timestamp=int(time.time()),
+                            version=incoming_message.version,
+                        )
+                    else:
+                        self._apply_update_delta_notification(incoming_message)
 
         except timeout:
             logger.info(
                 f"Client has waited for {monitoring_interval_in_seconds} seconds and will no longer listen for updates."
             )
         finally:
-            sock.close()
+            endpoint.close()
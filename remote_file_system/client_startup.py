@@ -5,6 +5,7 @@ from pathlib import Path
 
 from remote_file_system.client_command_line_interface import ClientCommandLineInterface
 from remote_file_system.client_interface import Client
+from remote_file_system.compression import AVAILABLE_CODEC_NAMES, MINIMUM_COMPRESSED_SIZE_IN_BYTES
 
 
 def main() -> None:
@@ -24,6 +25,81 @@ def main() -> None:
         default=60,
         help="specifies client's " "freshness interval in " "seconds",
     )
+    parser.add_argument(
+        "-l",
+        "--lease-duration-in-seconds",
+        type=int,
+        default=0,
+        help="asks the server for leases of this duration on the files read, which are then read from the cache "
+        "until the server revokes the lease, 0 to validate cache entries after the freshness interval instead",
+    )
+    parser.add_argument(
+        "-cm",
+        "--cache-megabytes",
+        type=int,
+        default=0,
+        help="limits the size of the files kept in the cache, 0 for no limit",
+    )
+    parser.add_argument(
+        "-cf",
+        "--cache-files",
+        type=int,
+        default=0,
+        help="limits the number of files kept in the cache, 0 for no limit",
+    )
+    parser.add_argument(
+        "-pin",
+        "--pinned-file",
+        type=str,
+        action="append",
+        default=[],
+        help="keeps this file in the cache once it is read, no matter the limits, can be given more than once",
+    )
+    parser.add_argument(
+        "-mc",
+        "--memory-cache-megabytes",
+        type=int,
+        default=16,
+        help="sets the size of the files read from the cache that are also kept in memory, 0 to read them from disk",
+    )
+    parser.add_argument(
+        "-wb",
+        "--write-back-delay-in-seconds",
+        type=float,
+        default=0,
+        help="keeps writes to cached files in the cache and sends them to the server this long after the first one, "
+        "0 to send every write to the server straight away",
+    )
+    parser.add_argument(
+        "-wm",
+        "--unflushed-megabytes",
+        type=int,
+        default=1,
+        help="sends the writes kept in the cache to the server once they exceed this size",
+    )
+    parser.add_argument(
+        "-z",
+        "--compression",
+        type=str,
+        default="",
+        help="offers the server these codecs, comma separated in order of preference, to compress messages carrying "
+        f"file content with, from {', '.join(AVAILABLE_CODEC_NAMES)}, empty to send them uncompressed",
+    )
+    parser.add_argument(
+        "-zm",
+        "--compression-minimum-bytes",
+        type=int,
+        default=MINIMUM_COMPRESSED_SIZE_IN_BYTES,
+        help="sends messages carrying less file content than this uncompressed",
+    )
+    parser.add_argument(
+        "-ds",
+        "--delta-sync-kilobytes",
+        type=int,
+        default=64,
+        help="refreshes changed files of which at least this much is cached by fetching only the parts that changed, "
+        "0 to always fetch them whole",
+    )
     args: argparse.Namespace = parser.parse_args()
 
     client = Client(
@@ -32,9 +108,22 @@ def main() -> None:
         server_port_number=args.server_port_number,
         cache_working_directory=Path(args.cache_working_directory),
         freshness_interval_in_seconds=args.freshness_interval_in_seconds,
+        lease_duration_in_seconds=args.lease_duration_in_seconds,
+        maximum_cache_size_in_bytes=args.cache_megabytes * 1024 * 1024,
+        maximum_number_of_cached_files=args.cache_files,
+        pinned_file_paths=[Path(pinned_file) for pinned_file in args.pinned_file],
+        maximum_memory_cache_size_in_bytes=args.memory_cache_megabytes * 1024 * 1024,
+        write_back_delay_in_seconds=args.write_back_delay_in_seconds,
+        maximum_unflushed_size_in_bytes=args.unflushed_megabytes * 1024 * 1024,
+        compression_codec_names=[codec_name for codec_name in args.compression.split(",") if codec_name],
+        minimum_compressed_size_in_bytes=args.compression_minimum_bytes,
+        minimum_delta_synchronization_size_in_bytes=args.delta_sync_kilobytes * 1024,
     )
     client_command_line_interface: ClientCommandLineInterface = ClientCommandLineInterface(client=client)
-    client_command_line_interface.start()
+    try:
+        client_command_line_interface.start()
+    finally:
+        client.close()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,500 @@
+import heapq
 import socket
+import threading
 import time
+from concurrent.futures import Future
 from ipaddress import IPv4Address
-from typing import Optional, Tuple
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple, List
+from uuid import UUID
 
 from loguru import logger
 
-from remote_file_system.message import Message
+from remote_file_system.compression import compress_message, decompress_message, MINIMUM_COMPRESSED_SIZE_IN_BYTES
+from remote_file_system.fragmentation import (
+    FragmentReassembler,
+    SentFragmentHistory,
+    get_message_id,
+    split_into_datagrams,
+    RECEIVE_BUFFER_SIZE_IN_BYTES,
+)
+from remote_file_system.message import (
+    Buffer,
+    Message,
+    MessageFragment,
+    FragmentRetransmissionRequest,
+    UNMARSHALLING_ERRORS,
+)
+from remote_file_system.round_trip_time import RoundTripTimeEstimator, get_round_trip_time_estimator
 import remote_file_system.config
 
+# Fragmented messages are sent back to back, so the socket buffer has to hold a burst of them.
+SOCKET_BUFFER_SIZE_IN_BYTES = 4 * 1024 * 1024
+# Fragments of messages that were given up on are dropped after this long.
+INCOMPLETE_MESSAGE_TIMEOUT_IN_SECONDS = 30
+# Peers beyond this many, least recently sent to first, are forgotten and sent uncompressed messages.
+MAXIMUM_NUMBER_OF_COMPRESSING_PEERS = 4096
+
+
+def create_socket() -> socket.socket:
+    sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE_IN_BYTES)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE_IN_BYTES)
+    return sock
+
+
+class Endpoint:
+    """
+    A UDP socket that stays open across messages, so that a client does not open a socket per request and a server
+    replies from the port it listens on. Replies carry the ID of the request they answer, which lets a late reply to an
+    earlier request be told apart from the reply being waited for.
+
+    Messages carrying file content are compressed for peers a codec was negotiated with, if they carry at least
+    `minimum_compressed_size_in_bytes` of it. The codecs of at most `maximum_number_of_compressing_peers` peers are
+    kept. Compressed messages are decompressed as they are received, and dropped if they would decompress to more than
+    the largest message that is reassembled from fragments.
+    """
+
+    def __init__(
+        self,
+        ip_address: str = "",
+        port_number: int = 0,
+        reuse_port: bool = False,
+        minimum_compressed_size_in_bytes: int = MINIMUM_COMPRESSED_SIZE_IN_BYTES,
+        maximum_number_of_compressing_peers: int = MAXIMUM_NUMBER_OF_COMPRESSING_PEERS,
+    ):
+        self.sock: socket.socket = create_socket()
+        if reuse_port:
+            # The kernel spreads datagrams over the sockets by source address, so all datagrams from one client
+            # socket, including its retries and fragments, reach the same process.
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # TODO: do more testing for sock.bind with different computers.
+        self.sock.bind((ip_address, port_number))
+        self.fragment_reassembler: FragmentReassembler = FragmentReassembler()
+        # Datagrams of fragmented messages sent from this endpoint, kept for selective retransmission.
+        self.sent_fragment_history: SentFragmentHistory = SentFragmentHistory()
+        # Only one request at a time waits for its reply on the socket.
+        self.request_lock: threading.Lock = threading.Lock()
+        # Called with messages that arrive while a reply is awaited but are not that reply, such as notifications sent
+        # to the socket a request came from. They are dropped if no handler is set.
+        self.unsolicited_message_handler: Optional[Callable[[Message], None]] = None
+        # Codec negotiated with each peer, by address, ordered from the least to the most recently sent to.
+        self.compression_codec_ids: OrderedDict[Tuple[str, int], int] = OrderedDict()
+        # Replies are sent from several server worker threads at once.
+        self.compression_codec_lock: threading.Lock = threading.Lock()
+        self.minimum_compressed_size_in_bytes: int = minimum_compressed_size_in_bytes
+        self.maximum_number_of_compressing_peers: int = maximum_number_of_compressing_peers
+
+        bound_ip_address, bound_port_number = self.sock.getsockname()
+        logger.debug(f"Socket opened at {bound_ip_address}:{bound_port_number}.")
+
+    def get_address(self) -> Tuple[str, int]:
+        return self.sock.getsockname()
+
+    def settimeout(self, timeout_in_seconds: Optional[float]) -> None:
+        self.sock.settimeout(timeout_in_seconds)
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def set_compression_codec(self, peer_address: Tuple[str, int], codec_id: int) -> None:
+        """
+        Codec 0 turns compression off for the peer.
+        """
+        with self.compression_codec_lock:
+            if codec_id == 0:
+                self.compression_codec_ids.pop(peer_address, None)
+                return
+            self.compression_codec_ids[peer_address] = codec_id
+            self.compression_codec_ids.move_to_end(peer_address)
+            while len(self.compression_codec_ids) > self.maximum_number_of_compressing_peers:
+                self.compression_codec_ids.popitem(last=False)
+
+    def send_message(self, message: Message, recipient_address: Tuple[str, int]) -> None:
+        message_id, datagrams = split_into_datagrams(self._compress(message, recipient_address))
+        if len(datagrams) > 1:
+            self.sent_fragment_history.record(message_id, datagrams)
+        self._send_datagrams(datagrams, recipient_address)
+        logger.debug(f"{message} sent to {recipient_address[0]}:{recipient_address[1]}.")
+
+    def send_message_to_recipients(self, message: Message, recipient_addresses: List[Tuple[str, int]]) -> None:
+        """
+        The message is marshalled once for the recipients that use the same codec, and the same datagrams are sent to
+        each of them. A recipient the message cannot be sent to is skipped, so that the others still get it.
+        """
+        recipient_addresses_by_codec_id: Dict[int, List[Tuple[str, int]]] = {}
+        for recipient_address in recipient_addresses:
+            codec_id: int = self._get_compression_codec_id(recipient_address)
+            recipient_addresses_by_codec_id.setdefault(codec_id, []).append(recipient_address)
+        for codec_id, recipient_addresses_with_codec in recipient_addresses_by_codec_id.items():
+            outgoing_message: Message = (
+                compress_message(message, codec_id, self.minimum_compressed_size_in_bytes) if codec_id else message
+            )
+            message_id, datagrams = split_into_datagrams(outgoing_message)
+            if len(datagrams) > 1:
+                self.sent_fragment_history.record(message_id, datagrams)
+            for recipient_address in recipient_addresses_with_codec:
+                try:
+                    self._send_datagrams(datagrams, recipient_address)
+                except OSError as e:
+                    logger.warning(f"Error: {e} occurred while sending {message} to {recipient_address}.")
+        logger.debug(f"{message} sent to {len(recipient_addresses)} recipients.")
+
+    def receive_message(
+        self, retransmission_address: Optional[Tuple[str, int]] = None
+    ) -> Tuple[Optional[Message], Tuple[str, int]]:
+        """
+        Receives a single datagram. Returns the message once it is complete, or None if the datagram was a fragment of
+        a message that is still incomplete, a request for fragments, which is answered here, a compressed message
+        that could not be decompressed, or malformed. Missing fragments are
+        requested once the last fragment arrives, from the retransmission address if given or else from the sender.
+        """
+        incoming_bytes, sender_address = self.sock.recvfrom(RECEIVE_BUFFER_SIZE_IN_BYTES)
+        try:
+            incoming_message: Message = Message.unmarshall(incoming_bytes)
+        except UNMARSHALLING_ERRORS as e:
+            logger.warning(f"Dropping malformed datagram from {sender_address[0]}:{sender_address[1]}: {e}")
+            return None, sender_address
+        if isinstance(incoming_message, FragmentRetransmissionRequest):
+            self._retransmit_fragments(incoming_message, sender_address)
+            return None, sender_address
+        if not isinstance(incoming_message, MessageFragment):
+            return decompress_message(incoming_message), sender_address
+
+        marshalled_message: Optional[memoryview] = self.fragment_reassembler.add_fragment(incoming_message)
+        if marshalled_message is not None:
+            try:
+                return decompress_message(Message.unmarshall(marshalled_message)), sender_address
+            except UNMARSHALLING_ERRORS as e:
+                logger.warning(f"Dropping malformed message {incoming_message.message_id}: {e}")
+                return None, sender_address
+
+        if incoming_message.fragment_number == incoming_message.number_of_fragments - 1:
+            self._request_missing_fragments(incoming_message.message_id, retransmission_address or sender_address)
+        return None, sender_address
+
+    def send_message_and_wait_for_reply(
+        self,
+        message: Message,
+        recipient_address: Tuple[str, int],
+        max_attempts_to_send_message: int,
+        timeout_in_seconds: float,
+    ) -> Optional[Message]:
+        """
+        Returns the reply whose ID matches the request ID of the message, or None if no such reply arrives. Replies to
+        other requests, such as late replies to a request that was given up on, are dropped. The timeout is only used
+        for the first message to the recipient; after that the timeout follows the measured round trip times.
+        """
+        round_trip_time_estimator: RoundTripTimeEstimator = get_round_trip_time_estimator(
+            recipient_address, timeout_in_seconds
+        )
+        with self.request_lock:
+            self.fragment_reassembler.discard_stale_messages(INCOMPLETE_MESSAGE_TIMEOUT_IN_SECONDS)
+            request_id, outgoing_datagrams = split_into_datagrams(self._compress(message, recipient_address))
+            if len(outgoing_datagrams) > 1:
+                self.sent_fragment_history.record(request_id, outgoing_datagrams)
+
+            first_sent_timestamp: float = time.monotonic()
+            for attempt_number in range(max_attempts_to_send_message):
+                try:
+                    if self.fragment_reassembler.get_missing_fragment_numbers(request_id):
+                        # Part of the reply already arrived, so only ask for the fragments that went missing.
+                        self._request_missing_fragments(request_id, recipient_address)
+                    else:
+                        self._send_datagrams(outgoing_datagrams, recipient_address)
+                        logger.debug(f"{message} sent to {recipient_address[0]}:{recipient_address[1]}.")
+
+                    attempt_timeout_in_seconds: float = round_trip_time_estimator.get_timeout()
+                    deadline: float = time.monotonic() + attempt_timeout_in_seconds
+                    while True:
+                        remaining_time_in_seconds: float = deadline - time.monotonic()
+                        if remaining_time_in_seconds <= 0:
+                            raise socket.timeout()
+                        self.sock.settimeout(remaining_time_in_seconds)
+                        incoming_message, _ = self.receive_message(recipient_address)
+                        if incoming_message is None:
+                            # Keep waiting for as long as fragments of a large reply keep arriving.
+                            last_received_timestamp: Optional[float] = (
+                                self.fragment_reassembler.get_last_received_timestamp(request_id)
+                            )
+                            if last_received_timestamp is not None:
+                                deadline = max(deadline, last_received_timestamp + attempt_timeout_in_seconds)
+                            continue
+                        if get_message_id(incoming_message) == request_id:
+                            if attempt_number == 0:
+                                round_trip_time_estimator.add_sample(time.monotonic() - first_sent_timestamp)
+                            return incoming_message
+                        if self.unsolicited_message_handler is not None:
+                            self.unsolicited_message_handler(incoming_message)
+                            continue
+                        logger.debug(f"Dropping {incoming_message} as it is not a reply to {message}.")
+                except ConnectionResetError:
+                    # Nothing is listening at the recipient, so there is no point in waiting out the timeout.
+                    time.sleep(round_trip_time_estimator.get_backoff_delay(attempt_number))
+                    logger.warning(f"Attempt {attempt_number + 1} failed due to a connection reset.")
+                except socket.timeout:
+                    round_trip_time_estimator.record_timeout()
+                    logger.warning(f"Attempt {attempt_number + 1} timed out while waiting for a response.")
+            return None
+
+    def receive_pending_messages(self) -> List[Message]:
+        """
+        Returns the complete messages that have already arrived on the socket, without waiting for more.
+        """
+        pending_messages: List[Message] = []
+        with self.request_lock:
+            self.sock.setblocking(False)
+            try:
+                while True:
+                    incoming_message, _ = self.receive_message()
+                    if incoming_message is not None:
+                        pending_messages.append(incoming_message)
+            except (BlockingIOError, ConnectionResetError):
+                pass
+            finally:
+                self.sock.setblocking(True)
+        return pending_messages
+
+    def _get_compression_codec_id(self, peer_address: Tuple[str, int]) -> int:
+        with self.compression_codec_lock:
+            codec_id: int = self.compression_codec_ids.get(peer_address, 0)
+            if codec_id != 0:
+                self.compression_codec_ids.move_to_end(peer_address)
+            return codec_id
+
+    def _compress(self, message: Message, recipient_address: Tuple[str, int]) -> Message:
+        codec_id: int = self._get_compression_codec_id(recipient_address)
+        if codec_id == 0:
+            return message
+        return compress_message(message, codec_id, self.minimum_compressed_size_in_bytes)
+
+    def _send_datagrams(self, datagrams: List[Buffer], recipient_address: Tuple[str, int]) -> None:
+        for datagram in datagrams:
+            self.sock.sendto(datagram, recipient_address)
+
+    def _request_missing_fragments(self, message_id: UUID, sender_address: Tuple[str, int]) -> None:
+        missing_fragment_numbers: List[int] = self.fragment_reassembler.get_missing_fragment_numbers(message_id)
+        if not missing_fragment_numbers:
+            return
+        logger.debug(f"Requesting {len(missing_fragment_numbers)} missing fragments of {message_id}.")
+        retransmission_request: FragmentRetransmissionRequest = FragmentRetransmissionRequest(
+            message_id=message_id, missing_fragment_numbers=missing_fragment_numbers
+        )
+        self.sock.sendto(retransmission_request.marshall(), sender_address)
+
+    def _retransmit_fragments(
+        self, retransmission_request: FragmentRetransmissionRequest, recipient_address: Tuple[str, int]
+    ) -> None:
+        datagrams: List[Buffer] = self.sent_fragment_history.get_datagrams(
+            retransmission_request.message_id, retransmission_request.missing_fragment_numbers
+        )
+        logger.debug(f"Retransmitting {len(datagrams)} fragments of {retransmission_request.message_id}.")
+        self._send_datagrams(datagrams, recipient_address)
+
+
+class InFlightRequest:
+    def __init__(
+        self,
+        message: Message,
+        datagrams: List[Buffer],
+        recipient_address: Tuple[str, int],
+        max_attempts_to_send_message: int,
+        round_trip_time_estimator: RoundTripTimeEstimator,
+    ):
+        self.message: Message = message
+        self.datagrams: List[Buffer] = datagrams
+        self.recipient_address: Tuple[str, int] = recipient_address
+        self.remaining_attempts_to_send_message: int = max_attempts_to_send_message - 1
+        self.is_retransmitted: bool = False
+        self.round_trip_time_estimator: RoundTripTimeEstimator = round_trip_time_estimator
+        self.attempt_timeout_in_seconds: float = round_trip_time_estimator.get_timeout()
+        self.first_sent_timestamp: float = time.monotonic()
+        self.future: Future = Future()
+
+
+class PipelinedEndpoint(Endpoint):
+    """
+    An endpoint that keeps many requests in flight at once. Sending a request returns a future straight away, and a
+    background thread hands each reply to the future of the request with the same ID and retransmits requests whose
+    reply is overdue. The number of requests in flight is capped so that a burst does not overrun the socket buffers.
+    Requests still in flight when the background thread stops, and requests sent after that, resolve to None.
+    """
+
+    POLLING_INTERVAL_IN_SECONDS = 0.05
+
+    def __init__(self, ip_address: str = "", port_number: int = 0, maximum_number_of_requests_in_flight: int = 64):
+        super().__init__(ip_address, port_number)
+        self.in_flight_requests: Dict[UUID, InFlightRequest] = {}
+        # Min-heap of (retransmission deadline, request ID). Entries of requests that were answered are skipped.
+        self.retransmission_deadlines: List[Tuple[float, UUID]] = []
+        self.in_flight_lock: threading.Lock = threading.Lock()
+        self.request_slots: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            maximum_number_of_requests_in_flight
+        )
+        self.keep_receiving: bool = True
+        self.sock.settimeout(self.POLLING_INTERVAL_IN_SECONDS)
+        self.receiver_thread: threading.Thread = threading.Thread(
+            target=self._receive_replies, name="endpoint-receiver", daemon=True
+        )
+        self.receiver_thread.start()
+
+    def send_message_and_get_future(
+        self,
+        message: Message,
+        recipient_address: Tuple[str, int],
+        max_attempts_to_send_message: int,
+        timeout_in_seconds: float,
+    ) -> Future:
+        """
+        Returns a future that resolves to the reply, or to None if no reply arrives after every attempt. Blocks while
+        the maximum number of requests is in flight.
+        """
+        self.request_slots.acquire()
+        request_id, datagrams = split_into_datagrams(self._compress(message, recipient_address))
+        if len(datagrams) > 1:
+            self.sent_fragment_history.record(request_id, datagrams)
+        in_flight_request: InFlightRequest = InFlightRequest(
+            message,
+            datagrams,
+            recipient_address,
+            max_attempts_to_send_message,
+            get_round_trip_time_estimator(recipient_address, timeout_in_seconds),
+        )
+        in_flight_request.future.add_done_callback(lambda _: self.request_slots.release())
+        with self.in_flight_lock:
+            is_receiving: bool = self.keep_receiving
+            if is_receiving:
+                self.in_flight_requests[request_id] = in_flight_request
+                heapq.heappush(
+                    self.retransmission_deadlines,
+                    (in_flight_request.first_sent_timestamp + in_flight_request.attempt_timeout_in_seconds, request_id),
+                )
+        if not is_receiving:
+            logger.warning(f"Not sending {message} as replies are no longer received.")
+            self._resolve(in_flight_request, None)
+            return in_flight_request.future
+        self._send_datagrams(datagrams, recipient_address)
+        logger.debug(f"{message} sent to {recipient_address[0]}:{recipient_address[1]}.")
+        return in_flight_request.future
+
+    def send_message_and_wait_for_reply(
+        self,
+        message: Message,
+        recipient_address: Tuple[str, int],
+        max_attempts_to_send_message: int,
+        timeout_in_seconds: float,
+    ) -> Optional[Message]:
+        future: Future = self.send_message_and_get_future(
+            message, recipient_address, max_attempts_to_send_message, timeout_in_seconds
+        )
+        return future.result()
+
+    def close(self) -> None:
+        self.keep_receiving = False
+        self.receiver_thread.join()
+        super().close()
+
+    def _receive_replies(self) -> None:
+        try:
+            while self.keep_receiving:
+                try:
+                    incoming_message, sender_address = self.receive_message()
+                    if incoming_message is not None:
+                        self._handle_reply(incoming_message)
+                except socket.timeout:
+                    pass
+                except ConnectionResetError:
+                    # The retransmission deadlines take care of requests that were lost with the reset.
+                    logger.warning("Connection reset while waiting for replies.")
+                except OSError:
+                    if self.keep_receiving:
+                        raise
+                except Exception as e:
+                    logger.exception(f"Error: {e} occurred while handling a reply.")
+                self._retransmit_overdue_requests()
+                self.fragment_reassembler.discard_stale_messages(INCOMPLETE_MESSAGE_TIMEOUT_IN_SECONDS)
+        except Exception as e:
+            logger.exception(f"Error: {e} stopped the receiving of replies.")
+        finally:
+            self._give_up_on_in_flight_requests()
+
+    def _give_up_on_in_flight_requests(self) -> None:
+        with self.in_flight_lock:
+            self.keep_receiving = False
+            unanswered_requests: List[InFlightRequest] = list(self.in_flight_requests.values())
+            self.in_flight_requests.clear()
+            self.retransmission_deadlines.clear()
+        for in_flight_request in unanswered_requests:
+            self._resolve(in_flight_request, None)
+
+    def _handle_reply(self, incoming_message: Message) -> None:
+        with self.in_flight_lock:
+            in_flight_request: Optional[InFlightRequest] = self.in_flight_requests.pop(
+                get_message_id(incoming_message), None
+            )
+        if in_flight_request is None:
+            logger.debug(f"Dropping {incoming_message} as it is not a reply to a request in flight.")
+            return
+        if not in_flight_request.is_retransmitted:
+            in_flight_request.round_trip_time_estimator.add_sample(
+                time.monotonic() - in_flight_request.first_sent_timestamp
+            )
+        self._resolve(in_flight_request, incoming_message)
+
+    def _retransmit_overdue_requests(self) -> None:
+        current_timestamp: float = time.monotonic()
+        while True:
+            with self.in_flight_lock:
+                if not self.retransmission_deadlines or self.retransmission_deadlines[0][0] > current_timestamp:
+                    return
+                _, request_id = heapq.heappop(self.retransmission_deadlines)
+                in_flight_request: Optional[InFlightRequest] = self.in_flight_requests.get(request_id)
+                if in_flight_request is None:
+                    continue
+                # Fragments of a large reply that are still arriving do not count as a timeout.
+                last_received_timestamp: Optional[float] = self.fragment_reassembler.get_last_received_timestamp(
+                    request_id
+                )
+                if (
+                    last_received_timestamp is not None
+                    and current_timestamp - last_received_timestamp < in_flight_request.attempt_timeout_in_seconds
+                ):
+                    heapq.heappush(
+                        self.retransmission_deadlines,
+                        (last_received_timestamp + in_flight_request.attempt_timeout_in_seconds, request_id),
+                    )
+                    continue
+                in_flight_request.round_trip_time_estimator.record_timeout()
+                is_given_up: bool = in_flight_request.remaining_attempts_to_send_message == 0
+                if is_given_up:
+                    del self.in_flight_requests[request_id]
+                else:
+                    in_flight_request.remaining_attempts_to_send_message -= 1
+                    in_flight_request.is_retransmitted = True
+                    in_flight_request.attempt_timeout_in_seconds = (
+                        in_flight_request.round_trip_time_estimator.get_timeout()
+                    )
+                    heapq.heappush(
+                        self.retransmission_deadlines,
+                        (current_timestamp + in_flight_request.attempt_timeout_in_seconds, request_id),
+                    )
+
+            if is_given_up:
+                logger.warning(f"No responses received for {in_flight_request.message}.")
+                self._resolve(in_flight_request, None)
+            elif self.fragment_reassembler.get_missing_fragment_numbers(request_id):
+                # Part of the reply already arrived, so only ask for the fragments that went missing.
+                self._request_missing_fragments(request_id, in_flight_request.recipient_address)
+            else:
+                logger.warning(f"Retransmitting {in_flight_request.message} as no response was received in time.")
+                self._send_datagrams(in_flight_request.datagrams, in_flight_request.recipient_address)
+
+    @staticmethod
+    def _resolve(in_flight_request: InFlightRequest, reply: Optional[Message]) -> None:
+        # The caller may have cancelled the future in the meantime.
+        if in_flight_request.future.set_running_or_notify_cancel():
+            in_flight_request.future.set_result(reply)
+
 
 def send_message_and_wait_for_reply(
     message: Message,
@@ -15,9 +502,10 @@ def send_message_and_wait_for_reply(
     recipient_port_number: int,
     max_attempts_to_send_message: int,
     timeout_in_seconds: int,
+    endpoint: Optional[Endpoint] = None,
 ) -> Optional[Message]:
     """
-    For client to send message to server
+    For client to send message to server. Without an endpoint, a socket is opened for this message only.
     """
     if remote_file_system.config.CLIENT_DROP_MESSAGE:
         logger.info("Simulating loss of request message from client.")
@@ -25,41 +513,20 @@ def send_message_and_wait_for_reply(
         time.sleep(timeout_in_seconds)
         remote_file_system.config.CLIENT_DROP_MESSAGE = False
 
-    sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    # TODO: do more testing for sock.bind with different computers.
-    sock.bind(("", 0))
-    sock.settimeout(timeout_in_seconds)
-
-    sender_ip_address, sender_port_number = sock.getsockname()
-    logger.debug(f"Socket opened at {sender_ip_address}:{sender_port_number}.")
-
-    outgoing_bytes: bytes = message.marshall()
-    incoming_bytes: Optional[bytes] = None
-
+    sending_endpoint: Endpoint = endpoint if endpoint is not None else Endpoint()
     recipient_address: Tuple[str, int] = str(recipient_ip_address), recipient_port_number
+    try:
+        incoming_message: Optional[Message] = sending_endpoint.send_message_and_wait_for_reply(
+            message, recipient_address, max_attempts_to_send_message, timeout_in_seconds
+        )
+    finally:
+        if endpoint is None:
+            sending_endpoint.close()
 
-    # TODO: test binding to the same port number instead of maintaining socket throughout attempts
-    for attempt_number in range(max_attempts_to_send_message):
-        try:
-            sock.sendto(outgoing_bytes, recipient_address)
-            logger.debug(f"{message} sent to {recipient_ip_address}:{recipient_port_number}.")
-
-            incoming_bytes: bytes = sock.recv(4096)
-            break
-        except ConnectionResetError:
-            # TODO: consider if we can replace the timeout for connection reset with cleaner solution
-            time.sleep(timeout_in_seconds)
-            logger.warning(f"Attempt {attempt_number + 1} failed due to a connection reset.")
-        except socket.timeout:
-            logger.warning(f"Attempt {attempt_number + 1} timed out while waiting for a response.")
-
-    sock.close()
-
-    if not incoming_bytes:
+    if not incoming_message:
         logger.warning(f"No responses received after {max_attempts_to_send_message} attempts.")
         return None
 
-    incoming_message: Message = Message.unmarshall(incoming_bytes)
     logger.debug(f"{message} reply received from {recipient_ip_address}:{recipient_port_number}.")
     return incoming_message
 
@@ -68,30 +535,22 @@ def send_message(
     message: Message,
     recipient_ip_address: IPv4Address,
     recipient_port_number: int,
+    endpoint: Optional[Endpoint] = None,
 ) -> None:
     """
-    For server to send message to client
+    For server to send message to client. Without an endpoint, a socket is opened for this message only.
     """
     if remote_file_system.config.SERVER_DROP_MESSAGE:
         logger.info("Simulating loss of reply message from server.")
         remote_file_system.config.SERVER_DROP_MESSAGE = False
         return
 
-    sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    # TODO: do more testing for sock.bind with different computers.
-    sock.bind(("", 0))
-
-    sender_ip_address, sender_port_number = sock.getsockname()
-    logger.debug(f"Socket opened at {sender_ip_address}:{sender_port_number}.")
-
-    outgoing_bytes: bytes = message.marshall()
+    sending_endpoint: Endpoint = endpoint if endpoint is not None else Endpoint()
     recipient_address: Tuple[str, int] = str(recipient_ip_address), recipient_port_number
-
-    # TODO: test binding to the same port number instead of maintaining socket throughout attempts
     try:
-        sock.sendto(outgoing_bytes, recipient_address)
-        logger.debug(f"{message} sent to {recipient_ip_address}:{recipient_port_number}.")
+        sending_endpoint.send_message(message, recipient_address)
     except Exception as e:
         logger.warning(f"Error: {e} occurred.")
-
-    sock.close()
+    finally:
+        if endpoint is None:
+            sending_endpoint.close()
@@ -0,0 +1,170 @@
+import lzma
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from remote_file_system.fragmentation import get_message_id, MAXIMUM_MESSAGE_SIZE_IN_BYTES
+from remote_file_system.message import (
+    Buffer,
+    Message,
+    CompressedMessage,
+    ReadFileResponse,
+    ReadFileRangeResponse,
+    WriteFileRequest,
+    ConditionalWriteFileRequest,
+    AppendFileRequest,
+    UpdateNotification,
+    UpdateDeltaNotification,
+)
+
+try:
+    # Part of the standard library from Python 3.14.
+    from compression import zstd  # type: ignore
+except ImportError:
+    try:
+        import zstandard as zstd  # type: ignore
+    except ImportError:
+        zstd = None
+
+# Messages carrying less file content than this are sent as they are, as compressing them saves next to nothing.
+MINIMUM_COMPRESSED_SIZE_IN_BYTES = 512
+# Only messages that carry file content are compressed. Their content is in `content`.
+COMPRESSIBLE_MESSAGE_CLASSES = (
+    ReadFileResponse,
+    ReadFileRangeResponse,
+    WriteFileRequest,
+    ConditionalWriteFileRequest,
+    AppendFileRequest,
+    UpdateNotification,
+    UpdateDeltaNotification,
+)
+
+
+class Codec:
+    def __init__(
+        self,
+        codec_id: int,
+        name: str,
+        compress: Callable[[Buffer], bytes],
+        decompress: Callable[[Buffer, int], bytes],
+    ):
+        # Sent in the header of compressed messages, so it must not change. 0 stands for no compression.
+        self.codec_id: int = codec_id
+        self.name: str = name
+        self.compress: Callable[[Buffer], bytes] = compress
+        # Takes the largest size the content may decompress to, and raises ValueError if it decompresses to more.
+        self.decompress: Callable[[Buffer, int], bytes] = decompress
+
+
+def _check_decompressed_size(decompressed_content: bytes, maximum_size_in_bytes: int) -> bytes:
+    if len(decompressed_content) > maximum_size_in_bytes:
+        raise ValueError(f"Compressed content decompresses to more than {maximum_size_in_bytes} bytes.")
+    return decompressed_content
+
+
+def _decompress_stream(decompressor, content: Buffer, maximum_size_in_bytes: int) -> bytes:
+    """
+    The decompressor stops one byte past the limit, so a small message cannot decompress into an arbitrarily large
+    buffer.
+    """
+    decompressed_content: bytes = _check_decompressed_size(
+        decompressor.decompress(content, max_length=maximum_size_in_bytes + 1), maximum_size_in_bytes
+    )
+    if not decompressor.eof:
+        raise ValueError("Compressed content is incomplete.")
+    return decompressed_content
+
+
+def _decompress_zstd(content: Buffer, maximum_size_in_bytes: int) -> bytes:
+    decompressor = zstd.ZstdDecompressor()
+    if not hasattr(decompressor, "stream_reader"):
+        return _decompress_stream(decompressor, content, maximum_size_in_bytes)
+    # The decompressors of the zstandard package take no output limit, but their stream readers do.
+    with decompressor.stream_reader(content) as reader:
+        return _check_decompressed_size(reader.read(maximum_size_in_bytes + 1), maximum_size_in_bytes)
+
+
+# Ordered from the fastest to the slowest codec. lzma compresses best but is too slow to be the default.
+CODECS: List[Codec] = [
+    Codec(
+        1,
+        "zlib",
+        lambda content: zlib.compress(content, 6),
+        lambda content, maximum_size_in_bytes: _decompress_stream(zlib.decompressobj(), content, maximum_size_in_bytes),
+    ),
+    Codec(
+        2,
+        "lzma",
+        lambda content: lzma.compress(content, preset=1),
+        lambda content, maximum_size_in_bytes: _decompress_stream(
+            lzma.LZMADecompressor(), content, maximum_size_in_bytes
+        ),
+    ),
+]
+DECOMPRESSION_ERRORS: Tuple[type, ...] = (ValueError, zlib.error, lzma.LZMAError)
+if zstd is not None:
+    CODECS.insert(0, Codec(3, "zstd", zstd.compress, _decompress_zstd))
+    DECOMPRESSION_ERRORS += (zstd.ZstdError,)
+CODECS_BY_ID: Dict[int, Codec] = {codec.codec_id: codec for codec in CODECS}
+CODECS_BY_NAME: Dict[str, Codec] = {codec.name: codec for codec in CODECS}
+AVAILABLE_CODEC_NAMES: Tuple[str, ...] = tuple(codec.name for codec in CODECS)
+
+
+def get_codec_ids(codec_names: Sequence[str]) -> List[int]:
+    """
+    Raises ValueError for codecs that are not available, such as zstd without the zstandard package.
+    """
+    for codec_name in codec_names:
+        if codec_name not in CODECS_BY_NAME:
+            raise ValueError(f"Compression codec {codec_name} is not available, choose from {AVAILABLE_CODEC_NAMES}.")
+    return [CODECS_BY_NAME[codec_name].codec_id for codec_name in codec_names]
+
+
+def choose_codec_id(offered_codec_ids: Sequence[int], supported_codec_names: Sequence[str]) -> int:
+    """
+    Returns the first of the offered codecs that is supported, or 0 if none is.
+    """
+    supported_codec_ids: List[int] = get_codec_ids(supported_codec_names)
+    for codec_id in offered_codec_ids:
+        if codec_id in supported_codec_ids:
+            return codec_id
+    return 0
+
+
+def compress_message(message: Message, codec_id: int, minimum_compressed_size_in_bytes: int) -> Message:
+    """
+    Returns the message compressed with the codec if it carries at least `minimum_compressed_size_in_bytes` of file
+    content and gets smaller by being compressed, and the message as it is otherwise.
+    """
+    if (
+        not isinstance(message, COMPRESSIBLE_MESSAGE_CLASSES)
+        or message.content is None
+        or len(message.content) < minimum_compressed_size_in_bytes
+    ):
+        return message
+    marshalled_message: bytes = message.marshall()
+    compressed_content: bytes = CODECS_BY_ID[codec_id].compress(marshalled_message)
+    if len(compressed_content) + CompressedMessage.HEADER_FORMAT.size >= len(marshalled_message):
+        return message
+    logger.debug(f"Compressed {len(marshalled_message)} bytes of {message} to {len(compressed_content)} bytes.")
+    return CompressedMessage(get_message_id(message), codec_id, compressed_content)
+
+
+def decompress_message(
+    message: Message, maximum_size_in_bytes: int = MAXIMUM_MESSAGE_SIZE_IN_BYTES
+) -> Optional[Message]:
+    """
+    Returns the message a `CompressedMessage` holds, and any other message as it is. Returns None for a compressed
+    message that cannot be decompressed, or that would decompress to more than `maximum_size_in_bytes`.
+    """
+    if not isinstance(message, CompressedMessage):
+        return message
+    if message.codec_id not in CODECS_BY_ID:
+        logger.warning(f"Dropping a message compressed with the unrecognized codec ID {message.codec_id}.")
+        return None
+    try:
+        return Message.unmarshall(CODECS_BY_ID[message.codec_id].decompress(message.content, maximum_size_in_bytes))
+    except DECOMPRESSION_ERRORS as e:
+        logger.warning(f"Dropping a compressed message of {message.message_id} that failed to decompress: {e}")
+        return None
@@ -0,0 +1,137 @@
+import hashlib
+import math
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from remote_file_system.message import Buffer
+
+# Block sizes used for delta synchronization, which are independent of the block size of the client cache.
+MINIMUM_BLOCK_SIZE_IN_BYTES = 1024
+MAXIMUM_BLOCK_SIZE_IN_BYTES = 64 * 1024
+STRONG_HASH_SIZE_IN_BYTES = 16
+# Modulus of the Adler-32 checksum, which is the rolling hash.
+ADLER_32_MODULUS = 65521
+# The checksum is rolled over the bytes that match no block one at a time in Python, which takes about a third of a
+# second per MiB, so the server only works out deltas for ranges up to this size.
+MAXIMUM_SYNCHRONIZED_SIZE_IN_BYTES = 16 * 1024 * 1024
+# The number of whole blocks in a range of the maximum size, at the block size `get_block_size` picks for it.
+MAXIMUM_NUMBER_OF_BLOCK_HASHES = 4096
+# The server stops looking for blocks and sends the range as it is once more data than this falls between them.
+MAXIMUM_DATA_SIZE_IN_BYTES = 256 * 1024
+
+# Offset of the block in the cached copy, its Adler-32 checksum and its BLAKE2b hash.
+BlockHash = Tuple[int, int, bytes]
+# Either the offset of a block of the cached copy to copy, or data to insert as it is.
+DeltaInstruction = Union[int, Buffer]
+
+
+def get_block_size(number_of_bytes: int) -> int:
+    """
+    About the square root of the size of the range, as with rsync, which balances the size of the block hashes sent
+    by the client against the size of the blocks sent again because a few bytes in them changed.
+    """
+    block_size_in_bytes: int = math.isqrt(number_of_bytes) // MINIMUM_BLOCK_SIZE_IN_BYTES * MINIMUM_BLOCK_SIZE_IN_BYTES
+    return min(max(block_size_in_bytes, MINIMUM_BLOCK_SIZE_IN_BYTES), MAXIMUM_BLOCK_SIZE_IN_BYTES)
+
+
+def compute_strong_hash(content: Buffer) -> bytes:
+    return hashlib.blake2b(content, digest_size=STRONG_HASH_SIZE_IN_BYTES).digest()
+
+
+def compute_block_hashes(content: Buffer, offset: int, block_size_in_bytes: int) -> List[BlockHash]:
+    """
+    Hashes every whole block of the content, which is at `offset` in the file. A shorter block at the end is left out,
+    so it is sent as data if it is needed.
+    """
+    content = memoryview(content)
+    block_hashes: List[BlockHash] = []
+    for block_start in range(0, len(content) - block_size_in_bytes + 1, block_size_in_bytes):
+        block: memoryview = content[block_start : block_start + block_size_in_bytes]
+        block_hashes.append((offset + block_start, zlib.adler32(block), compute_strong_hash(block)))
+    return block_hashes
+
+
+def compute_delta(
+    content: Buffer,
+    block_hashes: List[BlockHash],
+    block_size_in_bytes: int,
+    maximum_data_size_in_bytes: Optional[int] = None,
+) -> Optional[List[DeltaInstruction]]:
+    """
+    Describes the content in terms of the blocks the client has, as rsync does. A window the size of a block slides
+    over the content one byte at a time, and its Adler-32 checksum is rolled along with it. Only windows whose checksum
+    matches a block of the client are hashed with BLAKE2b, and a window whose hash matches as well becomes a copy of
+    that block, after which the window moves past it. The bytes between copies are sent as data. Blocks that moved
+    within the range are found as well as blocks that stayed in place. Returns None as soon as more than
+    `maximum_data_size_in_bytes` would be sent as data, since too few blocks match for the delta to be worth it.
+    """
+    content = memoryview(content)
+    block_offsets_by_weak_hash: Dict[int, Dict[bytes, int]] = {}
+    for block_offset, weak_hash, strong_hash in block_hashes:
+        block_offsets_by_weak_hash.setdefault(weak_hash, {}).setdefault(strong_hash, block_offset)
+
+    instructions: List[DeltaInstruction] = []
+    data_size_in_bytes: int = 0
+    data_start: int = 0
+    position: int = 0
+    is_window_hashed: bool = False
+    a: int = 0
+    b: int = 0
+    while block_offsets_by_weak_hash and 0 < block_size_in_bytes <= len(content) - position:
+        if not is_window_hashed:
+            weak_hash: int = zlib.adler32(content[position : position + block_size_in_bytes])
+            a, b = weak_hash & 0xFFFF, weak_hash >> 16
+            is_window_hashed = True
+
+        candidates: Optional[Dict[bytes, int]] = block_offsets_by_weak_hash.get(b << 16 | a)
+        if candidates is not None:
+            block_offset: Optional[int] = candidates.get(
+                compute_strong_hash(content[position : position + block_size_in_bytes])
+            )
+            if block_offset is not None:
+                if data_start < position:
+                    instructions.append(bytes(content[data_start:position]))
+                    data_size_in_bytes += position - data_start
+                instructions.append(block_offset)
+                position += block_size_in_bytes
+                data_start = position
+                is_window_hashed = False
+                continue
+
+        if position + block_size_in_bytes == len(content):
+            break
+        if maximum_data_size_in_bytes is not None and data_size_in_bytes + position - data_start >= (
+            maximum_data_size_in_bytes
+        ):
+            return None
+        # Roll the checksum one byte forward, dropping the first byte of the window and adding the byte after it.
+        removed_byte: int = content[position]
+        a = (a - removed_byte + content[position + block_size_in_bytes]) % ADLER_32_MODULUS
+        b = (b - block_size_in_bytes * removed_byte + a - 1) % ADLER_32_MODULUS
+        position += 1
+
+    if data_start < len(content):
+        if maximum_data_size_in_bytes is not None and data_size_in_bytes + len(content) - data_start > (
+            maximum_data_size_in_bytes
+        ):
+            return None
+        instructions.append(bytes(content[data_start:]))
+    return instructions
+
+
+def apply_delta(
+    instructions: List[DeltaInstruction], cached_content: Buffer, cached_offset: int, block_size_in_bytes: int
+) -> bytes:
+    """
+    Rebuilds the content from the instructions and the cached copy, of which `cached_content` is the part starting at
+    `cached_offset` in the file.
+    """
+    cached_content = memoryview(cached_content)
+    parts: List[Buffer] = []
+    for instruction in instructions:
+        if isinstance(instruction, int):
+            block_start: int = instruction - cached_offset
+            parts.append(cached_content[block_start : block_start + block_size_in_bytes])
+        else:
+            parts.append(instruction)
+    return b"".join(parts)
@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from loguru import logger
+
+from remote_file_system.message import Buffer, CompressedMessage, Message, MessageFragment, CLASS_ID_FORMAT
+
+# Marshalled messages up to this size are sent as a single datagram; larger ones are split into fragments.
+MAXIMUM_DATAGRAM_SIZE_IN_BYTES = 8192
+FRAGMENT_HEADER_SIZE_IN_BYTES = CLASS_ID_FORMAT.size + MessageFragment.HEADER_FORMAT.size
+MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES = MAXIMUM_DATAGRAM_SIZE_IN_BYTES - FRAGMENT_HEADER_SIZE_IN_BYTES
+# Fragments of larger messages are dropped, so that a forged fragment header cannot make the receiver allocate an
+# arbitrarily large reassembly buffer.
+MAXIMUM_MESSAGE_SIZE_IN_BYTES = 64 * 1024 * 1024
+MAXIMUM_NUMBER_OF_FRAGMENTS = -(-MAXIMUM_MESSAGE_SIZE_IN_BYTES // MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES)
+# Room for the fragments of two messages of the largest size, from however many senders.
+MAXIMUM_REASSEMBLY_SIZE_IN_BYTES = 2 * MAXIMUM_MESSAGE_SIZE_IN_BYTES
+MAXIMUM_NUMBER_OF_INCOMPLETE_MESSAGES = 1024
+MAXIMUM_NUMBER_OF_COMPLETED_MESSAGES = 4096
+# Large enough to hold any UDP datagram.
+RECEIVE_BUFFER_SIZE_IN_BYTES = 65535
+
+
+def get_message_id(message: Message) -> UUID:
+    """
+    Fragments of requests and replies are keyed by the request or reply ID so that retransmissions of the same
+    message land in the same reassembly buffer. Messages without an ID get a fresh one.
+    """
+    if isinstance(message, CompressedMessage):
+        return message.message_id
+    if hasattr(message, "request_id"):
+        return message.request_id
+    if hasattr(message, "reply_id"):
+        return message.reply_id
+    return uuid4()
+
+
+def split_into_datagrams(message: Message) -> Tuple[UUID, List[Buffer]]:
+    """
+    Fragments are built in place in a single buffer, so the content of a large message is copied once, straight into
+    the datagrams, which are slices of that buffer.
+    """
+    message_id: UUID = get_message_id(message)
+    marshalled_parts: List[Buffer] = message.marshall_into_parts()
+    marshalled_message_size: int = sum(len(marshalled_part) for marshalled_part in marshalled_parts)
+    if marshalled_message_size <= MAXIMUM_DATAGRAM_SIZE_IN_BYTES:
+        return message_id, [b"".join(marshalled_parts)]
+
+    number_of_fragments: int = -(-marshalled_message_size // MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES)
+    buffer: memoryview = memoryview(
+        bytearray(number_of_fragments * FRAGMENT_HEADER_SIZE_IN_BYTES + marshalled_message_size)
+    )
+    for fragment_number in range(number_of_fragments):
+        MessageFragment.pack_header_into(
+            buffer, fragment_number * MAXIMUM_DATAGRAM_SIZE_IN_BYTES, message_id, fragment_number, number_of_fragments
+        )
+
+    # Each part is copied into the content of the fragments it spans, skipping over the fragment headers.
+    message_offset: int = 0
+    for marshalled_part in marshalled_parts:
+        marshalled_part = memoryview(marshalled_part)
+        part_offset: int = 0
+        while part_offset < len(marshalled_part):
+            fragment_number, fragment_offset = divmod(message_offset, MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES)
+            number_of_bytes: int = min(
+                len(marshalled_part) - part_offset, MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES - fragment_offset
+            )
+            buffer_offset: int = (
+                fragment_number * MAXIMUM_DATAGRAM_SIZE_IN_BYTES + FRAGMENT_HEADER_SIZE_IN_BYTES + fragment_offset
+            )
+            buffer[buffer_offset : buffer_offset + number_of_bytes] = marshalled_part[
+                part_offset : part_offset + number_of_bytes
+            ]
+            part_offset += number_of_bytes
+            message_offset += number_of_bytes
+
+    datagrams: List[Buffer] = [
+        buffer[
+            fragment_number * MAXIMUM_DATAGRAM_SIZE_IN_BYTES : (fragment_number + 1) * MAXIMUM_DATAGRAM_SIZE_IN_BYTES
+        ]
+        for fragment_number in range(number_of_fragments)
+    ]
+    logger.debug(f"Split {marshalled_message_size} bytes of {message} into {number_of_fragments} fragments.")
+    return message_id, datagrams
+
+
+class FragmentReassembler:
+    """
+    Fragments are kept as they arrive and joined once they are all there, so a fragment header claiming a large number
+    of fragments does not allocate a buffer for the whole message. Every fragment but the last one is full.
+
+    The fragments held for incomplete messages are limited to `maximum_size_in_bytes` in total and to
+    `maximum_number_of_incomplete_messages` messages, beyond which the messages that received a fragment least recently
+    are dropped. The IDs of the last `maximum_number_of_completed_messages` messages that were completed are kept, so
+    that a late duplicate of one of their fragments is dropped rather than starting the message again. A message is
+    only reassembled again if it is sent again from its first fragment, as a retransmitted request is.
+    """
+
+    def __init__(
+        self,
+        maximum_size_in_bytes: int = MAXIMUM_REASSEMBLY_SIZE_IN_BYTES,
+        maximum_number_of_incomplete_messages: int = MAXIMUM_NUMBER_OF_INCOMPLETE_MESSAGES,
+        maximum_number_of_completed_messages: int = MAXIMUM_NUMBER_OF_COMPLETED_MESSAGES,
+    ):
+        self.maximum_size_in_bytes: int = maximum_size_in_bytes
+        self.maximum_number_of_incomplete_messages: int = maximum_number_of_incomplete_messages
+        self.maximum_number_of_completed_messages: int = maximum_number_of_completed_messages
+        self.size_in_bytes: int = 0
+        # Fragments of each incomplete message by fragment number, from the least to the most recently received to.
+        self.fragments: OrderedDict[UUID, Dict[int, Buffer]] = OrderedDict()
+        self.numbers_of_fragments: Dict[UUID, int] = {}
+        self.last_received_timestamps: Dict[UUID, float] = {}
+        self.completed_message_ids: OrderedDict[UUID, None] = OrderedDict()
+
+    def add_fragment(self, fragment: MessageFragment) -> Optional[memoryview]:
+        """
+        Returns the marshalled message once every fragment has been received, otherwise None. Fragments that do not
+        agree with the first fragment of their message on the number of fragments are dropped.
+        """
+        message_id: UUID = fragment.message_id
+        if (
+            fragment.fragment_number >= fragment.number_of_fragments
+            or fragment.number_of_fragments > MAXIMUM_NUMBER_OF_FRAGMENTS
+            or len(fragment.content) > MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES
+            or self.numbers_of_fragments.get(message_id, fragment.number_of_fragments) != fragment.number_of_fragments
+        ):
+            logger.warning(f"Dropping malformed fragment {fragment.fragment_number} of {message_id}.")
+            return None
+        if message_id in self.completed_message_ids:
+            if fragment.fragment_number != 0:
+                logger.debug(f"Dropping late fragment {fragment.fragment_number} of completed message {message_id}.")
+                return None
+            del self.completed_message_ids[message_id]
+        if message_id not in self.fragments:
+            self.fragments[message_id] = {}
+            self.numbers_of_fragments[message_id] = fragment.number_of_fragments
+        fragments: Dict[int, Buffer] = self.fragments[message_id]
+        self.fragments.move_to_end(message_id)
+        self.last_received_timestamps[message_id] = time.monotonic()
+        if fragment.fragment_number not in fragments:
+            fragments[fragment.fragment_number] = fragment.content
+            self.size_in_bytes += len(fragment.content)
+            self._evict_least_recently_received_messages()
+            if message_id not in self.fragments:
+                return None
+
+        if len(fragments) < self.numbers_of_fragments[message_id]:
+            return None
+
+        marshalled_message: bytes = b"".join(fragments[fragment_number] for fragment_number in range(len(fragments)))
+        self._forget(message_id)
+        self.completed_message_ids[message_id] = None
+        while len(self.completed_message_ids) > self.maximum_number_of_completed_messages:
+            self.completed_message_ids.popitem(last=False)
+        return memoryview(marshalled_message)
+
+    def get_missing_fragment_numbers(self, message_id: UUID) -> List[int]:
+        if message_id not in self.fragments:
+            return []
+        fragments: Dict[int, Buffer] = self.fragments[message_id]
+        return [
+            fragment_number
+            for fragment_number in range(self.numbers_of_fragments[message_id])
+            if fragment_number not in fragments
+        ]
+
+    def get_last_received_timestamp(self, message_id: UUID) -> Optional[float]:
+        """
+        Monotonic timestamp at which the latest fragment of an incomplete message arrived, or None if there is none.
+        """
+        return self.last_received_timestamps.get(message_id)
+
+    def get_incomplete_message_ids(self) -> List[UUID]:
+        return list(self.fragments)
+
+    def discard_stale_messages(self, maximum_age_in_seconds: float) -> None:
+        current_timestamp: float = time.monotonic()
+        for message_id, last_received_timestamp in list(self.last_received_timestamps.items()):
+            if current_timestamp - last_received_timestamp > maximum_age_in_seconds:
+                logger.warning(f"Discarding incomplete message {message_id}.")
+                self._forget(message_id)
+
+    def _evict_least_recently_received_messages(self) -> None:
+        while self.fragments and (
+            self.size_in_bytes > self.maximum_size_in_bytes
+            or len(self.fragments) > self.maximum_number_of_incomplete_messages
+        ):
+            message_id: UUID = next(iter(self.fragments))
+            logger.warning(f"Discarding incomplete message {message_id} to make room for other messages.")
+            self._forget(message_id)
+
+    def _forget(self, message_id: UUID) -> None:
+        fragments: Dict[int, Buffer] = self.fragments.pop(message_id)
+        self.size_in_bytes -= sum(len(fragment_content) for fragment_content in fragments.values())
+        del self.numbers_of_fragments[message_id]
+        del self.last_received_timestamps[message_id]
+
+
+class SentFragmentHistory:
+    """
+    Keeps the datagrams of recently sent fragmented messages so that missing fragments can be retransmitted
+    selectively. The oldest messages are forgotten once the byte budget is exceeded.
+    """
+
+    def __init__(self, maximum_size_in_bytes: int = 64 * 1024 * 1024):
+        self.maximum_size_in_bytes: int = maximum_size_in_bytes
+        self.size_in_bytes: int = 0
+        self.datagrams: OrderedDict[UUID, List[Buffer]] = OrderedDict()
+        # Replies may be sent from several server worker threads at once.
+        self.lock: threading.Lock = threading.Lock()
+
+    def record(self, message_id: UUID, datagrams: List[Buffer]) -> None:
+        with self.lock:
+            if message_id in self.datagrams:
+                self.size_in_bytes -= sum(len(datagram) for datagram in self.datagrams.pop(message_id))
+            self.datagrams[message_id] = datagrams
+            self.size_in_bytes += sum(len(datagram) for datagram in datagrams)
+            while self.size_in_bytes > self.maximum_size_in_bytes and len(self.datagrams) > 1:
+                _, evicted_datagrams = self.datagrams.popitem(last=False)
+                self.size_in_bytes -= sum(len(datagram) for datagram in evicted_datagrams)
+
+    def get_datagrams(self, message_id: UUID, fragment_numbers: List[int]) -> List[Buffer]:
+        with self.lock:
+            datagrams: List[Buffer] = self.datagrams.get(message_id, [])
+        return [datagrams[fragment_number] for fragment_number in fragment_numbers if fragment_number < len(datagrams)]
@@ -1,11 +1,25 @@
 import socket
+import struct
 from abc import ABC, abstractmethod
 from ipaddress import IPv4Address
-from typing import Dict, Type, Callable
+from typing import Dict, Type, Callable, List, Tuple, Union
 from uuid import UUID
 
+Buffer = Union[bytes, bytearray, memoryview]
+
+CLASS_ID_FORMAT = struct.Struct(">I")
+# Raised by `Message.unmarshall` for datagrams that are truncated or otherwise malformed.
+UNMARSHALLING_ERRORS: Tuple[type, ...] = (RuntimeError, struct.error, ValueError, IndexError)
+
 
 class Message(ABC):
+    """
+    Messages are marshalled into a list of buffers: the fixed-size fields are packed with precompiled `struct.Struct`
+    formats and payloads such as file content are passed along as they are. The buffers are only joined once, when the
+    datagrams are built. Unmarshalling works on a `memoryview`, so payloads are slices of the received datagram rather
+    than copies of it.
+    """
+
     class_id_to_class_ref: Dict[int, Type["Message"]] = {}
     class_ref_to_class_id: Dict[Type["Message"], int] = {}
 
@@ -19,48 +33,61 @@ class Message(ABC):
         return decorator
 
     def marshall(self) -> bytes:
+        return b"".join(self.marshall_into_parts())
+
+    def marshall_into_parts(self) -> List[Buffer]:
         class_ref: Type["Message"] = self.__class__
         if class_ref not in self.class_ref_to_class_id:
             raise RuntimeError(f"Unrecognized class reference: {class_ref}")
-        class_id: bytes = self.class_ref_to_class_id[self.__class__].to_bytes(4, "big")
-        return class_id + self._marshall_without_type_info()
+        class_id: bytes = CLASS_ID_FORMAT.pack(self.class_ref_to_class_id[self.__class__])
+        return [class_id, *self._marshall_parts_without_type_info()]
 
     @classmethod
-    def unmarshall(cls, content: bytes) -> "Message":
-        class_id: int = int.from_bytes(content[0:4], "big")
+    def unmarshall(cls, content: Buffer) -> "Message":
+        content = memoryview(content)
+        (class_id,) = CLASS_ID_FORMAT.unpack_from(content)
         if class_id not in cls.class_id_to_class_ref:
             raise RuntimeError(f"Unrecognized class ID: {class_id}")
         class_ref = cls.class_id_to_class_ref[class_id]
-        return class_ref._unmarshall_without_type_info(content[4:])
+        return class_ref._unmarshall_without_type_info(content[CLASS_ID_FORMAT.size :])
+
+    def __reduce__(self):
+        # Payloads may be memoryviews, which cannot be pickled, so messages are pickled in their marshalled form, for
+        # example when replies are stored in a message history shared by several server processes.
+        return Message.unmarshall, (self.marshall(),)
 
-    @abstractmethod
     def _marshall_without_type_info(self) -> bytes:
+        return b"".join(self._marshall_parts_without_type_info())
+
+    @abstractmethod
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
         pass
 
     @staticmethod
     @abstractmethod
-    def _unmarshall_without_type_info(content: bytes) -> "Message":
+    def _unmarshall_without_type_info(content: Buffer) -> "Message":
         pass
 
 
 # TODO for all subclasses of Message, standardise the name of the argument with `file_path` of `Path` type not `str`
 @Message.register_subclass(class_id=1)
 class ReadFileRequest(Message):
+    # Request ID and file name length.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
     def __init__(self, request_id: UUID, filename: str):
         self.request_id: UUID = request_id
         self.file_name: str = filename
 
-    def _marshall_without_type_info(self) -> bytes:
-        request_id: bytes = self.request_id.bytes
-        file_name: bytearray = bytearray(self.file_name, encoding="utf-8")
-        file_name_length: bytes = len(file_name).to_bytes(4, "big")
-        return request_id + file_name_length + file_name
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        return [ReadFileRequest.HEADER_FORMAT.pack(self.request_id.bytes, len(file_name)), file_name]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "ReadFileRequest":
-        request_id: UUID = UUID(bytes=content[0:16])
-        file_name: str = content[20:].decode("utf-8")
-        return ReadFileRequest(request_id, file_name)
+    def _unmarshall_without_type_info(content: Buffer) -> "ReadFileRequest":
+        request_id, _ = ReadFileRequest.HEADER_FORMAT.unpack_from(content)
+        file_name: str = str(content[ReadFileRequest.HEADER_FORMAT.size :], "utf-8")
+        return ReadFileRequest(UUID(bytes=request_id), file_name)
 
     def __eq__(self, other):
         return (
@@ -72,35 +99,30 @@ class ReadFileRequest(Message):
 
 @Message.register_subclass(class_id=2)
 class WriteFileRequest(Message):
-    def __init__(self, request_id: UUID, offset: int, file_name: str, content: bytes):
+    # Request ID, offset, file name length and content length.
+    HEADER_FORMAT = struct.Struct(">16sIII")
+
+    def __init__(self, request_id: UUID, offset: int, file_name: str, content: Buffer):
         self.request_id: UUID = request_id
         self.offset: int = offset
         self.file_name: str = file_name
-        self.content: bytes = content
-
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.request_id.bytes
-        byte_offset: bytes = self.offset.to_bytes(4, "big")
-        byte_filename: bytearray = bytearray(self.file_name, encoding="utf-8")
-        byte_filename_length: bytes = (len(byte_filename)).to_bytes(4, "big")
-        byte_content: bytes = self.content
-        byte_content_length: bytes = (len(byte_content)).to_bytes(4, "big")
+        self.content: Buffer = content
 
-        marshalled_content = (
-            byte_id + byte_offset + byte_filename_length + byte_content_length + byte_filename + byte_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        header: bytes = WriteFileRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes, self.offset, len(file_name), len(self.content)
         )
-        return marshalled_content
+        return [header, file_name, self.content]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "WriteFileRequest":
-        request_id: UUID = UUID(bytes=content[0:16])
-        offset = int.from_bytes(content[16:20], "big")
-        filename_length = int.from_bytes(content[20:24], "big")
-        content_length = int.from_bytes(content[24:28], "big")
-        filename = content[28 : 28 + filename_length].decode("utf-8")
-        file_content = content[28 + filename_length : 28 + filename_length + content_length]
-
-        return WriteFileRequest(request_id, offset, filename, file_content)
+    def _unmarshall_without_type_info(content: Buffer) -> "WriteFileRequest":
+        request_id, offset, file_name_length, content_length = WriteFileRequest.HEADER_FORMAT.unpack_from(content)
+        file_name_start: int = WriteFileRequest.HEADER_FORMAT.size
+        file_content_start: int = file_name_start + file_name_length
+        file_name: str = str(content[file_name_start:file_content_start], "utf-8")
+        file_content: Buffer = content[file_content_start : file_content_start + content_length]
+        return WriteFileRequest(UUID(bytes=request_id), offset, file_name, file_content)
 
     def __eq__(self, other):
         return (
@@ -114,6 +136,9 @@ class WriteFileRequest(Message):
 
 @Message.register_subclass(class_id=3)
 class SubscribeToUpdatesRequest(Message):
+    # Request ID, client IP address, client port number, monitoring interval and file name length.
+    HEADER_FORMAT = struct.Struct(">16s4sIII")
+
     def __init__(
         self,
         request_id: UUID,
@@ -130,27 +155,31 @@ class SubscribeToUpdatesRequest(Message):
         self.file_name_length: int = file_name_length
         self.file_name: str = file_name
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.request_id.bytes
-        client_ip_address: bytes = socket.inet_aton(str(self.client_ip_address))
-        client_port_number: bytes = self.client_port_number.to_bytes(4, "big")
-        monitoring_interval: bytes = self.monitoring_interval.to_bytes(4, "big")
-        file_name_length: bytes = self.file_name_length.to_bytes(4, "big")
-        file_name: bytearray = bytearray(self.file_name, encoding="utf-8")
-
-        return byte_id + client_ip_address + client_port_number + monitoring_interval + file_name_length + file_name
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = SubscribeToUpdatesRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes,
+            socket.inet_aton(str(self.client_ip_address)),
+            self.client_port_number,
+            self.monitoring_interval,
+            self.file_name_length,
+        )
+        return [header, self.file_name.encode("utf-8")]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "SubscribeToUpdatesRequest":
-        request_id: UUID = UUID(bytes=content[0:16])
-        client_ip_address: IPv4Address = IPv4Address(socket.inet_ntoa(content[16:20]))
-        client_port_number: int = int.from_bytes(content[20:24], "big")
-        monitoring_interval: int = int.from_bytes(content[24:28], "big")
-        filename_length: int = int.from_bytes(content[28:32], "big")
-        file_name: str = content[32 : 32 + filename_length].decode("utf-8")
+    def _unmarshall_without_type_info(content: Buffer) -> "SubscribeToUpdatesRequest":
+        request_id, client_ip_address, client_port_number, monitoring_interval, file_name_length = (
+            SubscribeToUpdatesRequest.HEADER_FORMAT.unpack_from(content)
+        )
+        file_name_start: int = SubscribeToUpdatesRequest.HEADER_FORMAT.size
+        file_name: str = str(content[file_name_start : file_name_start + file_name_length], "utf-8")
 
         return SubscribeToUpdatesRequest(
-            request_id, client_ip_address, client_port_number, monitoring_interval, filename_length, file_name
+            UUID(bytes=request_id),
+            IPv4Address(socket.inet_ntoa(client_ip_address)),
+            client_port_number,
+            monitoring_interval,
+            file_name_length,
+            file_name,
         )
 
     def __eq__(self, other):
@@ -167,21 +196,20 @@ class SubscribeToUpdatesRequest(Message):
 
 @Message.register_subclass(class_id=4)
 class SubscribeToUpdatesResponse(Message):
+    # Reply ID and whether the operation was successful.
+    HEADER_FORMAT = struct.Struct(">16s?")
+
     def __init__(self, reply_id: UUID, is_successful: bool):
         self.reply_id: UUID = reply_id
         self.is_successful: bool = is_successful
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.reply_id.bytes
-        byte_success: bytes = int(self.is_successful).to_bytes(1, "big")
-        marshalled_content = byte_id + byte_success
-        return marshalled_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [SubscribeToUpdatesResponse.HEADER_FORMAT.pack(self.reply_id.bytes, self.is_successful)]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "SubscribeToUpdatesResponse":
-        reply_id = UUID(bytes=content[0:16])
-        is_successful = bool(int.from_bytes(content[16:], "big"))
-        return SubscribeToUpdatesResponse(reply_id, is_successful)
+    def _unmarshall_without_type_info(content: Buffer) -> "SubscribeToUpdatesResponse":
+        reply_id, is_successful = SubscribeToUpdatesResponse.HEADER_FORMAT.unpack_from(content)
+        return SubscribeToUpdatesResponse(UUID(bytes=reply_id), is_successful)
 
     def __eq__(self, other):
         return (
@@ -193,23 +221,26 @@ class SubscribeToUpdatesResponse(Message):
 
 @Message.register_subclass(class_id=5)
 class ReadFileResponse(Message):
-    def __init__(self, reply_id: UUID, content: bytes | None, modification_timestamp: int):
+    # Reply ID, modification timestamp and version.
+    HEADER_FORMAT = struct.Struct(">16sIQ")
+
+    def __init__(self, reply_id: UUID, content: Buffer | None, modification_timestamp: int, version: int):
         self.reply_id: UUID = reply_id
         self.modification_timestamp: int = modification_timestamp
-        self.content: bytes = content
+        self.version: int = version
+        self.content: Buffer = content
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.reply_id.bytes
-        modification_time: bytes = self.modification_timestamp.to_bytes(4, "big")
-        marshalled_content: bytes = byte_id + modification_time + self.content
-        return marshalled_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = ReadFileResponse.HEADER_FORMAT.pack(
+            self.reply_id.bytes, self.modification_timestamp, self.version
+        )
+        return [header, self.content]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "ReadFileResponse":
-        reply_id = UUID(bytes=content[0:16])
-        modification_time = int.from_bytes(content[16:20], "big")
-        content = content[20:]
-        return ReadFileResponse(reply_id, content, modification_time)
+    def _unmarshall_without_type_info(content: Buffer) -> "ReadFileResponse":
+        reply_id, modification_timestamp, version = ReadFileResponse.HEADER_FORMAT.unpack_from(content)
+        file_content: Buffer = content[ReadFileResponse.HEADER_FORMAT.size :]
+        return ReadFileResponse(UUID(bytes=reply_id), file_content, modification_timestamp, version)
 
     def __eq__(self, other):
         return (
@@ -217,29 +248,32 @@ class ReadFileResponse(Message):
             and self.reply_id == other.reply_id
             and self.content == other.content
             and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
         )
 
 
 @Message.register_subclass(class_id=6)
 class WriteFileResponse(Message):
-    def __init__(self, reply_id: UUID, is_successful: bool, modification_timestamp=None):
+    # Reply ID, whether the operation was successful, modification timestamp and version.
+    HEADER_FORMAT = struct.Struct(">16s?IQ")
+
+    def __init__(self, reply_id: UUID, is_successful: bool, modification_timestamp=None, version: int = 0):
         self.reply_id: UUID = reply_id
         self.is_successful: bool = is_successful
         self.modification_timestamp: int = modification_timestamp
+        self.version: int = version
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.reply_id.bytes
-        byte_success: bytes = int(self.is_successful).to_bytes(1, "big")
-        modification_timestamp: bytes = self.modification_timestamp.to_bytes(4, "big")
-        marshalled_content = byte_id + byte_success + modification_timestamp
-        return marshalled_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [
+            WriteFileResponse.HEADER_FORMAT.pack(
+                self.reply_id.bytes, self.is_successful, self.modification_timestamp, self.version
+            )
+        ]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "WriteFileResponse":
-        reply_id = UUID(bytes=content[0:16])
-        is_successful = bool(int.from_bytes(content[16:17], "big"))
-        modification_timestamp = int.from_bytes(content[17:], "big")
-        return WriteFileResponse(reply_id, is_successful, modification_timestamp)
+    def _unmarshall_without_type_info(content: Buffer) -> "WriteFileResponse":
+        reply_id, is_successful, modification_timestamp, version = WriteFileResponse.HEADER_FORMAT.unpack_from(content)
+        return WriteFileResponse(UUID(bytes=reply_id), is_successful, modification_timestamp, version)
 
     def __eq__(self, other):
         return (
@@ -247,32 +281,43 @@ class WriteFileResponse(Message):
             and self.reply_id == other.reply_id
             and self.is_successful == other.is_successful
             and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
         )
 
 
 @Message.register_subclass(class_id=7)
 class UpdateNotification(Message):
-    def __init__(self, file_name: str, content: bytes, modification_timestamp: int):
+    FILE_NAME_LENGTH_FORMAT = struct.Struct(">I")
+    # Modification timestamp, version and content length, which follow the file name.
+    CONTENT_HEADER_FORMAT = struct.Struct(">IQI")
+
+    def __init__(self, file_name: str, content: Buffer, modification_timestamp: int, version: int):
         self.file_name: str = file_name
         self.modification_timestamp = modification_timestamp
-        self.content: bytes = content
-
-    def _marshall_without_type_info(self) -> bytes:
-        file_name_length: bytes = (len(self.file_name)).to_bytes(4, "big")
-        file_name: bytearray = bytearray(self.file_name, encoding="utf-8")
-        modification_timestamp: bytes = (self.modification_timestamp).to_bytes(4, "big")
-        byte_content: bytes = self.content
-        byte_content_length: bytes = (len(byte_content)).to_bytes(4, "big")
-        return file_name_length + file_name + modification_timestamp + byte_content_length + byte_content
+        self.version: int = version
+        self.content: Buffer = content
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        return [
+            UpdateNotification.FILE_NAME_LENGTH_FORMAT.pack(len(file_name)),
+            file_name,
+            UpdateNotification.CONTENT_HEADER_FORMAT.pack(self.modification_timestamp, self.version, len(self.content)),
+            self.content,
+        ]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "UpdateNotification":
-        file_name_length: int = int.from_bytes(content[0:4], "big")
-        file_name: str = content[4 : 4 + file_name_length].decode("utf-8")
-        modification_timestamp: int = int.from_bytes(content[4 + file_name_length : 8 + file_name_length], "big")
-        content_length: int = int.from_bytes(content[8 + file_name_length : 12 + file_name_length], "big")
-        content: bytes = content[12 + file_name_length :]
-        return UpdateNotification(file_name, content, modification_timestamp)
+    def _unmarshall_without_type_info(content: Buffer) -> "UpdateNotification":
+        (file_name_length,) = UpdateNotification.FILE_NAME_LENGTH_FORMAT.unpack_from(content)
+        file_name_start: int = UpdateNotification.FILE_NAME_LENGTH_FORMAT.size
+        content_header_start: int = file_name_start + file_name_length
+        file_name: str = str(content[file_name_start:content_header_start], "utf-8")
+        modification_timestamp, version, content_length = UpdateNotification.CONTENT_HEADER_FORMAT.unpack_from(
+            content, content_header_start
+        )
+        file_content_start: int = content_header_start + UpdateNotification.CONTENT_HEADER_FORMAT.size
+        file_content: Buffer = content[file_content_start : file_content_start + content_length]
+        return UpdateNotification(file_name, file_content, modification_timestamp, version)
 
     def __eq__(self, other):
         return (
@@ -280,25 +325,27 @@ class UpdateNotification(Message):
             and self.file_name == other.file_name
             and self.content == other.content
             and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
         )
 
 
 @Message.register_subclass(class_id=8)
 class ModifiedTimestampRequest(Message):
+    # Request ID.
+    HEADER_FORMAT = struct.Struct(">16s")
+
     def __init__(self, file_path: str, request_id: UUID):
         self.file_path = file_path
         self.request_id: UUID = request_id
 
-    def _marshall_without_type_info(self) -> bytes:
-        request_id_bytes = self.request_id.bytes
-        filepath_bytes: bytes = bytearray(self.file_path, encoding="utf-8")
-        return request_id_bytes + filepath_bytes
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [self.request_id.bytes, self.file_path.encode("utf-8")]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "ModifiedTimestampRequest":
-        request_id: UUID = UUID(bytes=content[0:16])
-        file_path: str = content[16:].decode("utf-8")
-        return ModifiedTimestampRequest(file_path, request_id)
+    def _unmarshall_without_type_info(content: Buffer) -> "ModifiedTimestampRequest":
+        (request_id,) = ModifiedTimestampRequest.HEADER_FORMAT.unpack_from(content)
+        file_path: str = str(content[ModifiedTimestampRequest.HEADER_FORMAT.size :], "utf-8")
+        return ModifiedTimestampRequest(file_path, UUID(bytes=request_id))
 
     def __eq__(self, other):
         return (
@@ -310,26 +357,32 @@ class ModifiedTimestampRequest(Message):
 
 @Message.register_subclass(class_id=9)
 class ModifiedTimestampResponse(Message):
-    def __init__(self, reply_id: UUID, is_successful: bool, modification_timestamp: int):
+    # Reply ID, whether the check was successful, modification timestamp and version.
+    HEADER_FORMAT = struct.Struct(">16s?IQ")
+
+    def __init__(self, reply_id: UUID, is_successful: bool, modification_timestamp: int, version: int):
         self.reply_id: UUID = reply_id
         self.modification_timestamp: int = modification_timestamp
+        self.version: int = version
         self.is_successful: bool = is_successful
 
-    def _marshall_without_type_info(self) -> bytes:
-        reply_id_bytes: bytes = self.reply_id.bytes
-        is_successful_bytes: bytes = int(self.is_successful).to_bytes(1, "big")
-        modification_timestamp_bytes: bytes = self.modification_timestamp.to_bytes(4, "big")
-        return reply_id_bytes + is_successful_bytes + modification_timestamp_bytes
-
-    @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "ModifiedTimestampResponse":
-        reply_id_bytes: bytes = content[0:16]
-        reply_id: UUID = UUID(bytes=reply_id_bytes)
-        is_successful: bool = bool(int.from_bytes(content[16:17], "big"))
-        modification_timestamp_bytes: bytes = content[17:]
-        modification_timestamp: int = int.from_bytes(modification_timestamp_bytes, "big")
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [
+            ModifiedTimestampResponse.HEADER_FORMAT.pack(
+                self.reply_id.bytes, self.is_successful, self.modification_timestamp, self.version
+            )
+        ]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ModifiedTimestampResponse":
+        reply_id, is_successful, modification_timestamp, version = ModifiedTimestampResponse.HEADER_FORMAT.unpack_from(
+            content
+        )
         return ModifiedTimestampResponse(
-            reply_id=reply_id, modification_timestamp=modification_timestamp, is_successful=is_successful
+            reply_id=UUID(bytes=reply_id),
+            modification_timestamp=modification_timestamp,
+            version=version,
+            is_successful=is_successful,
         )
 
     def __eq__(self, other) -> bool:
@@ -337,27 +390,29 @@ class ModifiedTimestampResponse(Message):
             isinstance(other, ModifiedTimestampResponse)
             and self.reply_id == other.reply_id
             and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
             and self.is_successful == other.is_successful
         )
 
 
 @Message.register_subclass(class_id=10)
 class DeleteFileRequest(Message):
+    # Request ID and file name length.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
     def __init__(self, request_id: UUID, filename: str):
         self.request_id: UUID = request_id
         self.file_name: str = filename
 
-    def _marshall_without_type_info(self) -> bytes:
-        request_id: bytes = self.request_id.bytes
-        file_name: bytearray = bytearray(self.file_name, encoding="utf-8")
-        file_name_length: bytes = len(file_name).to_bytes(4, "big")
-        return request_id + file_name_length + file_name
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        return [DeleteFileRequest.HEADER_FORMAT.pack(self.request_id.bytes, len(file_name)), file_name]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "DeleteFileRequest":
-        request_id: UUID = UUID(bytes=content[0:16])
-        file_name: str = content[20:].decode("utf-8")
-        return DeleteFileRequest(request_id, file_name)
+    def _unmarshall_without_type_info(content: Buffer) -> "DeleteFileRequest":
+        request_id, _ = DeleteFileRequest.HEADER_FORMAT.unpack_from(content)
+        file_name: str = str(content[DeleteFileRequest.HEADER_FORMAT.size :], "utf-8")
+        return DeleteFileRequest(UUID(bytes=request_id), file_name)
 
     def __eq__(self, other):
         return (
@@ -369,21 +424,20 @@ class DeleteFileRequest(Message):
 
 @Message.register_subclass(class_id=11)
 class DeleteFileResponse(Message):
+    # Reply ID and whether the operation was successful.
+    HEADER_FORMAT = struct.Struct(">16s?")
+
     def __init__(self, reply_id: UUID, is_successful: bool):
         self.reply_id: UUID = reply_id
         self.is_successful: bool = is_successful
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.reply_id.bytes
-        byte_success: bytes = int(self.is_successful).to_bytes(1, "big")
-        marshalled_content: bytes = byte_id + byte_success
-        return marshalled_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [DeleteFileResponse.HEADER_FORMAT.pack(self.reply_id.bytes, self.is_successful)]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "DeleteFileResponse":
-        reply_id = UUID(bytes=content[0:16])
-        is_successful = bool(int.from_bytes(content[16:], "big"))
-        return DeleteFileResponse(reply_id, is_successful)
+    def _unmarshall_without_type_info(content: Buffer) -> "DeleteFileResponse":
+        reply_id, is_successful = DeleteFileResponse.HEADER_FORMAT.unpack_from(content)
+        return DeleteFileResponse(UUID(bytes=reply_id), is_successful)
 
     def __eq__(self, other):
         return (
@@ -395,28 +449,25 @@ class DeleteFileResponse(Message):
 
 @Message.register_subclass(class_id=12)
 class AppendFileRequest(Message):
-    def __init__(self, request_id: UUID, file_name: str, content: bytes):
+    # Request ID and file name length.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
+    def __init__(self, request_id: UUID, file_name: str, content: Buffer):
         self.request_id: UUID = request_id
         self.file_name: str = file_name
-        self.content: bytes = content
+        self.content: Buffer = content
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.request_id.bytes
-        byte_filename: bytearray = bytearray(self.file_name, encoding="utf-8")
-        byte_filename_length: bytes = (len(byte_filename)).to_bytes(4, "big")
-        byte_content: bytes = self.content
-
-        marshalled_content = byte_id + byte_filename_length + byte_filename + byte_content
-        return marshalled_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        return [AppendFileRequest.HEADER_FORMAT.pack(self.request_id.bytes, len(file_name)), file_name, self.content]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "AppendFileRequest":
-        request_id: UUID = UUID(bytes=content[0:16])
-        filename_length = int.from_bytes(content[16:20], "big")
-        filename = content[20 : 20 + filename_length].decode("utf-8")
-        file_content = content[20 + filename_length :]
-
-        return AppendFileRequest(request_id, filename, file_content)
+    def _unmarshall_without_type_info(content: Buffer) -> "AppendFileRequest":
+        request_id, file_name_length = AppendFileRequest.HEADER_FORMAT.unpack_from(content)
+        file_name_start: int = AppendFileRequest.HEADER_FORMAT.size
+        file_content_start: int = file_name_start + file_name_length
+        file_name: str = str(content[file_name_start:file_content_start], "utf-8")
+        return AppendFileRequest(UUID(bytes=request_id), file_name, content[file_content_start:])
 
     def __eq__(self, other):
         return (
@@ -429,24 +480,26 @@ class AppendFileRequest(Message):
 
 @Message.register_subclass(class_id=13)
 class AppendFileResponse(Message):
-    def __init__(self, reply_id: UUID, is_successful: bool, modification_timestamp=None):
+    # Reply ID, whether the operation was successful, modification timestamp and version.
+    HEADER_FORMAT = struct.Struct(">16s?IQ")
+
+    def __init__(self, reply_id: UUID, is_successful: bool, modification_timestamp=None, version: int = 0):
         self.reply_id: UUID = reply_id
         self.is_successful: bool = is_successful
         self.modification_timestamp: int = modification_timestamp
+        self.version: int = version
 
-    def _marshall_without_type_info(self) -> bytes:
-        byte_id: bytes = self.reply_id.bytes
-        byte_success: bytes = int(self.is_successful).to_bytes(1, "big")
-        modification_timestamp: bytes = self.modification_timestamp.to_bytes(4, "big")
-        marshalled_content = byte_id + byte_success + modification_timestamp
-        return marshalled_content
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [
+            AppendFileResponse.HEADER_FORMAT.pack(
+                self.reply_id.bytes, self.is_successful, self.modification_timestamp, self.version
+            )
+        ]
 
     @staticmethod
-    def _unmarshall_without_type_info(content: bytes) -> "AppendFileResponse":
-        reply_id = UUID(bytes=content[0:16])
-        is_successful = bool(int.from_bytes(content[16:17], "big"))
-        modification_timestamp = int.from_bytes(content[17:], "big")
-        return AppendFileResponse(reply_id, is_successful, modification_timestamp)
+    def _unmarshall_without_type_info(content: Buffer) -> "AppendFileResponse":
+        reply_id, is_successful, modification_timestamp, version = AppendFileResponse.HEADER_FORMAT.unpack_from(content)
+        return AppendFileResponse(UUID(bytes=reply_id), is_successful, modification_timestamp, version)
 
     def __eq__(self, other):
         return (
@@ -454,4 +507,950 @@ class AppendFileResponse(Message):
             and self.reply_id == other.reply_id
             and self.is_successful == other.is_successful
             and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
+        )
+
+
+@Message.register_subclass(class_id=14)
+class MessageFragment(Message):
+    # Message ID, fragment number and number of fragments.
+    HEADER_FORMAT = struct.Struct(">16sII")
+
+    def __init__(self, message_id: UUID, fragment_number: int, number_of_fragments: int, content: Buffer):
+        self.message_id: UUID = message_id
+        self.fragment_number: int = fragment_number
+        self.number_of_fragments: int = number_of_fragments
+        self.content: Buffer = content
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = MessageFragment.HEADER_FORMAT.pack(
+            self.message_id.bytes, self.fragment_number, self.number_of_fragments
+        )
+        return [header, self.content]
+
+    @staticmethod
+    def pack_header_into(
+        buffer: Buffer, offset: int, message_id: UUID, fragment_number: int, number_of_fragments: int
+    ) -> None:
+        """
+        Writes the class ID and header of a fragment into a buffer, so that fragments can be built in place without
+        copying their content more than once.
+        """
+        CLASS_ID_FORMAT.pack_into(buffer, offset, Message.class_ref_to_class_id[MessageFragment])
+        MessageFragment.HEADER_FORMAT.pack_into(
+            buffer, offset + CLASS_ID_FORMAT.size, message_id.bytes, fragment_number, number_of_fragments
+        )
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "MessageFragment":
+        message_id, fragment_number, number_of_fragments = MessageFragment.HEADER_FORMAT.unpack_from(content)
+        fragment_content: Buffer = content[MessageFragment.HEADER_FORMAT.size :]
+        return MessageFragment(UUID(bytes=message_id), fragment_number, number_of_fragments, fragment_content)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, MessageFragment)
+            and self.message_id == other.message_id
+            and self.fragment_number == other.fragment_number
+            and self.number_of_fragments == other.number_of_fragments
+            and self.content == other.content
+        )
+
+
+@Message.register_subclass(class_id=15)
+class FragmentRetransmissionRequest(Message):
+    # Message ID and number of missing fragments.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
+    def __init__(self, message_id: UUID, missing_fragment_numbers: List[int]):
+        self.message_id: UUID = message_id
+        self.missing_fragment_numbers: List[int] = missing_fragment_numbers
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        number_of_missing_fragments: int = len(self.missing_fragment_numbers)
+        return [
+            FragmentRetransmissionRequest.HEADER_FORMAT.pack(self.message_id.bytes, number_of_missing_fragments),
+            struct.pack(f">{number_of_missing_fragments}I", *self.missing_fragment_numbers),
+        ]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "FragmentRetransmissionRequest":
+        message_id, number_of_missing_fragments = FragmentRetransmissionRequest.HEADER_FORMAT.unpack_from(content)
+        missing_fragment_numbers: List[int] = list(
+            struct.unpack_from(
+                f">{number_of_missing_fragments}I", content, FragmentRetransmissionRequest.HEADER_FORMAT.size
+            )
+        )
+        return FragmentRetransmissionRequest(UUID(bytes=message_id), missing_fragment_numbers)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, FragmentRetransmissionRequest)
+            and self.message_id == other.message_id
+            and self.missing_fragment_numbers == other.missing_fragment_numbers
+        )
+
+
+@Message.register_subclass(class_id=16)
+class ReadFileRangeRequest(Message):
+    """
+    A client asks for a lease on the file by setting `lease_duration_in_seconds`. See `LeaseRevocationNotification`.
+    """
+
+    # Request ID, offset, number of bytes and requested lease duration.
+    HEADER_FORMAT = struct.Struct(">16sQQI")
+
+    def __init__(
+        self, request_id: UUID, file_name: str, offset: int, number_of_bytes: int, lease_duration_in_seconds: int = 0
+    ):
+        self.request_id: UUID = request_id
+        self.file_name: str = file_name
+        self.offset: int = offset
+        self.number_of_bytes: int = number_of_bytes
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = ReadFileRangeRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes, self.offset, self.number_of_bytes, self.lease_duration_in_seconds
+        )
+        return [header, self.file_name.encode("utf-8")]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ReadFileRangeRequest":
+        request_id, offset, number_of_bytes, lease_duration_in_seconds = ReadFileRangeRequest.HEADER_FORMAT.unpack_from(
+            content
+        )
+        file_name: str = str(content[ReadFileRangeRequest.HEADER_FORMAT.size :], "utf-8")
+        return ReadFileRangeRequest(
+            UUID(bytes=request_id), file_name, offset, number_of_bytes, lease_duration_in_seconds
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ReadFileRangeRequest)
+            and self.request_id == other.request_id
+            and self.file_name == other.file_name
+            and self.offset == other.offset
+            and self.number_of_bytes == other.number_of_bytes
+            and self.lease_duration_in_seconds == other.lease_duration_in_seconds
+        )
+
+
+@Message.register_subclass(class_id=17)
+class ReadFileRangeResponse(Message):
+    """
+    `lease_duration_in_seconds` is the duration of the lease granted on the file, or 0 if none was granted.
+    """
+
+    # Reply ID, whether the read was successful, offset, file size, modification timestamp, version and lease duration.
+    HEADER_FORMAT = struct.Struct(">16s?QQIQI")
+
+    def __init__(
+        self,
+        reply_id: UUID,
+        is_successful: bool,
+        offset: int,
+        file_size: int,
+        modification_timestamp: int,
+        version: int,
+        content: Buffer,
+        lease_duration_in_seconds: int = 0,
+    ):
+        self.reply_id: UUID = reply_id
+        self.is_successful: bool = is_successful
+        self.offset: int = offset
+        self.file_size: int = file_size
+        self.modification_timestamp: int = modification_timestamp
+        self.version: int = version
+        self.content: Buffer = content
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = ReadFileRangeResponse.HEADER_FORMAT.pack(
+            self.reply_id.bytes,
+            self.is_successful,
+            self.offset,
+            self.file_size,
+            self.modification_timestamp,
+            self.version,
+            self.lease_duration_in_seconds,
+        )
+        return [header, self.content]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ReadFileRangeResponse":
+        reply_id, is_successful, offset, file_size, modification_timestamp, version, lease_duration_in_seconds = (
+            ReadFileRangeResponse.HEADER_FORMAT.unpack_from(content)
+        )
+        file_content: Buffer = content[ReadFileRangeResponse.HEADER_FORMAT.size :]
+        return ReadFileRangeResponse(
+            UUID(bytes=reply_id),
+            is_successful,
+            offset,
+            file_size,
+            modification_timestamp,
+            version,
+            file_content,
+            lease_duration_in_seconds,
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ReadFileRangeResponse)
+            and self.reply_id == other.reply_id
+            and self.is_successful == other.is_successful
+            and self.offset == other.offset
+            and self.file_size == other.file_size
+            and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
+            and self.content == other.content
+            and self.lease_duration_in_seconds == other.lease_duration_in_seconds
+        )
+
+
+@Message.register_subclass(class_id=18)
+class UpdateDeltaNotification(Message):
+    """
+    Carries only the bytes that a write or append changed. Subscribers apply it to a cached copy whose version matches
+    `previous_version`, and fetch the whole file otherwise.
+    """
+
+    # Offset, file size, previous version, version, modification timestamp and file name length.
+    HEADER_FORMAT = struct.Struct(">QQQQII")
+
+    def __init__(
+        self,
+        file_name: str,
+        offset: int,
+        file_size: int,
+        previous_version: int,
+        version: int,
+        modification_timestamp: int,
+        content: Buffer,
+    ):
+        self.file_name: str = file_name
+        self.offset: int = offset
+        self.file_size: int = file_size
+        self.previous_version: int = previous_version
+        self.version: int = version
+        self.modification_timestamp: int = modification_timestamp
+        self.content: Buffer = content
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        header: bytes = UpdateDeltaNotification.HEADER_FORMAT.pack(
+            self.offset,
+            self.file_size,
+            self.previous_version,
+            self.version,
+            self.modification_timestamp,
+            len(file_name),
+        )
+        return [header, file_name, self.content]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "UpdateDeltaNotification":
+        offset, file_size, previous_version, version, modification_timestamp, file_name_length = (
+            UpdateDeltaNotification.HEADER_FORMAT.unpack_from(content)
+        )
+        file_name_start: int = UpdateDeltaNotification.HEADER_FORMAT.size
+        file_content_start: int = file_name_start + file_name_length
+        file_name: str = str(content[file_name_start:file_content_start], "utf-8")
+        return UpdateDeltaNotification(
+            file_name,
+            offset,
+            file_size,
+            previous_version,
+            version,
+            modification_timestamp,
+            content[file_content_start:],
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, UpdateDeltaNotification)
+            and self.file_name == other.file_name
+            and self.offset == other.offset
+            and self.file_size == other.file_size
+            and self.previous_version == other.previous_version
+            and self.version == other.version
+            and self.modification_timestamp == other.modification_timestamp
+            and self.content == other.content
+        )
+
+
+@Message.register_subclass(class_id=19)
+class RenewSubscriptionRequest(Message):
+    # Request ID, client IP address, client port number and monitoring interval.
+    HEADER_FORMAT = struct.Struct(">16s4sII")
+
+    def __init__(
+        self,
+        request_id: UUID,
+        client_ip_address: IPv4Address,
+        client_port_number: int,
+        monitoring_interval_in_seconds: int,
+        file_name: str,
+    ):
+        self.request_id: UUID = request_id
+        self.client_ip_address: IPv4Address = client_ip_address
+        self.client_port_number: int = client_port_number
+        self.monitoring_interval: int = monitoring_interval_in_seconds
+        self.file_name: str = file_name
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = RenewSubscriptionRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes,
+            socket.inet_aton(str(self.client_ip_address)),
+            self.client_port_number,
+            self.monitoring_interval,
+        )
+        return [header, self.file_name.encode("utf-8")]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "RenewSubscriptionRequest":
+        request_id, client_ip_address, client_port_number, monitoring_interval = (
+            RenewSubscriptionRequest.HEADER_FORMAT.unpack_from(content)
+        )
+        file_name: str = str(content[RenewSubscriptionRequest.HEADER_FORMAT.size :], "utf-8")
+        return RenewSubscriptionRequest(
+            UUID(bytes=request_id),
+            IPv4Address(socket.inet_ntoa(client_ip_address)),
+            client_port_number,
+            monitoring_interval,
+            file_name,
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, RenewSubscriptionRequest)
+            and self.request_id == other.request_id
+            and self.client_ip_address == other.client_ip_address
+            and self.client_port_number == other.client_port_number
+            and self.monitoring_interval == other.monitoring_interval
+            and self.file_name == other.file_name
+        )
+
+
+@Message.register_subclass(class_id=20)
+class RenewSubscriptionResponse(Message):
+    # Reply ID and whether the operation was successful.
+    HEADER_FORMAT = struct.Struct(">16s?")
+
+    def __init__(self, reply_id: UUID, is_successful: bool):
+        self.reply_id: UUID = reply_id
+        self.is_successful: bool = is_successful
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [RenewSubscriptionResponse.HEADER_FORMAT.pack(self.reply_id.bytes, self.is_successful)]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "RenewSubscriptionResponse":
+        reply_id, is_successful = RenewSubscriptionResponse.HEADER_FORMAT.unpack_from(content)
+        return RenewSubscriptionResponse(UUID(bytes=reply_id), is_successful)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, RenewSubscriptionResponse)
+            and self.reply_id == other.reply_id
+            and self.is_successful == other.is_successful
+        )
+
+
+@Message.register_subclass(class_id=21)
+class UnsubscribeFromUpdatesRequest(Message):
+    # Request ID, client IP address and client port number.
+    HEADER_FORMAT = struct.Struct(">16s4sI")
+
+    def __init__(self, request_id: UUID, client_ip_address: IPv4Address, client_port_number: int, file_name: str):
+        self.request_id: UUID = request_id
+        self.client_ip_address: IPv4Address = client_ip_address
+        self.client_port_number: int = client_port_number
+        self.file_name: str = file_name
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = UnsubscribeFromUpdatesRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes, socket.inet_aton(str(self.client_ip_address)), self.client_port_number
+        )
+        return [header, self.file_name.encode("utf-8")]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "UnsubscribeFromUpdatesRequest":
+        request_id, client_ip_address, client_port_number = UnsubscribeFromUpdatesRequest.HEADER_FORMAT.unpack_from(
+            content
+        )
+        file_name: str = str(content[UnsubscribeFromUpdatesRequest.HEADER_FORMAT.size :], "utf-8")
+        return UnsubscribeFromUpdatesRequest(
+            UUID(bytes=request_id), IPv4Address(socket.inet_ntoa(client_ip_address)), client_port_number, file_name
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, UnsubscribeFromUpdatesRequest)
+            and self.request_id == other.request_id
+            and self.client_ip_address == other.client_ip_address
+            and self.client_port_number == other.client_port_number
+            and self.file_name == other.file_name
+        )
+
+
+@Message.register_subclass(class_id=22)
+class UnsubscribeFromUpdatesResponse(Message):
+    # Reply ID and whether the operation was successful.
+    HEADER_FORMAT = struct.Struct(">16s?")
+
+    def __init__(self, reply_id: UUID, is_successful: bool):
+        self.reply_id: UUID = reply_id
+        self.is_successful: bool = is_successful
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [UnsubscribeFromUpdatesResponse.HEADER_FORMAT.pack(self.reply_id.bytes, self.is_successful)]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "UnsubscribeFromUpdatesResponse":
+        reply_id, is_successful = UnsubscribeFromUpdatesResponse.HEADER_FORMAT.unpack_from(content)
+        return UnsubscribeFromUpdatesResponse(UUID(bytes=reply_id), is_successful)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, UnsubscribeFromUpdatesResponse)
+            and self.reply_id == other.reply_id
+            and self.is_successful == other.is_successful
+        )
+
+
+@Message.register_subclass(class_id=23)
+class ConditionalReadFileRangeRequest(Message):
+    """
+    Reads a range of a file unless the file is still at `version`. The server answers with a `NotModifiedResponse` if
+    it is, and with a `ReadFileRangeResponse` of the current version otherwise. Either reply carries the lease granted
+    on the file, if one was asked for.
+    """
+
+    # Request ID, offset, number of bytes, version and requested lease duration.
+    HEADER_FORMAT = struct.Struct(">16sQQQI")
+
+    def __init__(
+        self,
+        request_id: UUID,
+        file_name: str,
+        offset: int,
+        number_of_bytes: int,
+        version: int,
+        lease_duration_in_seconds: int = 0,
+    ):
+        self.request_id: UUID = request_id
+        self.file_name: str = file_name
+        self.offset: int = offset
+        self.number_of_bytes: int = number_of_bytes
+        self.version: int = version
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = ConditionalReadFileRangeRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes, self.offset, self.number_of_bytes, self.version, self.lease_duration_in_seconds
+        )
+        return [header, self.file_name.encode("utf-8")]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ConditionalReadFileRangeRequest":
+        request_id, offset, number_of_bytes, version, lease_duration_in_seconds = (
+            ConditionalReadFileRangeRequest.HEADER_FORMAT.unpack_from(content)
+        )
+        file_name: str = str(content[ConditionalReadFileRangeRequest.HEADER_FORMAT.size :], "utf-8")
+        return ConditionalReadFileRangeRequest(
+            UUID(bytes=request_id), file_name, offset, number_of_bytes, version, lease_duration_in_seconds
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ConditionalReadFileRangeRequest)
+            and self.request_id == other.request_id
+            and self.file_name == other.file_name
+            and self.offset == other.offset
+            and self.number_of_bytes == other.number_of_bytes
+            and self.version == other.version
+            and self.lease_duration_in_seconds == other.lease_duration_in_seconds
+        )
+
+
+@Message.register_subclass(class_id=24)
+class NotModifiedResponse(Message):
+    # Reply ID, version and lease duration.
+    HEADER_FORMAT = struct.Struct(">16sQI")
+
+    def __init__(self, reply_id: UUID, version: int, lease_duration_in_seconds: int = 0):
+        self.reply_id: UUID = reply_id
+        self.version: int = version
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [
+            NotModifiedResponse.HEADER_FORMAT.pack(self.reply_id.bytes, self.version, self.lease_duration_in_seconds)
+        ]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "NotModifiedResponse":
+        reply_id, version, lease_duration_in_seconds = NotModifiedResponse.HEADER_FORMAT.unpack_from(content)
+        return NotModifiedResponse(UUID(bytes=reply_id), version, lease_duration_in_seconds)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, NotModifiedResponse)
+            and self.reply_id == other.reply_id
+            and self.version == other.version
+            and self.lease_duration_in_seconds == other.lease_duration_in_seconds
+        )
+
+
+# Version and file name length of each file in a `ValidateFilesRequest` or `ValidateFilesResponse`. The file name
+# follows.
+FILE_VERSION_FORMAT = struct.Struct(">QI")
+
+
+def _marshall_file_versions(file_versions: List[Tuple[str, int]]) -> List[Buffer]:
+    parts: List[Buffer] = []
+    for file_name, version in file_versions:
+        encoded_file_name: bytes = file_name.encode("utf-8")
+        parts.append(FILE_VERSION_FORMAT.pack(version, len(encoded_file_name)))
+        parts.append(encoded_file_name)
+    return parts
+
+
+def _unmarshall_file_versions(content: Buffer, number_of_files: int) -> List[Tuple[str, int]]:
+    file_versions: List[Tuple[str, int]] = []
+    position: int = 0
+    for _ in range(number_of_files):
+        version, file_name_length = FILE_VERSION_FORMAT.unpack_from(content, position)
+        file_name_start: int = position + FILE_VERSION_FORMAT.size
+        position = file_name_start + file_name_length
+        file_versions.append((str(content[file_name_start:position], "utf-8"), version))
+    return file_versions
+
+
+@Message.register_subclass(class_id=25)
+class ValidateFilesRequest(Message):
+    """
+    Validates many cached files at once. Each file is sent with the version of its cached copy.
+    """
+
+    # Request ID and number of files.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
+    def __init__(self, request_id: UUID, file_versions: List[Tuple[str, int]]):
+        self.request_id: UUID = request_id
+        self.file_versions: List[Tuple[str, int]] = file_versions
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = ValidateFilesRequest.HEADER_FORMAT.pack(self.request_id.bytes, len(self.file_versions))
+        return [header, *_marshall_file_versions(self.file_versions)]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ValidateFilesRequest":
+        request_id, number_of_files = ValidateFilesRequest.HEADER_FORMAT.unpack_from(content)
+        file_versions: List[Tuple[str, int]] = _unmarshall_file_versions(
+            content[ValidateFilesRequest.HEADER_FORMAT.size :], number_of_files
+        )
+        return ValidateFilesRequest(UUID(bytes=request_id), file_versions)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ValidateFilesRequest)
+            and self.request_id == other.request_id
+            and self.file_versions == other.file_versions
+        )
+
+
+@Message.register_subclass(class_id=26)
+class ValidateFilesResponse(Message):
+    """
+    Lists the files of a `ValidateFilesRequest` that are no longer at the version sent, with their current version, or
+    with version 0 if they no longer exist.
+    """
+
+    # Reply ID and number of files.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
+    def __init__(self, reply_id: UUID, changed_file_versions: List[Tuple[str, int]]):
+        self.reply_id: UUID = reply_id
+        self.changed_file_versions: List[Tuple[str, int]] = changed_file_versions
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = ValidateFilesResponse.HEADER_FORMAT.pack(self.reply_id.bytes, len(self.changed_file_versions))
+        return [header, *_marshall_file_versions(self.changed_file_versions)]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ValidateFilesResponse":
+        reply_id, number_of_files = ValidateFilesResponse.HEADER_FORMAT.unpack_from(content)
+        changed_file_versions: List[Tuple[str, int]] = _unmarshall_file_versions(
+            content[ValidateFilesResponse.HEADER_FORMAT.size :], number_of_files
+        )
+        return ValidateFilesResponse(UUID(bytes=reply_id), changed_file_versions)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ValidateFilesResponse)
+            and self.reply_id == other.reply_id
+            and self.changed_file_versions == other.changed_file_versions
+        )
+
+
+@Message.register_subclass(class_id=27)
+class LeaseRevocationNotification(Message):
+    """
+    Sent to every client holding a lease on a file when the file is written to, appended to or deleted, at the address
+    the client read the file from. A client trusts its cached copy without asking the server for as long as it holds a
+    lease, so it has to drop the lease once this arrives. Notifications are not acknowledged, so a client that misses
+    one trusts its copy until its lease expires.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name: str = file_name
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [self.file_name.encode("utf-8")]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "LeaseRevocationNotification":
+        return LeaseRevocationNotification(str(content, "utf-8"))
+
+    def __eq__(self, other):
+        return isinstance(other, LeaseRevocationNotification) and self.file_name == other.file_name
+
+
+@Message.register_subclass(class_id=28)
+class ConditionalWriteFileRequest(Message):
+    """
+    Writes to a file only if the file is still at `version`. The server answers with a `WriteFileResponse`, which is
+    unsuccessful and carries the current version of the file, or 0 if the file no longer exists, when the file is at
+    another version.
+    """
+
+    # Request ID, offset, version, file name length and content length.
+    HEADER_FORMAT = struct.Struct(">16sQQII")
+
+    def __init__(self, request_id: UUID, offset: int, file_name: str, content: Buffer, version: int):
+        self.request_id: UUID = request_id
+        self.offset: int = offset
+        self.file_name: str = file_name
+        self.content: Buffer = content
+        self.version: int = version
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        file_name: bytes = self.file_name.encode("utf-8")
+        header: bytes = ConditionalWriteFileRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes, self.offset, self.version, len(file_name), len(self.content)
+        )
+        return [header, file_name, self.content]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "ConditionalWriteFileRequest":
+        request_id, offset, version, file_name_length, content_length = (
+            ConditionalWriteFileRequest.HEADER_FORMAT.unpack_from(content)
+        )
+        file_name_start: int = ConditionalWriteFileRequest.HEADER_FORMAT.size
+        file_content_start: int = file_name_start + file_name_length
+        file_name: str = str(content[file_name_start:file_content_start], "utf-8")
+        file_content: Buffer = content[file_content_start : file_content_start + content_length]
+        return ConditionalWriteFileRequest(UUID(bytes=request_id), offset, file_name, file_content, version)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ConditionalWriteFileRequest)
+            and self.request_id == other.request_id
+            and self.offset == other.offset
+            and self.file_name == other.file_name
+            and self.content == other.content
+            and self.version == other.version
+        )
+
+
+@Message.register_subclass(class_id=29)
+class CompressedMessage(Message):
+    """
+    Another message, marshalled and compressed with the codec `codec_id`. It keeps the ID of the message it holds, so
+    that its fragments and the reply it carries are matched to the request as that message would be.
+    """
+
+    # Message ID and codec ID.
+    HEADER_FORMAT = struct.Struct(">16sB")
+
+    def __init__(self, message_id: UUID, codec_id: int, content: Buffer):
+        self.message_id: UUID = message_id
+        self.codec_id: int = codec_id
+        self.content: Buffer = content
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [CompressedMessage.HEADER_FORMAT.pack(self.message_id.bytes, self.codec_id), self.content]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "CompressedMessage":
+        message_id, codec_id = CompressedMessage.HEADER_FORMAT.unpack_from(content)
+        return CompressedMessage(UUID(bytes=message_id), codec_id, content[CompressedMessage.HEADER_FORMAT.size :])
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, CompressedMessage)
+            and self.message_id == other.message_id
+            and self.codec_id == other.codec_id
+            and self.content == other.content
+        )
+
+
+@Message.register_subclass(class_id=30)
+class NegotiateCompressionRequest(Message):
+    """
+    Lists the codecs the client can compress and decompress messages with, in order of preference.
+    """
+
+    # Request ID and number of codecs.
+    HEADER_FORMAT = struct.Struct(">16sI")
+
+    def __init__(self, request_id: UUID, codec_ids: List[int]):
+        self.request_id: UUID = request_id
+        self.codec_ids: List[int] = codec_ids
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [
+            NegotiateCompressionRequest.HEADER_FORMAT.pack(self.request_id.bytes, len(self.codec_ids)),
+            bytes(self.codec_ids),
+        ]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "NegotiateCompressionRequest":
+        request_id, number_of_codecs = NegotiateCompressionRequest.HEADER_FORMAT.unpack_from(content)
+        codec_ids_start: int = NegotiateCompressionRequest.HEADER_FORMAT.size
+        codec_ids: List[int] = list(content[codec_ids_start : codec_ids_start + number_of_codecs])
+        return NegotiateCompressionRequest(UUID(bytes=request_id), codec_ids)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, NegotiateCompressionRequest)
+            and self.request_id == other.request_id
+            and self.codec_ids == other.codec_ids
+        )
+
+
+@Message.register_subclass(class_id=31)
+class NegotiateCompressionResponse(Message):
+    """
+    Carries the codec the server picked from a `NegotiateCompressionRequest`, or 0 if it supports none of them.
+    """
+
+    # Reply ID and codec ID.
+    HEADER_FORMAT = struct.Struct(">16sB")
+
+    def __init__(self, reply_id: UUID, codec_id: int):
+        self.reply_id: UUID = reply_id
+        self.codec_id: int = codec_id
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        return [NegotiateCompressionResponse.HEADER_FORMAT.pack(self.reply_id.bytes, self.codec_id)]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "NegotiateCompressionResponse":
+        reply_id, codec_id = NegotiateCompressionResponse.HEADER_FORMAT.unpack_from(content)
+        return NegotiateCompressionResponse(UUID(bytes=reply_id), codec_id)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, NegotiateCompressionResponse)
+            and self.reply_id == other.reply_id
+            and self.codec_id == other.codec_id
+        )
+
+
+# Offset, Adler-32 checksum and BLAKE2b hash of each block in a `SynchronizeFileRangeRequest`.
+BLOCK_HASH_FORMAT = struct.Struct(">QI16s")
+# Whether the instruction copies a block, and the offset of the block or the length of the data that follows.
+DELTA_INSTRUCTION_FORMAT = struct.Struct(">?Q")
+
+
+@Message.register_subclass(class_id=32)
+class SynchronizeFileRangeRequest(Message):
+    """
+    Like a `ConditionalReadFileRangeRequest`, but sent with the hashes of the blocks of the range that are cached, so
+    that the server only has to send the parts of the range the cached blocks do not have if the file changed.
+    """
+
+    # Request ID, offset, number of bytes, version, requested lease duration, block size and number of block hashes.
+    HEADER_FORMAT = struct.Struct(">16sQQQIII")
+
+    def __init__(
+        self,
+        request_id: UUID,
+        file_name: str,
+        offset: int,
+        number_of_bytes: int,
+        version: int,
+        block_size_in_bytes: int,
+        block_hashes: List[Tuple[int, int, bytes]],
+        lease_duration_in_seconds: int = 0,
+    ):
+        self.request_id: UUID = request_id
+        self.file_name: str = file_name
+        self.offset: int = offset
+        self.number_of_bytes: int = number_of_bytes
+        self.version: int = version
+        self.block_size_in_bytes: int = block_size_in_bytes
+        self.block_hashes: List[Tuple[int, int, bytes]] = block_hashes
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = SynchronizeFileRangeRequest.HEADER_FORMAT.pack(
+            self.request_id.bytes,
+            self.offset,
+            self.number_of_bytes,
+            self.version,
+            self.lease_duration_in_seconds,
+            self.block_size_in_bytes,
+            len(self.block_hashes),
+        )
+        block_hashes: bytes = b"".join(BLOCK_HASH_FORMAT.pack(*block_hash) for block_hash in self.block_hashes)
+        return [header, block_hashes, self.file_name.encode("utf-8")]
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "SynchronizeFileRangeRequest":
+        (
+            request_id,
+            offset,
+            number_of_bytes,
+            version,
+            lease_duration_in_seconds,
+            block_size_in_bytes,
+            number_of_block_hashes,
+        ) = SynchronizeFileRangeRequest.HEADER_FORMAT.unpack_from(content)
+        block_hashes_start: int = SynchronizeFileRangeRequest.HEADER_FORMAT.size
+        file_name_start: int = block_hashes_start + number_of_block_hashes * BLOCK_HASH_FORMAT.size
+        block_hashes: List[Tuple[int, int, bytes]] = list(
+            BLOCK_HASH_FORMAT.iter_unpack(content[block_hashes_start:file_name_start])
+        )
+        file_name: str = str(content[file_name_start:], "utf-8")
+        return SynchronizeFileRangeRequest(
+            UUID(bytes=request_id),
+            file_name,
+            offset,
+            number_of_bytes,
+            version,
+            block_size_in_bytes,
+            block_hashes,
+            lease_duration_in_seconds,
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, SynchronizeFileRangeRequest)
+            and self.request_id == other.request_id
+            and self.file_name == other.file_name
+            and self.offset == other.offset
+            and self.number_of_bytes == other.number_of_bytes
+            and self.version == other.version
+            and self.block_size_in_bytes == other.block_size_in_bytes
+            and self.block_hashes == other.block_hashes
+            and self.lease_duration_in_seconds == other.lease_duration_in_seconds
+        )
+
+
+@Message.register_subclass(class_id=33)
+class SynchronizeFileRangeResponse(Message):
+    """
+    The range as of the current version of the file, as a list of instructions. An instruction is either the offset of
+    a block of the cached copy, whose hash was in the request, or data to put in between. `checksum` is the CRC-32 of
+    the range, with which the client checks the range it rebuilt.
+    """
+
+    # Reply ID, whether the read was successful, offset, file size, modification timestamp, version, lease duration,
+    # checksum and number of instructions.
+    HEADER_FORMAT = struct.Struct(">16s?QQIQIII")
+
+    def __init__(
+        self,
+        reply_id: UUID,
+        is_successful: bool,
+        offset: int,
+        file_size: int,
+        modification_timestamp: int,
+        version: int,
+        checksum: int,
+        instructions: List[Union[int, Buffer]],
+        lease_duration_in_seconds: int = 0,
+    ):
+        self.reply_id: UUID = reply_id
+        self.is_successful: bool = is_successful
+        self.offset: int = offset
+        self.file_size: int = file_size
+        self.modification_timestamp: int = modification_timestamp
+        self.version: int = version
+        self.checksum: int = checksum
+        self.instructions: List[Union[int, Buffer]] = instructions
+        self.lease_duration_in_seconds: int = lease_duration_in_seconds
+
+    def _marshall_parts_without_type_info(self) -> List[Buffer]:
+        header: bytes = SynchronizeFileRangeResponse.HEADER_FORMAT.pack(
+            self.reply_id.bytes,
+            self.is_successful,
+            self.offset,
+            self.file_size,
+            self.modification_timestamp,
+            self.version,
+            self.lease_duration_in_seconds,
+            self.checksum,
+            len(self.instructions),
+        )
+        parts: List[Buffer] = [header]
+        for instruction in self.instructions:
+            if isinstance(instruction, int):
+                parts.append(DELTA_INSTRUCTION_FORMAT.pack(True, instruction))
+            else:
+                parts.append(DELTA_INSTRUCTION_FORMAT.pack(False, len(instruction)))
+                parts.append(instruction)
+        return parts
+
+    @staticmethod
+    def _unmarshall_without_type_info(content: Buffer) -> "SynchronizeFileRangeResponse":
+        (
+            reply_id,
+            is_successful,
+            offset,
+            file_size,
+            modification_timestamp,
+            version,
+            lease_duration_in_seconds,
+            checksum,
+            number_of_instructions,
+        ) = SynchronizeFileRangeResponse.HEADER_FORMAT.unpack_from(content)
+        instructions: List[Union[int, Buffer]] = []
+        position: int = SynchronizeFileRangeResponse.HEADER_FORMAT.size
+        for _ in range(number_of_instructions):
+            is_copy, value = DELTA_INSTRUCTION_FORMAT.unpack_from(content, position)
+            position += DELTA_INSTRUCTION_FORMAT.size
+            if is_copy:
+                instructions.append(value)
+            else:
+                instructions.append(content[position : position + value])
+                position += value
+        return SynchronizeFileRangeResponse(
+            UUID(bytes=reply_id),
+            is_successful,
+            offset,
+            file_size,
+            modification_timestamp,
+            version,
+            checksum,
+            instructions,
+            lease_duration_in_seconds,
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, SynchronizeFileRangeResponse)
+            and self.reply_id == other.reply_id
+            and self.is_successful == other.is_successful
+            and self.offset == other.offset
+            and self.file_size == other.file_size
+            and self.modification_timestamp == other.modification_timestamp
+            and self.version == other.version
+            and self.checksum == other.checksum
+            and self.instructions == other.instructions
+            and self.lease_duration_in_seconds == other.lease_duration_in_seconds
         )
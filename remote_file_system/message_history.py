@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from multiprocessing.managers import SyncManager
+from typing import Deque, Dict, Optional, Tuple
+from uuid import UUID
+
+from loguru import logger
+
+from remote_file_system.message import Message
+
+# Rough size of a reply without its file content, used for the byte budget.
+REPLY_OVERHEAD_IN_BYTES = 64
+
+
+class MessageHistory:
+    """
+    Replies kept for at-most-once semantics, keyed by request ID. Replies expire after a time to live, and the least
+    recently used ones are evicted once the number of replies, their total size or the number of replies kept for a
+    single client exceeds its limit.
+    """
+
+    def __init__(
+        self,
+        time_to_live_in_seconds: float = 300,
+        maximum_number_of_replies: int = 10_000,
+        maximum_size_in_bytes: int = 64 * 1024 * 1024,
+        maximum_number_of_replies_per_client: int = 256,
+    ):
+        self.time_to_live_in_seconds: float = time_to_live_in_seconds
+        self.maximum_number_of_replies: int = maximum_number_of_replies
+        self.maximum_size_in_bytes: int = maximum_size_in_bytes
+        self.maximum_number_of_replies_per_client: int = maximum_number_of_replies_per_client
+        # Ordered from least to most recently used. Values are the reply, its expiration timestamp, its size and the
+        # address of the client it was sent to.
+        self.replies: OrderedDict[UUID, Tuple[Message, float, int, Tuple[str, int]]] = OrderedDict()
+        # The time to live is the same for every reply, so replies expire in the order they were added.
+        self.expiration_queue: Deque[Tuple[float, UUID]] = deque()
+        self.request_ids_by_client: Dict[Tuple[str, int], Deque[UUID]] = {}
+        self.size_in_bytes: int = 0
+        self.number_of_hits: int = 0
+        self.number_of_misses: int = 0
+        self.number_of_evictions: int = 0
+        self.number_of_expirations: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def has_reply(self, request_id: UUID) -> bool:
+        with self.lock:
+            self._remove_expired_replies()
+            return request_id in self.replies
+
+    def get_reply(self, request_id: UUID) -> Optional[Message]:
+        with self.lock:
+            self._remove_expired_replies()
+            if request_id not in self.replies:
+                self.number_of_misses += 1
+                return None
+            self.number_of_hits += 1
+            self.replies.move_to_end(request_id)
+            reply, _, _, _ = self.replies[request_id]
+            return reply
+
+    def add_reply(self, request_id: UUID, reply: Message, client_address: Tuple[str, int]) -> None:
+        with self.lock:
+            if request_id in self.replies:
+                self._remove(request_id)
+            size_in_bytes: int = REPLY_OVERHEAD_IN_BYTES + len(getattr(reply, "content", b"") or b"")
+            expiration_timestamp: float = time.monotonic() + self.time_to_live_in_seconds
+            self.replies[request_id] = (reply, expiration_timestamp, size_in_bytes, client_address)
+            self.expiration_queue.append((expiration_timestamp, request_id))
+            self.size_in_bytes += size_in_bytes
+
+            # A client that has moved on by this many requests will not retry the oldest of them anymore.
+            request_ids: Deque[UUID] = self.request_ids_by_client.setdefault(client_address, deque())
+            request_ids.append(request_id)
+            if len(request_ids) > self.maximum_number_of_replies_per_client:
+                self._evict(request_ids[0])
+
+            while self.replies and (
+                len(self.replies) > self.maximum_number_of_replies or self.size_in_bytes > self.maximum_size_in_bytes
+            ):
+                self._evict(next(iter(self.replies)))
+
+    def remove_reply(self, request_id: UUID) -> None:
+        with self.lock:
+            if request_id in self.replies:
+                self._remove(request_id)
+
+    def get_statistics(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "number_of_replies": len(self.replies),
+                "size_in_bytes": self.size_in_bytes,
+                "number_of_hits": self.number_of_hits,
+                "number_of_misses": self.number_of_misses,
+                "number_of_evictions": self.number_of_evictions,
+                "number_of_expirations": self.number_of_expirations,
+            }
+
+    def _remove_expired_replies(self) -> None:
+        current_timestamp: float = time.monotonic()
+        while self.expiration_queue and self.expiration_queue[0][0] <= current_timestamp:
+            expiration_timestamp, request_id = self.expiration_queue.popleft()
+            # Skip entries of replies that were evicted or added again since.
+            if request_id in self.replies and self.replies[request_id][1] == expiration_timestamp:
+                self._remove(request_id)
+                self.number_of_expirations += 1
+
+    def _evict(self, request_id: UUID) -> None:
+        if request_id not in self.replies:
+            return
+        logger.debug(f"Evicting reply to {request_id} from the message history.")
+        self._remove(request_id)
+        self.number_of_evictions += 1
+
+    def _remove(self, request_id: UUID) -> None:
+        _, _, size_in_bytes, client_address = self.replies.pop(request_id)
+        self.size_in_bytes -= size_in_bytes
+        request_ids: Deque[UUID] = self.request_ids_by_client[client_address]
+        request_ids.remove(request_id)
+        if not request_ids:
+            del self.request_ids_by_client[client_address]
+
+
+class SharedStateManager(SyncManager):
+    """
+    Manager process holding the state shared by server processes that listen on the same port.
+    """
+
+
+SharedStateManager.register("MessageHistory", MessageHistory)
@@ -0,0 +1,111 @@
+from concurrent.futures import Future
+from ipaddress import IPv4Address
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from remote_file_system.communications import PipelinedEndpoint
+from remote_file_system.message import (
+    Message,
+    ReadFileRangeRequest,
+    ReadFileRangeResponse,
+    WriteFileRequest,
+    WriteFileResponse,
+    ModifiedTimestampRequest,
+    ModifiedTimestampResponse,
+)
+
+
+class PipelinedClient:
+    """
+    Client for bulk jobs that touch many files. Every operation returns a future immediately instead of waiting for
+    the reply, so many requests are in flight over one socket and the job is not bound by the round trip time.
+    Operations go straight to the server without using a client cache. Futures resolve to None if the server does not
+    respond.
+    """
+
+    def __init__(
+        self,
+        server_ip_address: IPv4Address,
+        server_port_number: int,
+        maximum_number_of_requests_in_flight: int = 64,
+        max_attempts_to_send_message: int = 3,
+        timeout_in_seconds: float = 5,
+    ):
+        self.server_address: Tuple[str, int] = (str(server_ip_address), server_port_number)
+        self.max_attempts_to_send_message: int = max_attempts_to_send_message
+        self.timeout_in_seconds: float = timeout_in_seconds
+        self.endpoint: PipelinedEndpoint = PipelinedEndpoint(
+            maximum_number_of_requests_in_flight=maximum_number_of_requests_in_flight
+        )
+
+    def close(self) -> None:
+        self.endpoint.close()
+
+    def read_file(self, file_path: Path, offset: int, number_of_bytes: int) -> Future:
+        """
+        Resolves to the bytes read, or None if the file could not be read.
+        """
+        outgoing_message: Message = ReadFileRangeRequest(
+            request_id=uuid4(), file_name=str(file_path), offset=offset, number_of_bytes=number_of_bytes
+        )
+
+        def get_content(incoming_message: ReadFileRangeResponse) -> Optional[bytes]:
+            if not incoming_message.is_successful:
+                logger.warning(f"Server responded that {file_path} could not be read.")
+                return None
+            return bytes(incoming_message.content)
+
+        return self._send(outgoing_message, get_content)
+
+    def write_file(self, file_path: Path, offset: int, content: bytes) -> Future:
+        """
+        Resolves to whether the write was successful, or None if the server did not respond.
+        """
+        outgoing_message: Message = WriteFileRequest(
+            request_id=uuid4(), offset=offset, file_name=str(file_path), content=content
+        )
+
+        def get_is_successful(incoming_message: WriteFileResponse) -> bool:
+            return incoming_message.is_successful
+
+        return self._send(outgoing_message, get_is_successful)
+
+    def get_modification_timestamp(self, file_path: Path) -> Future:
+        """
+        Resolves to the modification timestamp of the file on the server, or None if it could not be checked.
+        """
+        outgoing_message: Message = ModifiedTimestampRequest(request_id=uuid4(), file_path=str(file_path))
+
+        def get_modification_timestamp(incoming_message: ModifiedTimestampResponse) -> Optional[int]:
+            if not incoming_message.is_successful:
+                logger.warning(f"Server failed to check the modification timestamp of {file_path}.")
+                return None
+            return incoming_message.modification_timestamp
+
+        return self._send(outgoing_message, get_modification_timestamp)
+
+    def _send(self, outgoing_message: Message, get_result: Callable[[Message], object]) -> Future:
+        """
+        Sends the message and returns a future of the result extracted from its reply.
+        """
+        result_future: Future = Future()
+
+        def set_result(reply_future: Future) -> None:
+            if not result_future.set_running_or_notify_cancel():
+                return
+            if reply_future.cancelled() or reply_future.result() is None:
+                result_future.set_result(None)
+                return
+            try:
+                result_future.set_result(get_result(reply_future.result()))
+            except Exception as e:
+                result_future.set_exception(e)
+
+        reply_future: Future = self.endpoint.send_message_and_get_future(
+            outgoing_message, self.server_address, self.max_attempts_to_send_message, self.timeout_in_seconds
+        )
+        reply_future.add_done_callback(set_result)
+        return result_future
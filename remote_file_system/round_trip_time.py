@@ -0,0 +1,115 @@
+import random
+import threading
+from typing import Dict, Optional, Tuple
+
+# Gains of the smoothed round trip time and its variation, and the weight of the variation in the timeout.
+SMOOTHING_GAIN = 1 / 8
+VARIATION_GAIN = 1 / 4
+VARIATION_WEIGHT = 4
+
+
+class RoundTripTimeEstimator:
+    """
+    Estimates the retransmission timeout for one server from the round trip times of its replies, following Jacobson
+    and Karels. Each timeout doubles the retransmission timeout until the next round trip time is measured, and a
+    random jitter keeps clients that lost packets at the same moment from retrying in lockstep.
+    """
+
+    def __init__(
+        self,
+        initial_timeout_in_seconds: float = 1,
+        minimum_timeout_in_seconds: float = 1,
+        maximum_timeout_in_seconds: float = 60,
+        jitter_fraction: float = 0.1,
+    ):
+        self.minimum_timeout_in_seconds: float = minimum_timeout_in_seconds
+        self.maximum_timeout_in_seconds: float = maximum_timeout_in_seconds
+        self.jitter_fraction: float = jitter_fraction
+        self.smoothed_round_trip_time_in_seconds: Optional[float] = None
+        self.round_trip_time_variation_in_seconds: Optional[float] = None
+        self.retransmission_timeout_in_seconds: float = initial_timeout_in_seconds
+        self.number_of_samples: int = 0
+        self.number_of_timeouts: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def add_sample(self, round_trip_time_in_seconds: float) -> None:
+        """
+        Only round trip times of requests that were answered without being retransmitted should be added, as a reply
+        to a retransmitted request cannot be matched to the transmission it answers.
+        """
+        with self.lock:
+            if self.smoothed_round_trip_time_in_seconds is None:
+                self.smoothed_round_trip_time_in_seconds = round_trip_time_in_seconds
+                self.round_trip_time_variation_in_seconds = round_trip_time_in_seconds / 2
+            else:
+                self.round_trip_time_variation_in_seconds += VARIATION_GAIN * (
+                    abs(self.smoothed_round_trip_time_in_seconds - round_trip_time_in_seconds)
+                    - self.round_trip_time_variation_in_seconds
+                )
+                self.smoothed_round_trip_time_in_seconds += SMOOTHING_GAIN * (
+                    round_trip_time_in_seconds - self.smoothed_round_trip_time_in_seconds
+                )
+            self.retransmission_timeout_in_seconds = self._clamp(
+                self.smoothed_round_trip_time_in_seconds + VARIATION_WEIGHT * self.round_trip_time_variation_in_seconds
+            )
+            self.number_of_samples += 1
+
+    def record_timeout(self) -> None:
+        with self.lock:
+            self.retransmission_timeout_in_seconds = self._clamp(2 * self.retransmission_timeout_in_seconds)
+            self.number_of_timeouts += 1
+
+    def get_timeout(self) -> float:
+        with self.lock:
+            return self.retransmission_timeout_in_seconds * random.uniform(1, 1 + self.jitter_fraction)
+
+    def get_backoff_delay(self, attempt_number: int) -> float:
+        """
+        Time to wait before retrying after the server could not be reached at all, for example because it has not
+        started yet. The delay is drawn uniformly up to a bound that doubles with every attempt, starting from the
+        minimum timeout.
+        """
+        with self.lock:
+            return random.uniform(
+                0, min(self.minimum_timeout_in_seconds * 2**attempt_number, self.retransmission_timeout_in_seconds)
+            )
+
+    def get_statistics(self) -> Dict[str, Optional[float]]:
+        with self.lock:
+            return {
+                "smoothed_round_trip_time_in_seconds": self.smoothed_round_trip_time_in_seconds,
+                "round_trip_time_variation_in_seconds": self.round_trip_time_variation_in_seconds,
+                "retransmission_timeout_in_seconds": self.retransmission_timeout_in_seconds,
+                "number_of_samples": self.number_of_samples,
+                "number_of_timeouts": self.number_of_timeouts,
+            }
+
+    def _clamp(self, timeout_in_seconds: float) -> float:
+        return min(max(timeout_in_seconds, self.minimum_timeout_in_seconds), self.maximum_timeout_in_seconds)
+
+
+# Estimators are kept per server for the lifetime of the process, so that sockets opened for a single message still
+# start from what earlier messages measured.
+round_trip_time_estimators: Dict[Tuple[str, int], RoundTripTimeEstimator] = {}
+round_trip_time_estimators_lock: threading.Lock = threading.Lock()
+
+
+def get_round_trip_time_estimator(
+    server_address: Tuple[str, int], initial_timeout_in_seconds: float
+) -> RoundTripTimeEstimator:
+    with round_trip_time_estimators_lock:
+        if server_address not in round_trip_time_estimators:
+            round_trip_time_estimators[server_address] = RoundTripTimeEstimator(initial_timeout_in_seconds)
+        return round_trip_time_estimators[server_address]
+
+
+def get_round_trip_time_statistics() -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    State of the estimator of every server contacted so far, keyed by the address of the server.
+    """
+    with round_trip_time_estimators_lock:
+        estimators: Dict[Tuple[str, int], RoundTripTimeEstimator] = dict(round_trip_time_estimators)
+    return {
+        f"{ip_address}:{port_number}": estimator.get_statistics()
+        for (ip_address, port_number), estimator in estimators.items()
+    }
@@ -1,20 +1,31 @@
-import time
+import functools
+import zlib
 from enum import Enum
 from ipaddress import IPv4Address
-import socket
-from typing import Dict, Tuple
-from uuid import uuid4, UUID
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID
 
 from loguru import logger
 
-from remote_file_system.communications import send_message
+from remote_file_system.communications import Endpoint, send_message
+from remote_file_system.compression import choose_codec_id, AVAILABLE_CODEC_NAMES, MINIMUM_COMPRESSED_SIZE_IN_BYTES
+from remote_file_system.delta import (
+    compute_delta,
+    DeltaInstruction,
+    MAXIMUM_DATA_SIZE_IN_BYTES,
+    MAXIMUM_NUMBER_OF_BLOCK_HASHES,
+    MAXIMUM_SYNCHRONIZED_SIZE_IN_BYTES,
+    MINIMUM_BLOCK_SIZE_IN_BYTES,
+)
 from remote_file_system.message import (
     Message,
     ReadFileRequest,
     WriteFileRequest,
+    ConditionalWriteFileRequest,
     ReadFileResponse,
     WriteFileResponse,
-    UpdateNotification,
+    UpdateDeltaNotification,
+    Buffer,
     SubscribeToUpdatesRequest,
     SubscribeToUpdatesResponse,
     ModifiedTimestampRequest,
@@ -23,8 +34,26 @@ from remote_file_system.message import (
     DeleteFileResponse,
     AppendFileRequest,
     AppendFileResponse,
+    ReadFileRangeRequest,
+    ReadFileRangeResponse,
+    ConditionalReadFileRangeRequest,
+    NotModifiedResponse,
+    ValidateFilesRequest,
+    ValidateFilesResponse,
+    LeaseRevocationNotification,
+    RenewSubscriptionRequest,
+    RenewSubscriptionResponse,
+    UnsubscribeFromUpdatesRequest,
+    UnsubscribeFromUpdatesResponse,
+    NegotiateCompressionRequest,
+    NegotiateCompressionResponse,
+    SynchronizeFileRangeRequest,
+    SynchronizeFileRangeResponse,
 )
-from remote_file_system.server_file_system import ServerFileSystem
+from remote_file_system.message_history import MessageHistory
+from remote_file_system.server_file_metadata import FileMetadata
+from remote_file_system.server_file_system import ServerFileSystem, SubscribedClient
+from remote_file_system.worker_pool import KeyedWorkerPool, MAXIMUM_NUMBER_OF_PENDING_TASKS
 
 
 class InvocationSemantics(Enum):
@@ -33,114 +62,283 @@ class InvocationSemantics(Enum):
 
 
 class Server:
+    INCOMPLETE_MESSAGE_TIMEOUT_IN_SECONDS = 30
+    # Requests that do not change the file they concern, which the worker pool runs in parallel with each other.
+    READ_ONLY_MESSAGE_CLASSES = (
+        ReadFileRequest,
+        ReadFileRangeRequest,
+        ConditionalReadFileRangeRequest,
+        SynchronizeFileRangeRequest,
+        ModifiedTimestampRequest,
+        ValidateFilesRequest,
+    )
+
     def __init__(
         self,
         server_ip_address: IPv4Address,
         server_port_number: int,
         file_system: ServerFileSystem,
         invocation_semantics: InvocationSemantics = InvocationSemantics.AT_LEAST_ONCE,
+        number_of_worker_threads: int = 0,
+        maximum_number_of_queued_messages: int = MAXIMUM_NUMBER_OF_PENDING_TASKS,
+        message_history: Optional[MessageHistory] = None,
+        reuse_port: bool = False,
+        maximum_lease_duration_in_seconds: int = 0,
+        compression_codec_names: Sequence[str] = AVAILABLE_CODEC_NAMES,
+        minimum_compressed_size_in_bytes: int = MINIMUM_COMPRESSED_SIZE_IN_BYTES,
     ):
+        """
+        With worker threads, at most `maximum_number_of_queued_messages` messages wait for or are being processed at a
+        time. Messages arriving beyond that are dropped, and their senders retry them.
+
+        Several server processes can listen on the same port by setting `reuse_port`. They should then share the
+        message history, for example through a `multiprocessing.Manager`, so that a duplicate request is recognised by
+        whichever process receives it.
+
+        Clients reading a file may ask for a lease on it, during which they serve reads from their cache without asking
+        the server. Leases are granted for at most `maximum_lease_duration_in_seconds`, and not at all if it is 0.
+
+        Clients may offer codecs to compress the messages carrying file content with, and the first one offered that is
+        in `compression_codec_names` is used with that client from then on. Messages with less file content than
+        `minimum_compressed_size_in_bytes` are not compressed. The codec is only known to the server process the
+        client negotiated it with, which is the one that receives all its datagrams when the port is shared.
+        """
         self.server_ip_address: IPv4Address = server_ip_address
         self.server_port_number: int = server_port_number
         self.server_file_system: ServerFileSystem = file_system
-        # store request id as key. value is the Message
-        self.message_history: Dict[UUID, Message] = {}
+        # Replies to recent requests, kept for at-most-once semantics.
+        self.message_history: MessageHistory = message_history if message_history is not None else MessageHistory()
         self.invocation_semantics = invocation_semantics
         self.keep_listening = True
+        self.endpoint: Optional[Endpoint] = None
+        # Without worker threads, messages are processed one at a time by the listening thread.
+        self.number_of_worker_threads: int = number_of_worker_threads
+        self.maximum_number_of_queued_messages: int = maximum_number_of_queued_messages
+        self.reuse_port: bool = reuse_port
+        self.maximum_lease_duration_in_seconds: int = maximum_lease_duration_in_seconds
+        self.compression_codec_names: Sequence[str] = compression_codec_names
+        self.minimum_compressed_size_in_bytes: int = minimum_compressed_size_in_bytes
 
     def stop_listening(self) -> None:
         self.keep_listening = False
 
     def listen_for_messages(self) -> None:
-        sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        worker_pool: Optional[KeyedWorkerPool] = None
+        if self.number_of_worker_threads > 0:
+            worker_pool = KeyedWorkerPool(self.number_of_worker_threads, self.maximum_number_of_queued_messages)
 
+        # Replies and update notifications are sent from the listening socket as well.
+        self.endpoint = Endpoint(
+            str(self.server_ip_address),
+            self.server_port_number,
+            reuse_port=self.reuse_port,
+            minimum_compressed_size_in_bytes=self.minimum_compressed_size_in_bytes,
+        )
         try:
-            server_address: Tuple[str, int] = (str(self.server_ip_address), self.server_port_number)
-            sock.bind(server_address)
-
             SERVER_TIMEOUT_IN_SECONDS = 5
-            sock.settimeout(SERVER_TIMEOUT_IN_SECONDS)
+            self.endpoint.settimeout(SERVER_TIMEOUT_IN_SECONDS)
 
             while self.keep_listening:
                 try:
                     logger.info(
                         f"Socket is listening for messages at {self.server_ip_address}:{self.server_port_number}."
                     )
-                    incoming_bytes, sender_address = sock.recvfrom(4096)
+                    incoming_message, sender_address = self.endpoint.receive_message()
                     sender_ip_address, sender_port_number = sender_address
-                    logger.info(f"Received {len(incoming_bytes)} bytes from {sender_ip_address}:{sender_port_number}.")
+                    if incoming_message is None:
+                        continue
+                    logger.info(f"Received {incoming_message} from {sender_ip_address}:{sender_port_number}.")
 
-                    if incoming_bytes:
-                        incoming_message: Message = Message.unmarshall(incoming_bytes)
-                        logger.debug(f"Received {incoming_message}.")
+                    if worker_pool is None:
                         self._dispatch_message(
                             message=incoming_message,
                             client_ip_address=IPv4Address(sender_ip_address),
                             client_port_number=sender_port_number,
                         )
+                        continue
+
+                    # Messages that change a file are processed alone and in the order they arrived, so writes stay
+                    # ordered and a retried request is only checked against the history after the original has been
+                    # handled. Reads of the same file run in parallel between them, as a retried read that runs
+                    # alongside its original only reads the file twice.
+                    is_accepted: bool = worker_pool.submit(
+                        self._get_file_name(incoming_message),
+                        functools.partial(
+                            self._dispatch_message,
+                            message=incoming_message,
+                            client_ip_address=IPv4Address(sender_ip_address),
+                            client_port_number=sender_port_number,
+                        ),
+                        is_exclusive=not isinstance(incoming_message, self.READ_ONLY_MESSAGE_CLASSES),
+                    )
+                    if not is_accepted:
+                        logger.error(
+                            f"Dropping {incoming_message} from {sender_ip_address}:{sender_port_number} as "
+                            f"{self.maximum_number_of_queued_messages} messages are already queued."
+                        )
                 except TimeoutError as e:
                     logger.debug(f"Server did not receive messages after {SERVER_TIMEOUT_IN_SECONDS} seconds: {e}")
-                    pass
+                    self.endpoint.fragment_reassembler.discard_stale_messages(
+                        maximum_age_in_seconds=self.INCOMPLETE_MESSAGE_TIMEOUT_IN_SECONDS
+                    )
+                    if self.invocation_semantics == InvocationSemantics.AT_MOST_ONCE:
+                        logger.debug(f"Message history: {self.message_history.get_statistics()}")
+                    if self.server_file_system.file_content_cache is not None:
+                        logger.debug(
+                            f"File content cache: {self.server_file_system.file_content_cache.get_statistics()}"
+                        )
+                    if self.server_file_system.mapped_file_cache is not None:
+                        logger.debug(f"Mapped file cache: {self.server_file_system.mapped_file_cache.get_statistics()}")
+                    logger.debug(f"File metadata table: {self.server_file_system.file_metadata_table.get_statistics()}")
+                    if self.maximum_lease_duration_in_seconds > 0:
+                        self.server_file_system.remove_expired_leases()
 
         finally:
-            sock.close()
+            if worker_pool is not None:
+                worker_pool.shutdown()
+            self.endpoint.close()
 
     def _dispatch_message(self, message: Message, client_ip_address: IPv4Address, client_port_number: int) -> None:
         if self.invocation_semantics == InvocationSemantics.AT_MOST_ONCE:
-            if self._check_for_duplicate_request_message(message):
+            reply: Optional[Message] = self._get_message_from_history(message.request_id)
+            if reply is not None:
                 logger.info(f"Duplicate request message detected: {message}")
-                reply: Message = self._get_message_from_history(message.request_id)
                 logger.info(f"Sending message from history: {reply}")
-                send_message(reply, client_ip_address, client_port_number)
+                self._send_message(reply, client_ip_address, client_port_number)
                 return
 
         if isinstance(message, ReadFileRequest):
-            content: bytes | None = self.server_file_system.read_file(relative_file_path=message.file_name)
-            is_successful, modification_timestamp = self.server_file_system.get_modified_timestamp(message.file_name)
-            if not content or not is_successful:
-                reply: ReadFileResponse = ReadFileResponse(reply_id=uuid4(), content=b"", modification_timestamp=0)
-                self._add_message_to_history(message.request_id, reply)
-                send_message(reply, client_ip_address, client_port_number)
+            # The version is looked up before the file is read. Should the file change in between, the content is
+            # newer than its version rather than older, and the client fetches the file again when it validates it.
+            file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_name)
+            content: Buffer | None = self.server_file_system.read_file(relative_file_path=message.file_name)
+            if not content or file_metadata is None:
+                reply: ReadFileResponse = ReadFileResponse(
+                    reply_id=message.request_id, content=b"", modification_timestamp=0, version=0
+                )
+                self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+                self._send_message(reply, client_ip_address, client_port_number)
                 return
             reply: ReadFileResponse = ReadFileResponse(
-                reply_id=uuid4(), content=content, modification_timestamp=modification_timestamp
+                reply_id=message.request_id,
+                content=content,
+                modification_timestamp=file_metadata.get_modification_timestamp(),
+                version=file_metadata.version,
             )
-            self._add_message_to_history(message.request_id, reply)
-            send_message(reply, client_ip_address, client_port_number)
-        elif isinstance(message, WriteFileRequest):
-            write_is_successful, subscribed_clients = self.server_file_system.write_file(
-                relative_file_path=message.file_name, offset=message.offset, file_content=message.content
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, ReadFileRangeRequest):
+            lease_duration_in_seconds: int = self._grant_lease(message, client_ip_address, client_port_number)
+            file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_name)
+            reply: ReadFileRangeResponse = self._read_file_range(
+                message.request_id,
+                message.file_name,
+                message.offset,
+                message.number_of_bytes,
+                file_metadata,
+                lease_duration_in_seconds,
             )
-            get_modification_timestamp_is_successful, modification_timestamp = (
-                self.server_file_system.get_modified_timestamp(message.file_name)
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, ConditionalReadFileRangeRequest):
+            lease_duration_in_seconds: int = self._grant_lease(message, client_ip_address, client_port_number)
+            file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_name)
+            if file_metadata is not None and file_metadata.version == message.version:
+                reply: NotModifiedResponse = NotModifiedResponse(
+                    reply_id=message.request_id,
+                    version=file_metadata.version,
+                    lease_duration_in_seconds=lease_duration_in_seconds,
+                )
+            else:
+                reply: ReadFileRangeResponse = self._read_file_range(
+                    message.request_id,
+                    message.file_name,
+                    message.offset,
+                    message.number_of_bytes,
+                    file_metadata,
+                    lease_duration_in_seconds,
+                )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, SynchronizeFileRangeRequest):
+            lease_duration_in_seconds: int = self._grant_lease(message, client_ip_address, client_port_number)
+            file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_name)
+            if file_metadata is not None and file_metadata.version == message.version:
+                reply: NotModifiedResponse = NotModifiedResponse(
+                    reply_id=message.request_id,
+                    version=file_metadata.version,
+                    lease_duration_in_seconds=lease_duration_in_seconds,
+                )
+            else:
+                reply: SynchronizeFileRangeResponse | ReadFileRangeResponse = self._synchronize_file_range(
+                    message, file_metadata, lease_duration_in_seconds
+                )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, ValidateFilesRequest):
+            changed_file_versions: List[Tuple[str, int]] = []
+            for file_name, version in message.file_versions:
+                file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(file_name)
+                current_version: int = file_metadata.version if file_metadata is not None else 0
+                if current_version != version:
+                    changed_file_versions.append((file_name, current_version))
+            reply: ValidateFilesResponse = ValidateFilesResponse(
+                reply_id=message.request_id, changed_file_versions=changed_file_versions
             )
-            if not write_is_successful or not get_modification_timestamp_is_successful:
-                reply: WriteFileResponse = WriteFileResponse(
-                    reply_id=uuid4(), is_successful=False, modification_timestamp=0
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, (WriteFileRequest, ConditionalWriteFileRequest)):
+            # Other server processes may have changed the file since its metadata was last refreshed, so its version is
+            # read afresh and the file written while no other process can change it.
+            with self.server_file_system.lock_file(message.file_name):
+                previous_file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(
+                    message.file_name, maximum_age_in_seconds=0
                 )
-                self._add_message_to_history(message.request_id, reply)
-                send_message(reply, client_ip_address, client_port_number)
-                return
+                if isinstance(message, ConditionalWriteFileRequest) and (
+                    previous_file_metadata is None or previous_file_metadata.version != message.version
+                ):
+                    current_version: int = previous_file_metadata.version if previous_file_metadata is not None else 0
+                    logger.warning(
+                        f"Server did not write to {message.file_name} as it is at version {current_version} rather "
+                        f"than {message.version}."
+                    )
+                    reply: WriteFileResponse = WriteFileResponse(
+                        reply_id=message.request_id,
+                        is_successful=False,
+                        modification_timestamp=0,
+                        version=current_version,
+                    )
+                    self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+                    self._send_message(reply, client_ip_address, client_port_number)
+                    return
+                write_is_successful, subscribed_clients = self.server_file_system.write_file(
+                    relative_file_path=message.file_name, offset=message.offset, file_content=message.content
+                )
+                file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_name)
+                if not write_is_successful or previous_file_metadata is None or file_metadata is None:
+                    reply: WriteFileResponse = WriteFileResponse(
+                        reply_id=message.request_id, is_successful=False, modification_timestamp=0, version=0
+                    )
+                    self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+                    self._send_message(reply, client_ip_address, client_port_number)
+                    return
+            self._revoke_leases(message.file_name)
             reply: WriteFileResponse = WriteFileResponse(
-                reply_id=uuid4(), is_successful=True, modification_timestamp=modification_timestamp
-            )
-            self._add_message_to_history(message.request_id, reply)
-            send_message(reply, client_ip_address, client_port_number)
-            if write_is_successful:
-                curr_time = int(time.time())
-                for subscribed_client in subscribed_clients:
-                    if subscribed_client.monitoring_expiration_timestamp > curr_time:
-                        update_notification = UpdateNotification(
-                            file_name=message.file_name,
-                            # content=message.content,
-                            content=self.server_file_system.read_file(relative_file_path=message.file_name),
-                            modification_timestamp=modification_timestamp,
-                        )
-                        send_message(
-                            message=update_notification,
-                            recipient_ip_address=subscribed_client.ip_address,
-                            recipient_port_number=subscribed_client.port_number,
-                        )
+                reply_id=message.request_id,
+                is_successful=True,
+                modification_timestamp=file_metadata.get_modification_timestamp(),
+                version=file_metadata.version,
+            )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+            self._notify_subscribed_clients(
+                subscribed_clients,
+                file_name=message.file_name,
+                offset=message.offset,
+                content=message.content,
+                previous_version=previous_file_metadata.version,
+                file_metadata=file_metadata,
+            )
         elif isinstance(message, SubscribeToUpdatesRequest):
             is_successful: bool = self.server_file_system.subscribe_to_updates(
                 client_ip_address=message.client_ip_address,
@@ -149,87 +347,288 @@ class Server:
                 relative_file_path=message.file_name,
             )
             reply: SubscribeToUpdatesResponse = SubscribeToUpdatesResponse(
-                is_successful=is_successful, reply_id=uuid4()
+                is_successful=is_successful, reply_id=message.request_id
             )
-            self._add_message_to_history(message.request_id, reply)
-            send_message(
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(
                 message=reply,
                 recipient_ip_address=client_ip_address,
                 recipient_port_number=client_port_number,
             )
-        elif isinstance(message, ModifiedTimestampRequest):
-            is_successful, modification_timestamp = self.server_file_system.get_modified_timestamp(
-                relative_file_path=message.file_path
+        elif isinstance(message, RenewSubscriptionRequest):
+            is_successful: bool = self.server_file_system.renew_subscription(
+                client_ip_address=message.client_ip_address,
+                client_port_number=message.client_port_number,
+                monitoring_interval_in_seconds=message.monitoring_interval,
+                relative_file_path=message.file_name,
             )
-            if not is_successful:
+            reply: RenewSubscriptionResponse = RenewSubscriptionResponse(
+                reply_id=message.request_id, is_successful=is_successful
+            )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, UnsubscribeFromUpdatesRequest):
+            is_successful: bool = self.server_file_system.unsubscribe_from_updates(
+                client_ip_address=message.client_ip_address,
+                client_port_number=message.client_port_number,
+                relative_file_path=message.file_name,
+            )
+            reply: UnsubscribeFromUpdatesResponse = UnsubscribeFromUpdatesResponse(
+                reply_id=message.request_id, is_successful=is_successful
+            )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+        elif isinstance(message, ModifiedTimestampRequest):
+            file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_path)
+            if file_metadata is None:
                 logger.warning(f"Server failed to check modification timestamp as {message.file_path} does not exist.")
                 reply: ModifiedTimestampResponse = ModifiedTimestampResponse(
-                    reply_id=uuid4(), modification_timestamp=0, is_successful=False
+                    reply_id=message.request_id, modification_timestamp=0, version=0, is_successful=False
                 )
-                self._add_message_to_history(message.request_id, reply)
-                send_message(
+                self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+                self._send_message(
                     message=reply, recipient_ip_address=client_ip_address, recipient_port_number=client_port_number
                 )
+                return
 
             reply: ModifiedTimestampResponse = ModifiedTimestampResponse(
-                reply_id=uuid4(), modification_timestamp=modification_timestamp, is_successful=is_successful
+                reply_id=message.request_id,
+                modification_timestamp=file_metadata.get_modification_timestamp(),
+                version=file_metadata.version,
+                is_successful=True,
             )
-            self._add_message_to_history(message.request_id, reply)
-            send_message(
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(
                 message=reply, recipient_ip_address=client_ip_address, recipient_port_number=client_port_number
             )
         elif isinstance(message, DeleteFileRequest):
             is_successful = self.server_file_system.delete_file(file_name=message.file_name)
-            reply: DeleteFileResponse = DeleteFileResponse(reply_id=uuid4(), is_successful=is_successful)
-            self._add_message_to_history(message.request_id, reply)
-            send_message(
+            if is_successful:
+                self._revoke_leases(message.file_name)
+            reply: DeleteFileResponse = DeleteFileResponse(reply_id=message.request_id, is_successful=is_successful)
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(
                 message=reply,
                 recipient_ip_address=client_ip_address,
                 recipient_port_number=client_port_number,
             )
         elif isinstance(message, AppendFileRequest):
-            append_is_successful, subscribed_clients = self.server_file_system.append_file(
-                relative_file_path=message.file_name, file_content=message.content
-            )
-            get_modification_timestamp_is_successful, modification_timestamp = (
-                self.server_file_system.get_modified_timestamp(message.file_name)
-            )
-            if not append_is_successful or not get_modification_timestamp_is_successful:
-                reply: AppendFileResponse = AppendFileResponse(
-                    reply_id=uuid4(), is_successful=False, modification_timestamp=0
+            with self.server_file_system.lock_file(message.file_name):
+                previous_file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(
+                    message.file_name, maximum_age_in_seconds=0
                 )
-                self._add_message_to_history(message.request_id, reply)
-                send_message(reply, client_ip_address, client_port_number)
-                return
+                append_is_successful, subscribed_clients = self.server_file_system.append_file(
+                    relative_file_path=message.file_name, file_content=message.content
+                )
+                file_metadata: Optional[FileMetadata] = self.server_file_system.get_file_metadata(message.file_name)
+                if not append_is_successful or previous_file_metadata is None or file_metadata is None:
+                    reply: AppendFileResponse = AppendFileResponse(
+                        reply_id=message.request_id, is_successful=False, modification_timestamp=0, version=0
+                    )
+                    self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+                    self._send_message(reply, client_ip_address, client_port_number)
+                    return
+            self._revoke_leases(message.file_name)
             reply: AppendFileResponse = AppendFileResponse(
-                reply_id=uuid4(), is_successful=True, modification_timestamp=modification_timestamp
-            )
-            self._add_message_to_history(message.request_id, reply)
-            send_message(reply, client_ip_address, client_port_number)
-            if append_is_successful:
-                curr_time = int(time.time())
-                for subscribed_client in subscribed_clients:
-                    if subscribed_client.monitoring_expiration_timestamp > curr_time:
-                        update_notification = UpdateNotification(
-                            file_name=message.file_name,
-                            # content=message.content,
-                            content=self.server_file_system.read_file(relative_file_path=message.file_name),
-                            modification_timestamp=modification_timestamp,
-                        )
-                        send_message(
-                            message=update_notification,
-                            recipient_ip_address=subscribed_client.ip_address,
-                            recipient_port_number=subscribed_client.port_number,
-                        )
+                reply_id=message.request_id,
+                is_successful=True,
+                modification_timestamp=file_metadata.get_modification_timestamp(),
+                version=file_metadata.version,
+            )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+            self._notify_subscribed_clients(
+                subscribed_clients,
+                file_name=message.file_name,
+                offset=file_metadata.file_size - len(message.content),
+                content=message.content,
+                previous_version=previous_file_metadata.version,
+                file_metadata=file_metadata,
+            )
+
+        elif isinstance(message, NegotiateCompressionRequest):
+            codec_id: int = choose_codec_id(message.codec_ids, self.compression_codec_names)
+            self.endpoint.set_compression_codec((str(client_ip_address), client_port_number), codec_id)
+            reply: NegotiateCompressionResponse = NegotiateCompressionResponse(
+                reply_id=message.request_id, codec_id=codec_id
+            )
+            self._add_message_to_history(message.request_id, reply, client_ip_address, client_port_number)
+            self._send_message(reply, client_ip_address, client_port_number)
+
+    def _read_file_range(
+        self,
+        request_id: UUID,
+        file_name: str,
+        offset: int,
+        number_of_bytes: int,
+        file_metadata: Optional[FileMetadata],
+        lease_duration_in_seconds: int,
+    ) -> ReadFileRangeResponse:
+        """
+        The metadata has to be looked up before the range is read, for the same reason as for a `ReadFileRequest`, and
+        the lease granted before that, so that a change made in between revokes it.
+        """
+        content, file_size = self.server_file_system.read_file_range(
+            relative_file_path=file_name, offset=offset, number_of_bytes=number_of_bytes
+        )
+        if content is None or file_metadata is None:
+            return ReadFileRangeResponse(
+                reply_id=request_id,
+                is_successful=False,
+                offset=offset,
+                file_size=0,
+                modification_timestamp=0,
+                version=0,
+                content=b"",
+            )
+        return ReadFileRangeResponse(
+            reply_id=request_id,
+            is_successful=True,
+            offset=offset,
+            file_size=file_size,
+            modification_timestamp=file_metadata.get_modification_timestamp(),
+            version=file_metadata.version,
+            content=content,
+            lease_duration_in_seconds=lease_duration_in_seconds,
+        )
+
+    def _synchronize_file_range(
+        self,
+        message: SynchronizeFileRangeRequest,
+        file_metadata: Optional[FileMetadata],
+        lease_duration_in_seconds: int,
+    ) -> SynchronizeFileRangeResponse | ReadFileRangeResponse:
+        """
+        Reads the range and describes it in terms of the blocks the client has. The data between the blocks is copied
+        out of the range, so the reply does not refer to the mapping of a file. The range is sent as it is instead, as
+        for a `ConditionalReadFileRangeRequest`, if the request is too large to work out a delta for on the thread
+        handling it or too few of the blocks match.
+        """
+        range_reply: ReadFileRangeResponse = self._read_file_range(
+            message.request_id,
+            message.file_name,
+            message.offset,
+            message.number_of_bytes,
+            file_metadata,
+            lease_duration_in_seconds,
+        )
+        if (
+            not range_reply.is_successful
+            or message.number_of_bytes > MAXIMUM_SYNCHRONIZED_SIZE_IN_BYTES
+            or len(message.block_hashes) > MAXIMUM_NUMBER_OF_BLOCK_HASHES
+            or message.block_size_in_bytes < MINIMUM_BLOCK_SIZE_IN_BYTES
+        ):
+            return range_reply
+        instructions: Optional[List[DeltaInstruction]] = compute_delta(
+            range_reply.content,
+            message.block_hashes,
+            message.block_size_in_bytes,
+            maximum_data_size_in_bytes=min(len(range_reply.content) // 2, MAXIMUM_DATA_SIZE_IN_BYTES),
+        )
+        if instructions is None:
+            return range_reply
+        return SynchronizeFileRangeResponse(
+            reply_id=message.request_id,
+            is_successful=True,
+            offset=range_reply.offset,
+            file_size=range_reply.file_size,
+            modification_timestamp=range_reply.modification_timestamp,
+            version=range_reply.version,
+            checksum=zlib.crc32(range_reply.content),
+            instructions=instructions,
+            lease_duration_in_seconds=range_reply.lease_duration_in_seconds,
+        )
+
+    def _grant_lease(
+        self,
+        message: ReadFileRangeRequest | ConditionalReadFileRangeRequest | SynchronizeFileRangeRequest,
+        client_ip_address: IPv4Address,
+        client_port_number: int,
+    ) -> int:
+        """
+        Grants the lease the client asked for, shortened to the maximum lease duration. Returns the duration granted,
+        which is 0 if the client did not ask for a lease or leases are disabled.
+        """
+        lease_duration_in_seconds: int = min(message.lease_duration_in_seconds, self.maximum_lease_duration_in_seconds)
+        if lease_duration_in_seconds <= 0:
+            return 0
+        self.server_file_system.grant_lease(
+            client_ip_address, client_port_number, lease_duration_in_seconds, message.file_name
+        )
+        return lease_duration_in_seconds
+
+    def _revoke_leases(self, file_name: str) -> None:
+        if self.maximum_lease_duration_in_seconds <= 0:
+            return
+        lease_holder_addresses: List[Tuple[str, int]] = self.server_file_system.revoke_leases(file_name)
+        if not lease_holder_addresses:
+            return
+        self.endpoint.send_message_to_recipients(
+            LeaseRevocationNotification(file_name=file_name), lease_holder_addresses
+        )
+
+    def _notify_subscribed_clients(
+        self,
+        subscribed_clients: List[SubscribedClient],
+        file_name: str,
+        offset: int,
+        content: Buffer,
+        previous_version: int,
+        file_metadata: FileMetadata,
+    ) -> None:
+        """
+        Sends the changed bytes to every subscribed client. The notification is built and marshalled once for all of
+        them.
+        """
+        recipient_addresses: List[Tuple[str, int]] = [
+            (str(subscribed_client.ip_address), subscribed_client.port_number)
+            for subscribed_client in subscribed_clients
+        ]
+        if not recipient_addresses:
+            return
+        update_delta_notification: UpdateDeltaNotification = UpdateDeltaNotification(
+            file_name=file_name,
+            offset=offset,
+            file_size=file_metadata.file_size,
+            previous_version=previous_version,
+            version=file_metadata.version,
+            modification_timestamp=file_metadata.get_modification_timestamp(),
+            content=content,
+        )
+        self.endpoint.send_message_to_recipients(update_delta_notification, recipient_addresses)
+
+    def _send_message(self, message: Message, recipient_ip_address: IPv4Address, recipient_port_number: int) -> None:
+        send_message(message, recipient_ip_address, recipient_port_number, endpoint=self.endpoint)
+
+    @staticmethod
+    def _get_file_name(message: Message) -> str:
+        if isinstance(message, ModifiedTimestampRequest):
+            return message.file_path
+        if isinstance(message, (ValidateFilesRequest, NegotiateCompressionRequest)):
+            # Validations only read metadata and negotiations concern no file, so they are processed in order with each
+            # other rather than per file.
+            return ""
+        return message.file_name
 
     def _check_for_duplicate_request_message(self, request_message: Message) -> bool:
-        return request_message.request_id in self.message_history
+        return self.message_history.has_reply(request_message.request_id)
 
-    def _add_message_to_history(self, request_id: UUID, response_message: Message) -> None:
-        self.message_history[request_id] = response_message
+    def _add_message_to_history(
+        self, request_id: UUID, response_message: Message, client_ip_address: IPv4Address, client_port_number: int
+    ) -> None:
+        if self.invocation_semantics == InvocationSemantics.AT_MOST_ONCE:
+            content: Optional[Buffer] = getattr(response_message, "content", None)
+            if isinstance(content, memoryview) and (
+                not isinstance(content.obj, bytes) or len(content) != len(content.obj)
+            ):
+                # Content served from the mapping of a file would change with the file, and a range of cached content
+                # would keep the whole file alive without counting towards the size of the history, so a copy is kept
+                # instead.
+                response_message = Message.unmarshall(response_message.marshall())
+            self.message_history.add_reply(request_id, response_message, (str(client_ip_address), client_port_number))
 
     def _remove_message_from_history(self, request_id: UUID) -> None:
-        del self.message_history[request_id]
+        self.message_history.remove_reply(request_id)
 
-    def _get_message_from_history(self, request_id: UUID) -> Message:
-        return self.message_history[request_id]
+    def _get_message_from_history(self, request_id: UUID) -> Optional[Message]:
+        return self.message_history.get_reply(request_id)
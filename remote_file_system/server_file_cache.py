@@ -0,0 +1,192 @@
+import mmap
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+
+class FileContentCache:
+    """
+    Contents of recently read files, kept by the server so that hot files are not read from disk for every request.
+    Each entry remembers the modification time and size the file had when it was read, and a lookup only hits if the
+    file still has both, so files changed by other processes are read again. The least recently used files are evicted
+    once the total size exceeds the byte budget. Files larger than `maximum_file_size_in_bytes` are never cached.
+    """
+
+    def __init__(
+        self, maximum_size_in_bytes: int = 64 * 1024 * 1024, maximum_file_size_in_bytes: int = 4 * 1024 * 1024
+    ):
+        self.maximum_size_in_bytes: int = maximum_size_in_bytes
+        self.maximum_file_size_in_bytes: int = maximum_file_size_in_bytes
+        # Ordered from least to most recently used. Values are the content, the modification time in nanoseconds and
+        # the size of the file when it was read.
+        self.files: OrderedDict[str, Tuple[bytes, int, int]] = OrderedDict()
+        self.size_in_bytes: int = 0
+        self.number_of_hits: int = 0
+        self.number_of_misses: int = 0
+        self.number_of_evictions: int = 0
+        self.number_of_invalidations: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def can_cache(self, file_size: int) -> bool:
+        return file_size <= min(self.maximum_file_size_in_bytes, self.maximum_size_in_bytes)
+
+    def get_file_content(
+        self, full_file_path: str, modification_time_in_nanoseconds: int, file_size: int
+    ) -> Optional[bytes]:
+        """
+        Returns the cached content if the file still has the given modification time and size, and None otherwise.
+        """
+        with self.lock:
+            if full_file_path not in self.files:
+                self.number_of_misses += 1
+                return None
+            content, cached_modification_time_in_nanoseconds, cached_file_size = self.files[full_file_path]
+            if (
+                cached_modification_time_in_nanoseconds != modification_time_in_nanoseconds
+                or cached_file_size != file_size
+            ):
+                logger.debug(f"Cached content of {full_file_path} is outdated.")
+                self._remove(full_file_path)
+                self.number_of_invalidations += 1
+                self.number_of_misses += 1
+                return None
+            self.files.move_to_end(full_file_path)
+            self.number_of_hits += 1
+            return content
+
+    def put_file_content(
+        self, full_file_path: str, content: bytes, modification_time_in_nanoseconds: int, file_size: int
+    ) -> None:
+        if not self.can_cache(len(content)):
+            return
+        with self.lock:
+            if full_file_path in self.files:
+                self._remove(full_file_path)
+            self.files[full_file_path] = (content, modification_time_in_nanoseconds, file_size)
+            self.size_in_bytes += len(content)
+            while self.size_in_bytes > self.maximum_size_in_bytes:
+                evicted_file_path: str = next(iter(self.files))
+                logger.debug(f"Evicting {evicted_file_path} from the file content cache.")
+                self._remove(evicted_file_path)
+                self.number_of_evictions += 1
+
+    def invalidate(self, full_file_path: str) -> None:
+        with self.lock:
+            if full_file_path in self.files:
+                self._remove(full_file_path)
+                self.number_of_invalidations += 1
+
+    def get_statistics(self) -> Dict[str, float]:
+        with self.lock:
+            number_of_lookups: int = self.number_of_hits + self.number_of_misses
+            return {
+                "number_of_files": len(self.files),
+                "size_in_bytes": self.size_in_bytes,
+                "number_of_hits": self.number_of_hits,
+                "number_of_misses": self.number_of_misses,
+                "hit_rate": self.number_of_hits / number_of_lookups if number_of_lookups else 0.0,
+                "number_of_evictions": self.number_of_evictions,
+                "number_of_invalidations": self.number_of_invalidations,
+            }
+
+    def __getstate__(self) -> Dict[str, object]:
+        # The cache is created before the server processes are started and each process fills its own copy.
+        state: Dict[str, object] = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _remove(self, full_file_path: str) -> None:
+        content, _, _ = self.files.pop(full_file_path)
+        self.size_in_bytes -= len(content)
+
+
+class MappedFileCache:
+    """
+    Read-only memory maps of large files, so that reads are served as memoryview slices of the mapping instead of being
+    read into new bytes objects. The operating system loads pages as they are touched and shares them with its page
+    cache, so clients reading different regions of a large file at once do not each hold a copy of it. A mapping is
+    replaced once the modification time or size of the file changes, and the least recently used mappings are dropped
+    once more than `maximum_number_of_files` are open. Dropped mappings are closed once no reply refers to them anymore.
+    Files should only be changed through the server while they are mapped, as a file truncated by another process
+    cannot be read through its old mapping.
+    """
+
+    def __init__(self, minimum_file_size_in_bytes: int = 16 * 1024 * 1024, maximum_number_of_files: int = 64):
+        self.minimum_file_size_in_bytes: int = minimum_file_size_in_bytes
+        self.maximum_number_of_files: int = maximum_number_of_files
+        # Ordered from least to most recently used. Values are the mapping, the modification time in nanoseconds and
+        # the size of the file when it was mapped.
+        self.files: OrderedDict[str, Tuple[mmap.mmap, int, int]] = OrderedDict()
+        self.number_of_hits: int = 0
+        self.number_of_misses: int = 0
+        self.number_of_evictions: int = 0
+        self.number_of_invalidations: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def can_map(self, file_size: int) -> bool:
+        # Empty files cannot be mapped.
+        return file_size >= max(self.minimum_file_size_in_bytes, 1)
+
+    def get_mapping(self, full_file_path: str, modification_time_in_nanoseconds: int, file_size: int) -> mmap.mmap:
+        """
+        Returns the mapping of the file, mapping it again if the file no longer has the given modification time and
+        size.
+        """
+        with self.lock:
+            if full_file_path in self.files:
+                mapping, mapped_modification_time_in_nanoseconds, mapped_file_size = self.files[full_file_path]
+                if (
+                    mapped_modification_time_in_nanoseconds == modification_time_in_nanoseconds
+                    and mapped_file_size == file_size
+                ):
+                    self.files.move_to_end(full_file_path)
+                    self.number_of_hits += 1
+                    return mapping
+                logger.debug(f"Mapping of {full_file_path} is outdated.")
+                del self.files[full_file_path]
+                self.number_of_invalidations += 1
+
+            self.number_of_misses += 1
+            with open(full_file_path, "rb") as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.files[full_file_path] = (mapping, modification_time_in_nanoseconds, file_size)
+            while len(self.files) > self.maximum_number_of_files:
+                evicted_file_path, _ = self.files.popitem(last=False)
+                logger.debug(f"Dropping the mapping of {evicted_file_path}.")
+                self.number_of_evictions += 1
+            return mapping
+
+    def invalidate(self, full_file_path: str) -> None:
+        with self.lock:
+            if full_file_path in self.files:
+                del self.files[full_file_path]
+                self.number_of_invalidations += 1
+
+    def get_statistics(self) -> Dict[str, float]:
+        with self.lock:
+            number_of_lookups: int = self.number_of_hits + self.number_of_misses
+            return {
+                "number_of_files": len(self.files),
+                "number_of_hits": self.number_of_hits,
+                "number_of_misses": self.number_of_misses,
+                "hit_rate": self.number_of_hits / number_of_lookups if number_of_lookups else 0.0,
+                "number_of_evictions": self.number_of_evictions,
+                "number_of_invalidations": self.number_of_invalidations,
+            }
+
+    def __getstate__(self) -> Dict[str, object]:
+        # Mappings cannot be pickled, so each server process maps the files it serves itself.
+        state: Dict[str, object] = self.__dict__.copy()
+        del state["lock"]
+        state["files"] = OrderedDict()
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
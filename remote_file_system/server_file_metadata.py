@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from contextlib import AbstractContextManager
+from typing import Dict, MutableMapping, Optional, Set, Tuple
+
+from loguru import logger
+
+# Long enough that most lookups are answered from the table, short enough that changes made outside of the server
+# process are noticed quickly.
+DEFAULT_REFRESH_INTERVAL_IN_SECONDS = 1.0
+
+# Version of a file, and its modification time in nanoseconds, size and inode number when it was given that version.
+VersionRecord = Tuple[int, int, int, int]
+
+
+class FileMetadata:
+    def __init__(
+        self, file_size: int, modification_time_in_nanoseconds: int, version: int, validation_timestamp: float
+    ):
+        self.file_size: int = file_size
+        self.modification_time_in_nanoseconds: int = modification_time_in_nanoseconds
+        self.version: int = version
+        # Monotonic time at which the metadata was last checked against the file system.
+        self.validation_timestamp: float = validation_timestamp
+
+    def get_modification_timestamp(self) -> int:
+        return self.modification_time_in_nanoseconds // 1_000_000_000
+
+
+class FileMetadataTable:
+    """
+    Size, modification time and version of the files served, so that metadata requests are answered without stat
+    calls. Changes made through the server update the table directly. The first lookup in a directory fills the table
+    for the whole directory with `os.scandir`, and an entry is checked against the file system again once it is older
+    than `refresh_interval_in_seconds`, which is how changes made outside of this server process are noticed. With an
+    interval of zero every lookup is checked.
+
+    Every change of a file gives it a higher version. Changes made through the server always do, even if they leave the
+    size and modification time as they were, and a change made outside of the server does once the modification time,
+    size or inode number of the file is seen to differ from when it got its version. Versions are at least the current
+    time in nanoseconds, so they are not given out again after the server restarts. Server processes sharing a port
+    pass in the same version records and lock, for example proxies from a `multiprocessing.Manager`, so that they agree
+    on versions and a change made through one of them is seen by the others once their entries are refreshed.
+    """
+
+    def __init__(
+        self,
+        refresh_interval_in_seconds: float = DEFAULT_REFRESH_INTERVAL_IN_SECONDS,
+        version_records: Optional[MutableMapping[str, VersionRecord]] = None,
+        version_lock: Optional[AbstractContextManager] = None,
+    ):
+        self.refresh_interval_in_seconds: float = refresh_interval_in_seconds
+        self.files: Dict[str, FileMetadata] = {}
+        self.scanned_directories: Set[str] = set()
+        self.version_records: MutableMapping[str, VersionRecord] = (
+            version_records if version_records is not None else {}
+        )
+        self.version_lock: AbstractContextManager = version_lock if version_lock is not None else threading.Lock()
+        self.number_of_hits: int = 0
+        self.number_of_misses: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def get_file_metadata(
+        self, full_file_path: str, maximum_age_in_seconds: Optional[float] = None
+    ) -> Optional[FileMetadata]:
+        """
+        Returns None if the file does not exist. The entry is refreshed if it is older than `maximum_age_in_seconds`,
+        which is the refresh interval by default. A maximum age of 0 always refreshes it, which is how a version that
+        another server process may have changed is checked before the file is written to.
+        """
+        if maximum_age_in_seconds is None:
+            maximum_age_in_seconds = self.refresh_interval_in_seconds
+        with self.lock:
+            if self.refresh_interval_in_seconds > 0:
+                directory: str = os.path.dirname(full_file_path)
+                if directory not in self.scanned_directories:
+                    self._scan_directory(directory)
+            file_metadata: Optional[FileMetadata] = self.files.get(full_file_path)
+            if (
+                file_metadata is not None
+                and time.monotonic() - file_metadata.validation_timestamp < maximum_age_in_seconds
+            ):
+                self.number_of_hits += 1
+                return file_metadata
+            self.number_of_misses += 1
+            return self._refresh(full_file_path)
+
+    def record_change(self, full_file_path: str) -> Optional[FileMetadata]:
+        """
+        Called after the server changed the file. The file gets a new version even if its size and modification time
+        stayed the same, as they would for a write within the resolution of the modification time.
+        """
+        with self.lock:
+            return self._refresh(full_file_path, is_changed=True)
+
+    def record_deletion(self, full_file_path: str) -> None:
+        with self.lock:
+            self.files.pop(full_file_path, None)
+        with self.version_lock:
+            self.version_records.pop(full_file_path, None)
+
+    def get_statistics(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "number_of_files": len(self.files),
+                "number_of_hits": self.number_of_hits,
+                "number_of_misses": self.number_of_misses,
+            }
+
+    def __getstate__(self) -> Dict[str, object]:
+        # The table is created before the server processes are started and each process fills its own copy, while the
+        # version records and their lock are shared.
+        state: Dict[str, object] = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _scan_directory(self, directory: str) -> None:
+        self.scanned_directories.add(directory)
+        try:
+            with os.scandir(directory) as directory_entries:
+                for directory_entry in directory_entries:
+                    if directory_entry.is_file():
+                        self._put(directory_entry.path, directory_entry.stat())
+        except OSError as e:
+            logger.warning(f"Server failed to scan {directory} for file metadata: {e}")
+
+    def _refresh(self, full_file_path: str, is_changed: bool = False) -> Optional[FileMetadata]:
+        try:
+            file_status: os.stat_result = os.stat(full_file_path)
+        except FileNotFoundError:
+            self.files.pop(full_file_path, None)
+            return None
+        return self._put(full_file_path, file_status, is_changed)
+
+    def _put(self, full_file_path: str, file_status: os.stat_result, is_changed: bool = False) -> FileMetadata:
+        file_metadata: FileMetadata = FileMetadata(
+            file_status.st_size,
+            file_status.st_mtime_ns,
+            self._get_version(full_file_path, file_status, is_changed),
+            time.monotonic(),
+        )
+        self.files[full_file_path] = file_metadata
+        return file_metadata
+
+    def _get_version(self, full_file_path: str, file_status: os.stat_result, is_changed: bool) -> int:
+        """
+        Gives the file a new version if it was changed through the server, or if its modification time, size or inode
+        number differ from when it got its current version.
+        """
+        file_identity: Tuple[int, int, int] = (file_status.st_mtime_ns, file_status.st_size, file_status.st_ino)
+        version_record: Optional[VersionRecord] = self.version_records.get(full_file_path)
+        if not is_changed and version_record is not None and version_record[1:] == file_identity:
+            return version_record[0]
+        with self.version_lock:
+            # Another server process may have given the file a version in the meantime.
+            version_record = self.version_records.get(full_file_path)
+            if not is_changed and version_record is not None and version_record[1:] == file_identity:
+                return version_record[0]
+            previous_version: int = version_record[0] if version_record is not None else 0
+            version: int = max(previous_version + 1, time.time_ns())
+            self.version_records[full_file_path] = (version, *file_identity)
+            return version
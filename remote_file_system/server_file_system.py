@@ -1,13 +1,20 @@
+import fcntl
+import heapq
 import os
+import threading
 import time
-from collections import defaultdict
+from contextlib import AbstractContextManager, contextmanager
 from ipaddress import IPv4Address
 from pathlib import Path
-from typing import Dict, Tuple, List
+from typing import Dict, Iterator, MutableMapping, Tuple, List
 from typing import Optional
 
 from loguru import logger
 
+from remote_file_system.message import Buffer
+from remote_file_system.server_file_cache import FileContentCache, MappedFileCache
+from remote_file_system.server_file_metadata import FileMetadata, FileMetadataTable
+
 
 class SubscribedClient:
     def __init__(self, monitoring_expiration_timestamp: int, ip_address: IPv4Address, port_number: int):
@@ -16,14 +23,58 @@ class SubscribedClient:
         self.port_number = port_number
 
 
+# Subscribed clients of a file, keyed by the IP address and port number they listen on.
+SubscribedClients = Dict[Tuple[str, int], SubscribedClient]
+# Expiration timestamps of the leases on a file, keyed by the IP address and port number of the client holding them.
+Leases = Dict[Tuple[str, int], float]
+
+
 class ServerFileSystem:
-    def __init__(self, server_root_directory: Path):
-        self.subscribed_clients: Dict[str, List[SubscribedClient]] = defaultdict(list)
+    def __init__(
+        self,
+        server_root_directory: Path,
+        subscribed_clients: Optional[MutableMapping[str, SubscribedClients]] = None,
+        subscription_lock: Optional[AbstractContextManager] = None,
+        file_content_cache: Optional[FileContentCache] = None,
+        mapped_file_cache: Optional[MappedFileCache] = None,
+        file_metadata_table: Optional[FileMetadataTable] = None,
+        leases: Optional[MutableMapping[str, Leases]] = None,
+        lease_lock: Optional[AbstractContextManager] = None,
+    ):
+        """
+        Server processes sharing a port pass in the same subscribed clients mapping and lock, for example proxies from
+        a `multiprocessing.Manager`, so that every process notifies every subscriber. They share the leases and their
+        lock in the same way, so that a change made through any process revokes every lease. The file content cache
+        and the mapped file cache are per process, as cached content and mappings are checked against the modification
+        time and size of the file before they are used. So is the file metadata table, which notices changes made by
+        other processes once its entries are refreshed.
+        """
+        self.subscribed_clients: MutableMapping[str, SubscribedClients] = (
+            subscribed_clients if subscribed_clients is not None else {}
+        )
+        self.subscription_lock: AbstractContextManager = (
+            subscription_lock if subscription_lock is not None else threading.Lock()
+        )
+        # Expiration timestamp, file and client address of every subscription made or renewed through this file
+        # system, earliest first. Expired subscriptions are removed from the mapping when their entry is popped, and
+        # entries of subscriptions that were renewed or cancelled in the meantime are skipped.
+        self.subscription_expirations: List[Tuple[int, str, str, int]] = []
         self.server_root_directory: Path = server_root_directory
+        self.file_content_cache: Optional[FileContentCache] = file_content_cache
+        self.mapped_file_cache: Optional[MappedFileCache] = mapped_file_cache
+        self.file_metadata_table: FileMetadataTable = (
+            file_metadata_table if file_metadata_table is not None else FileMetadataTable()
+        )
+        self.leases: MutableMapping[str, Leases] = leases if leases is not None else {}
+        self.lease_lock: AbstractContextManager = lease_lock if lease_lock is not None else threading.Lock()
 
-    def read_file(self, relative_file_path: str) -> Optional[bytes]:
+    def read_file(self, relative_file_path: str) -> Optional[Buffer]:
         full_file_path = os.path.join(self.server_root_directory, relative_file_path)
 
+        cached_content: Optional[Buffer] = self._get_cached_file_content(full_file_path)
+        if cached_content is not None:
+            return cached_content
+
         if not os.path.exists(full_file_path):
             logger.warning(f"Server failed to perform a read file operation as no file exists at {full_file_path}")
             return None
@@ -32,6 +83,28 @@ class ServerFileSystem:
             file_contents = file.read()
             return file_contents
 
+    def read_file_range(
+        self, relative_file_path: str, offset: int, number_of_bytes: int
+    ) -> Tuple[Optional[Buffer], Optional[int]]:
+        """
+        Reads at most `number_of_bytes` starting at `offset` without loading the rest of the file, unless the whole
+        file is cached or mapped. Returns the content together with the current size of the file.
+        """
+        full_file_path = os.path.join(self.server_root_directory, relative_file_path)
+
+        cached_content: Optional[Buffer] = self._get_cached_file_content(full_file_path)
+        if cached_content is not None:
+            return memoryview(cached_content)[offset : offset + number_of_bytes], len(cached_content)
+
+        if not os.path.exists(full_file_path):
+            logger.warning(f"Server failed to perform a read file operation as no file exists at {full_file_path}")
+            return None, None
+
+        with open(full_file_path, "rb") as file:
+            file_size: int = os.fstat(file.fileno()).st_size
+            file.seek(offset)
+            return file.read(number_of_bytes), file_size
+
     def write_file(
         self, relative_file_path: str, offset: int, file_content: bytes
     ) -> Tuple[bool, Optional[List[SubscribedClient]]]:
@@ -49,20 +122,55 @@ class ServerFileSystem:
         with open(full_file_path, "r+b") as file:
             file.seek(offset)
             file.write(file_content)
+        self._record_change(full_file_path)
 
-        return True, self.subscribed_clients[relative_file_path]
+        return True, self.get_subscribed_clients(relative_file_path)
 
     def get_modified_timestamp(self, relative_file_path: str) -> Tuple[bool, Optional[int]]:
-        full_file_path = os.path.join(self.server_root_directory, relative_file_path)
-
-        if not os.path.exists(full_file_path):
+        file_metadata: Optional[FileMetadata] = self.get_file_metadata(relative_file_path)
+        if file_metadata is None:
             logger.warning(
-                f"Server failed to check a file modification timestamp as no file exists at {full_file_path}"
+                f"Server failed to check a file modification timestamp as no file exists at {relative_file_path}"
             )
             return False, None
 
-        modification_timestamp: int = int(os.path.getmtime(full_file_path))
-        return True, modification_timestamp
+        return True, file_metadata.get_modification_timestamp()
+
+    def get_file_size(self, relative_file_path: str) -> Tuple[bool, Optional[int]]:
+        file_metadata: Optional[FileMetadata] = self.get_file_metadata(relative_file_path)
+        if file_metadata is None:
+            logger.warning(f"Server failed to check a file size as no file exists at {relative_file_path}")
+            return False, None
+
+        return True, file_metadata.file_size
+
+    def get_file_metadata(
+        self, relative_file_path: str, maximum_age_in_seconds: Optional[float] = None
+    ) -> Optional[FileMetadata]:
+        """
+        Returns None if no file exists at the path. Metadata older than `maximum_age_in_seconds`, the refresh interval
+        of the file metadata table by default, is refreshed from the file first.
+        """
+        full_file_path = os.path.join(self.server_root_directory, relative_file_path)
+        return self.file_metadata_table.get_file_metadata(full_file_path, maximum_age_in_seconds)
+
+    @contextmanager
+    def lock_file(self, relative_file_path: str) -> Iterator[None]:
+        """
+        Holds an exclusive lock on the file, which every server process takes around checking the version of the file
+        and changing it, so that no other process changes the file in between. The lock is advisory and `flock` based,
+        so it is shared by the processes on the host, and nothing is locked if no file exists at the path.
+        """
+        full_file_path = os.path.join(self.server_root_directory, relative_file_path)
+        try:
+            file = open(full_file_path, "rb")
+        except OSError:
+            yield
+            return
+        # Closing the file releases the lock.
+        with file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            yield
 
     def subscribe_to_updates(
         self,
@@ -71,23 +179,161 @@ class ServerFileSystem:
         monitoring_interval_in_seconds: int,
         relative_file_path: str,
     ) -> bool:
+        """
+        A client that subscribes again to the same file replaces its earlier subscription rather than adding another.
+        """
+        with self.subscription_lock:
+            self._remove_expired_subscriptions()
+            self._put_subscription(
+                client_ip_address, client_port_number, monitoring_interval_in_seconds, relative_file_path
+            )
+        return True
+
+    def renew_subscription(
+        self,
+        client_ip_address: IPv4Address,
+        client_port_number: int,
+        monitoring_interval_in_seconds: int,
+        relative_file_path: str,
+    ) -> bool:
+        """
+        Extends a subscription that has not expired yet. Returns False if there is no such subscription.
+        """
+        with self.subscription_lock:
+            self._remove_expired_subscriptions()
+            subscribed_clients: SubscribedClients = self.subscribed_clients.get(relative_file_path, {})
+            if (str(client_ip_address), client_port_number) not in subscribed_clients:
+                logger.warning(
+                    f"Server did not renew the subscription to {relative_file_path} as "
+                    f"{client_ip_address}:{client_port_number} is not subscribed to it."
+                )
+                return False
+            self._put_subscription(
+                client_ip_address, client_port_number, monitoring_interval_in_seconds, relative_file_path
+            )
+        return True
+
+    def unsubscribe_from_updates(
+        self, client_ip_address: IPv4Address, client_port_number: int, relative_file_path: str
+    ) -> bool:
+        """
+        Returns False if the client is not subscribed to the file.
+        """
+        with self.subscription_lock:
+            self._remove_expired_subscriptions()
+            return self._remove_subscription(relative_file_path, (str(client_ip_address), client_port_number))
+
+    def get_subscribed_clients(self, relative_file_path: str) -> List[SubscribedClient]:
         current_timestamp: int = int(time.time())
-        monitoring_expiration_timestamp: int = current_timestamp + monitoring_interval_in_seconds
+        with self.subscription_lock:
+            self._remove_expired_subscriptions()
+            subscribed_clients: SubscribedClients = self.subscribed_clients.get(relative_file_path, {})
+        # Subscriptions made through another server process are only removed by that process, so they are filtered.
+        return [
+            subscribed_client
+            for subscribed_client in subscribed_clients.values()
+            if subscribed_client.monitoring_expiration_timestamp > current_timestamp
+        ]
 
+    def _put_subscription(
+        self,
+        client_ip_address: IPv4Address,
+        client_port_number: int,
+        monitoring_interval_in_seconds: int,
+        relative_file_path: str,
+    ) -> None:
+        monitoring_expiration_timestamp: int = int(time.time()) + monitoring_interval_in_seconds
         subscribed_client: SubscribedClient = SubscribedClient(
             monitoring_expiration_timestamp=monitoring_expiration_timestamp,
             ip_address=client_ip_address,
             port_number=client_port_number,
         )
-        logger.info(f"subscribed_client: {self.subscribed_clients}")
-        self.subscribed_clients[relative_file_path].append(subscribed_client)
+        # Values held by a shared mapping are copies, so the updated subscriptions have to be stored back.
+        subscribed_clients: SubscribedClients = self.subscribed_clients.get(relative_file_path, {})
+        subscribed_clients[(str(client_ip_address), client_port_number)] = subscribed_client
+        self.subscribed_clients[relative_file_path] = subscribed_clients
+        heapq.heappush(
+            self.subscription_expirations,
+            (monitoring_expiration_timestamp, relative_file_path, str(client_ip_address), client_port_number),
+        )
+        logger.info(f"subscribed_clients: {list(subscribed_clients)}")
+
+    def _remove_subscription(self, relative_file_path: str, client_address: Tuple[str, int]) -> bool:
+        subscribed_clients: SubscribedClients = self.subscribed_clients.get(relative_file_path, {})
+        if client_address not in subscribed_clients:
+            return False
+        del subscribed_clients[client_address]
+        if subscribed_clients:
+            self.subscribed_clients[relative_file_path] = subscribed_clients
+        else:
+            del self.subscribed_clients[relative_file_path]
         return True
 
+    def _remove_expired_subscriptions(self) -> None:
+        """
+        Must be called with the subscription lock held.
+        """
+        current_timestamp: int = int(time.time())
+        while self.subscription_expirations and self.subscription_expirations[0][0] <= current_timestamp:
+            _, relative_file_path, client_ip_address, client_port_number = heapq.heappop(self.subscription_expirations)
+            client_address: Tuple[str, int] = (client_ip_address, client_port_number)
+            subscribed_client: Optional[SubscribedClient] = self.subscribed_clients.get(relative_file_path, {}).get(
+                client_address
+            )
+            if subscribed_client is not None and subscribed_client.monitoring_expiration_timestamp <= current_timestamp:
+                self._remove_subscription(relative_file_path, client_address)
+
+    def grant_lease(
+        self,
+        client_ip_address: IPv4Address,
+        client_port_number: int,
+        lease_duration_in_seconds: int,
+        relative_file_path: str,
+    ) -> None:
+        """
+        A client that already holds a lease on the file has it extended. Expired leases on the file are dropped.
+        """
+        current_timestamp: float = time.time()
+        with self.lease_lock:
+            leases: Leases = {
+                client_address: lease_expiration_timestamp
+                for client_address, lease_expiration_timestamp in self.leases.get(relative_file_path, {}).items()
+                if lease_expiration_timestamp > current_timestamp
+            }
+            leases[(str(client_ip_address), client_port_number)] = current_timestamp + lease_duration_in_seconds
+            self.leases[relative_file_path] = leases
+
+    def revoke_leases(self, relative_file_path: str) -> List[Tuple[str, int]]:
+        """
+        Removes every lease on the file. Returns the addresses of the clients whose leases had not expired yet, which
+        have to be told that their cached copy is no longer valid.
+        """
+        current_timestamp: float = time.time()
+        with self.lease_lock:
+            leases: Leases = self.leases.pop(relative_file_path, {})
+        return [
+            client_address
+            for client_address, lease_expiration_timestamp in leases.items()
+            if lease_expiration_timestamp > current_timestamp
+        ]
+
+    def remove_expired_leases(self) -> None:
+        """
+        Leases on files that are not changed are otherwise only dropped when the file is read again.
+        """
+        current_timestamp: float = time.time()
+        with self.lease_lock:
+            for relative_file_path, leases in list(self.leases.items()):
+                if max(leases.values(), default=0) <= current_timestamp:
+                    del self.leases[relative_file_path]
+
     def delete_file(self, file_name: str) -> bool:
         file_path = os.path.join(self.server_root_directory, file_name)
         if not os.path.exists(file_path):
             return False
         os.remove(file_path)
+        self._invalidate_cached_file_content(file_path)
+        self.file_metadata_table.record_deletion(file_path)
         return True
 
     def append_file(
@@ -101,5 +347,57 @@ class ServerFileSystem:
 
         with open(full_file_path, "ab") as file:
             file.write(file_content)
+        self._record_change(full_file_path)
+
+        return True, self.get_subscribed_clients(relative_file_path)
+
+    def _get_cached_file_content(self, full_file_path: str) -> Optional[Buffer]:
+        """
+        Returns the content of the whole file from the file content cache if the file is small enough, reading it into
+        the cache on a miss, or otherwise as a memoryview of its mapping if it is large enough to be mapped. The cached
+        content or mapping is revalidated against the modification time and size of the file on disk rather than the
+        file metadata table, which may be up to its refresh interval behind changes made by other processes. Returns
+        None if the file does not exist or is served by neither.
+        """
+        if self.file_content_cache is None and self.mapped_file_cache is None:
+            return None
+        try:
+            file_status: os.stat_result = os.stat(full_file_path)
+        except FileNotFoundError:
+            return None
+
+        if self.file_content_cache is None or not self.file_content_cache.can_cache(file_status.st_size):
+            if self.mapped_file_cache is None or not self.mapped_file_cache.can_map(file_status.st_size):
+                return None
+            return memoryview(
+                self.mapped_file_cache.get_mapping(full_file_path, file_status.st_mtime_ns, file_status.st_size)
+            )
+
+        content: Optional[bytes] = self.file_content_cache.get_file_content(
+            full_file_path, file_status.st_mtime_ns, file_status.st_size
+        )
+        if content is not None:
+            return content
+
+        with open(full_file_path, "rb") as file:
+            content = file.read()
+            file_status_after_read: os.stat_result = os.fstat(file.fileno())
+        # Content read while the file was being changed is returned but not cached.
+        if (file_status_after_read.st_mtime_ns, file_status_after_read.st_size) == (
+            file_status.st_mtime_ns,
+            len(content),
+        ):
+            self.file_content_cache.put_file_content(
+                full_file_path, content, file_status.st_mtime_ns, file_status.st_size
+            )
+        return content
+
+    def _invalidate_cached_file_content(self, full_file_path: str) -> None:
+        if self.file_content_cache is not None:
+            self.file_content_cache.invalidate(full_file_path)
+        if self.mapped_file_cache is not None:
+            self.mapped_file_cache.invalidate(full_file_path)
 
-        return True, self.subscribed_clients[relative_file_path]
+    def _record_change(self, full_file_path: str) -> None:
+        self._invalidate_cached_file_content(full_file_path)
+        self.file_metadata_table.record_change(full_file_path)
@@ -1,52 +1,196 @@
 #!/usr/bin/env python3
 import argparse
+import multiprocessing
 from ipaddress import IPv4Address
 from pathlib import Path
+from typing import Optional
 
+from remote_file_system.compression import AVAILABLE_CODEC_NAMES, MINIMUM_COMPRESSED_SIZE_IN_BYTES
+from remote_file_system.message_history import SharedStateManager
 from remote_file_system.server import Server
+from remote_file_system.server_file_cache import FileContentCache, MappedFileCache
+from remote_file_system.server_file_metadata import FileMetadataTable, DEFAULT_REFRESH_INTERVAL_IN_SECONDS
 from remote_file_system.server_file_system import ServerFileSystem
 from remote_file_system.server import InvocationSemantics
+from remote_file_system.worker_pool import MAXIMUM_NUMBER_OF_PENDING_TASKS
 
 
-parser = argparse.ArgumentParser(prog="server_menu", description="Create server with given arguments")
-parser.add_argument(
-    "-i", "--invocation_method", type=int, help="Invocation number, 0 for at least once, 1 for at most once", default=0
-)
-parser.add_argument("-sip", "--ip_address", type=str, help="specifies ip number for server")
-parser.add_argument("-sp", "--port_number", type=int, help="sets port number for server")
-parser.add_argument(
-    "-dir",
-    "--directory",
-    type=str,
-    help="specify the root directory of the server file system. This "
-    "will be the name of the directory in the project root "
-    "folder",
-    default="server_dir",
-)
-
-args = parser.parse_args()
-
-invocation_method = args.invocation_method
-SERVER_IP_ADDRESS = IPv4Address(args.ip_address)
-SERVER_PORT_NUMBER = args.port_number
-server_root_directory = Path.cwd() / args.directory
-
-
-server_file_system = ServerFileSystem(server_root_directory=server_root_directory)
-
-if invocation_method == 0:
-    server = Server(
-        server_ip_address=SERVER_IP_ADDRESS,
-        server_port_number=SERVER_PORT_NUMBER,
-        file_system=server_file_system,
-        invocation_semantics=InvocationSemantics.AT_LEAST_ONCE,
-    )
-    server.listen_for_messages()
-else:
-    server = Server(
-        server_ip_address=SERVER_IP_ADDRESS,
-        server_port_number=SERVER_PORT_NUMBER,
-        file_system=server_file_system,
-        invocation_semantics=InvocationSemantics.AT_MOST_ONCE,
-    )
-    server.listen_for_messages()
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="server_menu", description="Create server with given arguments")
+    parser.add_argument(
+        "-i",
+        "--invocation_method",
+        type=int,
+        help="Invocation number, 0 for at least once, 1 for at most once",
+        default=0,
+    )
+    parser.add_argument("-sip", "--ip_address", type=str, help="specifies ip number for server")
+    parser.add_argument("-sp", "--port_number", type=int, help="sets port number for server")
+    parser.add_argument(
+        "-dir",
+        "--directory",
+        type=str,
+        help="specify the root directory of the server file system. This "
+        "will be the name of the directory in the project root "
+        "folder",
+        default="server_dir",
+    )
+    parser.add_argument(
+        "-w",
+        "--worker_threads",
+        type=int,
+        help="specifies number of threads processing messages concurrently, 0 to process them one at a time",
+        default=0,
+    )
+    parser.add_argument(
+        "-wq",
+        "--worker_queue_length",
+        type=int,
+        help="sets the number of messages the worker threads may have queued, beyond which messages are dropped",
+        default=MAXIMUM_NUMBER_OF_PENDING_TASKS,
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        help="specifies number of server processes sharing the port, each with its own worker threads",
+        default=1,
+    )
+
+    parser.add_argument(
+        "-fc",
+        "--file_cache_megabytes",
+        type=int,
+        help="sets the size of the cache of file contents kept by each server process, 0 to read every file from disk",
+        default=64,
+    )
+    parser.add_argument(
+        "-mm",
+        "--memory_map_megabytes",
+        type=int,
+        help="sets the size from which files are served from a memory map by each server process, 0 to never map them",
+        default=16,
+    )
+    parser.add_argument(
+        "-mr",
+        "--metadata_refresh_seconds",
+        type=float,
+        help="sets how long each server process trusts the size and modification time it last saw of a file before "
+        "checking the file again, 0 to check on every request",
+        default=DEFAULT_REFRESH_INTERVAL_IN_SECONDS,
+    )
+    parser.add_argument(
+        "-l",
+        "--lease_seconds",
+        type=int,
+        help="sets the longest lease granted to clients on a file they read, during which they read the file from "
+        "their cache and are told when it changes, 0 to grant no leases",
+        default=0,
+    )
+    parser.add_argument(
+        "-z",
+        "--compression",
+        type=str,
+        help="sets the codecs clients may compress messages carrying file content with, comma separated, empty to "
+        "compress nothing",
+        default=",".join(AVAILABLE_CODEC_NAMES),
+    )
+    parser.add_argument(
+        "-zm",
+        "--compression_minimum_bytes",
+        type=int,
+        help="sends messages carrying less file content than this uncompressed",
+        default=MINIMUM_COMPRESSED_SIZE_IN_BYTES,
+    )
+
+    args = parser.parse_args()
+
+    invocation_method = args.invocation_method
+    SERVER_IP_ADDRESS = IPv4Address(args.ip_address)
+    SERVER_PORT_NUMBER = args.port_number
+    server_root_directory = Path.cwd() / args.directory
+    invocation_semantics = (
+        InvocationSemantics.AT_LEAST_ONCE if invocation_method == 0 else InvocationSemantics.AT_MOST_ONCE
+    )
+    compression_codec_names = [codec_name for codec_name in args.compression.split(",") if codec_name]
+
+    if args.processes <= 1:
+        server_file_system = ServerFileSystem(
+            server_root_directory=server_root_directory,
+            file_content_cache=create_file_content_cache(args),
+            mapped_file_cache=create_mapped_file_cache(args),
+            file_metadata_table=FileMetadataTable(refresh_interval_in_seconds=args.metadata_refresh_seconds),
+        )
+        server = Server(
+            server_ip_address=SERVER_IP_ADDRESS,
+            server_port_number=SERVER_PORT_NUMBER,
+            file_system=server_file_system,
+            invocation_semantics=invocation_semantics,
+            number_of_worker_threads=args.worker_threads,
+            maximum_number_of_queued_messages=args.worker_queue_length,
+            maximum_lease_duration_in_seconds=args.lease_seconds,
+            compression_codec_names=compression_codec_names,
+            minimum_compressed_size_in_bytes=args.compression_minimum_bytes,
+        )
+        server.listen_for_messages()
+    else:
+        # The message history, the subscriptions, the leases and the file versions live in a manager process shared by
+        # all server processes.
+        with SharedStateManager() as manager:
+            message_history = manager.MessageHistory()
+            subscribed_clients = manager.dict()
+            subscription_lock = manager.Lock()
+            leases = manager.dict()
+            lease_lock = manager.Lock()
+            version_records = manager.dict()
+            version_lock = manager.Lock()
+            server_processes = []
+            for _ in range(args.processes):
+                server_file_system = ServerFileSystem(
+                    server_root_directory=server_root_directory,
+                    subscribed_clients=subscribed_clients,
+                    subscription_lock=subscription_lock,
+                    file_content_cache=create_file_content_cache(args),
+                    mapped_file_cache=create_mapped_file_cache(args),
+                    file_metadata_table=FileMetadataTable(
+                        refresh_interval_in_seconds=args.metadata_refresh_seconds,
+                        version_records=version_records,
+                        version_lock=version_lock,
+                    ),
+                    leases=leases,
+                    lease_lock=lease_lock,
+                )
+                server = Server(
+                    server_ip_address=SERVER_IP_ADDRESS,
+                    server_port_number=SERVER_PORT_NUMBER,
+                    file_system=server_file_system,
+                    invocation_semantics=invocation_semantics,
+                    number_of_worker_threads=args.worker_threads,
+                    maximum_number_of_queued_messages=args.worker_queue_length,
+                    message_history=message_history,
+                    reuse_port=True,
+                    maximum_lease_duration_in_seconds=args.lease_seconds,
+                    compression_codec_names=compression_codec_names,
+                    minimum_compressed_size_in_bytes=args.compression_minimum_bytes,
+                )
+                server_process = multiprocessing.Process(target=server.listen_for_messages)
+                server_process.start()
+                server_processes.append(server_process)
+            for server_process in server_processes:
+                server_process.join()
+
+
+def create_file_content_cache(args: argparse.Namespace) -> Optional[FileContentCache]:
+    if args.file_cache_megabytes <= 0:
+        return None
+    return FileContentCache(maximum_size_in_bytes=args.file_cache_megabytes * 1024 * 1024)
+
+
+def create_mapped_file_cache(args: argparse.Namespace) -> Optional[MappedFileCache]:
+    if args.memory_map_megabytes <= 0:
+        return None
+    return MappedFileCache(minimum_file_size_in_bytes=args.memory_map_megabytes * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    main()
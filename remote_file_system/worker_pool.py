@@ -0,0 +1,87 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Set, Tuple
+
+from loguru import logger
+
+MAXIMUM_NUMBER_OF_PENDING_TASKS = 1024
+
+
+class KeyedWorkerPool:
+    """
+    Runs tasks on a shared pool of threads. Tasks with different keys run in parallel. Tasks with the same key start in
+    the order they were submitted, and an exclusive task runs alone: it waits for the tasks before it to finish, and the
+    tasks after it wait for it. Tasks that are not exclusive, such as reads, run in parallel with each other.
+
+    At most `maximum_number_of_pending_tasks` tasks are submitted but not finished at a time, and tasks submitted beyond
+    that are rejected, so that tasks coming in faster than they are run do not pile up without bound.
+    """
+
+    def __init__(
+        self, number_of_worker_threads: int, maximum_number_of_pending_tasks: int = MAXIMUM_NUMBER_OF_PENDING_TASKS
+    ):
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=number_of_worker_threads, thread_name_prefix="server-worker"
+        )
+        self.lock: threading.Lock = threading.Lock()
+        # Notified whenever the last task of a key finishes.
+        self.key_finished: threading.Condition = threading.Condition(self.lock)
+        # Keys with a task running hold the queue of (task, is_exclusive) waiting to start.
+        self.waiting_tasks: Dict[str, Deque[Tuple[Callable[[], None], bool]]] = {}
+        self.numbers_of_running_tasks: Dict[str, int] = {}
+        # Keys with an exclusive task running.
+        self.exclusive_keys: Set[str] = set()
+        self.maximum_number_of_pending_tasks: int = maximum_number_of_pending_tasks
+        self.number_of_pending_tasks: int = 0
+
+    def submit(self, key: str, task: Callable[[], None], is_exclusive: bool = True) -> bool:
+        """
+        Returns whether the task was accepted, which it is not if too many tasks are pending already.
+        """
+        with self.lock:
+            if self.number_of_pending_tasks >= self.maximum_number_of_pending_tasks:
+                return False
+            self.number_of_pending_tasks += 1
+            self.waiting_tasks.setdefault(key, deque()).append((task, is_exclusive))
+            self._start_waiting_tasks(key)
+            return True
+
+    def shutdown(self) -> None:
+        # Finishing tasks start the tasks waiting behind them, so the executor is only shut down once none are left.
+        with self.key_finished:
+            self.key_finished.wait_for(lambda: not self.waiting_tasks)
+        self.executor.shutdown(wait=True)
+
+    def _start_waiting_tasks(self, key: str) -> None:
+        """
+        Must be called with the lock held.
+        """
+        waiting_tasks: Deque[Tuple[Callable[[], None], bool]] = self.waiting_tasks[key]
+        number_of_running_tasks: int = self.numbers_of_running_tasks.get(key, 0)
+        while waiting_tasks and key not in self.exclusive_keys:
+            task, is_exclusive = waiting_tasks[0]
+            if is_exclusive and number_of_running_tasks > 0:
+                break
+            waiting_tasks.popleft()
+            number_of_running_tasks += 1
+            if is_exclusive:
+                self.exclusive_keys.add(key)
+            self.executor.submit(self._run_task, key, task)
+        if number_of_running_tasks > 0:
+            self.numbers_of_running_tasks[key] = number_of_running_tasks
+        elif not waiting_tasks:
+            del self.waiting_tasks[key]
+            self.numbers_of_running_tasks.pop(key, None)
+            self.key_finished.notify_all()
+
+    def _run_task(self, key: str, task: Callable[[], None]) -> None:
+        try:
+            task()
+        except Exception as e:
+            logger.exception(f"Error: {e} occurred while processing a message for {key}.")
+        with self.lock:
+            self.number_of_pending_tasks -= 1
+            self.numbers_of_running_tasks[key] -= 1
+            self.exclusive_keys.discard(key)
+            self._start_waiting_tasks(key)
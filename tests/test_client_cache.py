@@ -0,0 +1,299 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from remote_file_system.client_cache import Cache
+
+
+class TestCache:
+    @pytest.fixture()
+    def cache(self, tmp_path: Path) -> Cache:
+        return Cache(cache_working_directory=tmp_path, block_size_in_bytes=4)
+
+    @staticmethod
+    def test_put_range_in_cache_tracks_resident_blocks(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_range_in_cache(
+            file_path, offset=4, file_content=b"EFGH", file_size=10, validation_timestamp=1, version=1
+        )
+
+        assert cache.get_missing_ranges(file_path, offset=0, number_of_bytes=10) == [(0, 4), (8, 4)]
+        assert cache.get_file_content(file_path, offset=5, number_of_bytes=2) == b"FG"
+
+    @staticmethod
+    def test_resident_ranges_are_clipped_to_the_requested_range(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_range_in_cache(
+            file_path, offset=0, file_content=b"ABCDEFGH", file_size=14, validation_timestamp=1, version=1
+        )
+        cache.put_range_in_cache(
+            file_path, offset=12, file_content=b"MN", file_size=14, validation_timestamp=1, version=1
+        )
+
+        assert cache.get_resident_ranges(file_path, offset=0, number_of_bytes=14) == [(0, 8), (12, 2)]
+        assert cache.get_resident_ranges(file_path, offset=2, number_of_bytes=11) == [(2, 6), (12, 1)]
+
+    @staticmethod
+    def test_put_range_in_cache_discards_blocks_of_older_version(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_range_in_cache(
+            file_path, offset=0, file_content=b"ABCD", file_size=8, validation_timestamp=1, version=1
+        )
+        cache.put_range_in_cache(
+            file_path, offset=4, file_content=b"efgh", file_size=8, validation_timestamp=2, version=2
+        )
+
+        assert cache.get_missing_ranges(file_path, offset=0, number_of_bytes=8) == [(0, 4)]
+
+    @staticmethod
+    def test_content_of_older_version_does_not_replace_cached_copy(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEFGH", validation_timestamp=2, version=2)
+
+        assert not cache.put_in_cache(file_path, file_content=b"abcd", validation_timestamp=3, version=1)
+        assert not cache.put_range_in_cache(
+            file_path, offset=4, file_content=b"efgh", file_size=8, validation_timestamp=3, version=1
+        )
+        assert cache.get_version(file_path) == 2
+        assert cache.get_file_content(file_path, offset=0, number_of_bytes=8) == b"ABCDEFGH"
+
+    @staticmethod
+    def test_update_cache_after_append_keeps_last_block_resident(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEF", validation_timestamp=1, version=1)
+        cache.update_cache_after_append(file_path, file_content=b"GHIJ")
+
+        assert cache.get_missing_ranges(file_path, offset=0, number_of_bytes=10) == []
+        assert cache.get_file_content(file_path) == b"ABCDEFGHIJ"
+
+    @staticmethod
+    def test_index_is_loaded_by_a_new_cache(cache: Cache) -> None:
+        cache.put_range_in_cache(
+            Path("file.txt"), offset=4, file_content=b"EFGH", file_size=10, validation_timestamp=1, version=2**40
+        )
+        cache.put_in_cache(Path("directory/removed.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.remove_from_cache(Path("directory/removed.txt"))
+        cache.validate_cache_for(Path("file.txt"))
+
+        reloaded_cache = Cache(cache_working_directory=cache.cache_working_directory, block_size_in_bytes=4)
+
+        assert reloaded_cache.get_file_paths() == [Path("file.txt")]
+        assert reloaded_cache.get_version(Path("file.txt")) == 2**40
+        assert reloaded_cache.get_validation_timestamp(Path("file.txt")) == cache.get_validation_timestamp(
+            Path("file.txt")
+        )
+        assert reloaded_cache.get_missing_ranges(Path("file.txt"), offset=0, number_of_bytes=10) == [(0, 4), (8, 4)]
+        assert reloaded_cache.get_file_content(Path("file.txt"), offset=4, number_of_bytes=4) == b"EFGH"
+
+    @staticmethod
+    def test_changed_block_of_cached_copy_is_dropped_once_looked_up(cache: Cache) -> None:
+        cache.put_in_cache(Path("changed.txt"), file_content=b"ABCDEFGH", validation_timestamp=1, version=1)
+        cache.put_in_cache(Path("unchanged.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        (cache.cache_working_directory / "changed.txt").write_bytes(b"ABCDEFGX")
+
+        reloaded_cache = Cache(cache_working_directory=cache.cache_working_directory, block_size_in_bytes=4)
+
+        assert reloaded_cache.get_file_paths() == [Path("changed.txt"), Path("unchanged.txt")]
+        assert reloaded_cache.get_missing_ranges(Path("changed.txt"), offset=0, number_of_bytes=8) == [(4, 4)]
+        assert reloaded_cache.get_missing_ranges(Path("unchanged.txt"), offset=0, number_of_bytes=4) == []
+        assert reloaded_cache.get_statistics()["size_in_bytes"] == 8
+
+    @staticmethod
+    def test_index_records_hold_the_checksums_of_the_changed_blocks(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEFGHIJ", validation_timestamp=1, version=1)
+        cache.update_cache_after_write(file_path, offset=5, file_content=b"fg")
+
+        index_record = json.loads(cache.index_file_path.read_text().splitlines()[-1])
+        assert [block_number for block_number, _ in index_record["block_checksums"]] == [1]
+
+        reloaded_cache = Cache(cache_working_directory=cache.cache_working_directory, block_size_in_bytes=4)
+        assert reloaded_cache.get_missing_ranges(file_path, offset=0, number_of_bytes=10) == []
+        assert reloaded_cache.get_file_content(file_path) == b"ABCDEfgHIJ"
+
+    @staticmethod
+    def test_damaged_index_record_is_skipped(cache: Cache) -> None:
+        cache.put_in_cache(Path("file.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        with open(cache.index_file_path, "a") as index_file:
+            index_file.write('{"path":"file.txt","vers')
+
+        reloaded_cache = Cache(cache_working_directory=cache.cache_working_directory, block_size_in_bytes=4)
+
+        assert reloaded_cache.get_file_paths() == [Path("file.txt")]
+        assert len(reloaded_cache.index_file_path.read_text().splitlines()) == 1
+
+    @staticmethod
+    def test_index_is_compacted_once_it_grows(cache: Cache) -> None:
+        cache.put_in_cache(Path("file.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        for _ in range(Cache.MINIMUM_NUMBER_OF_INDEX_RECORDS_BEFORE_COMPACTION):
+            cache.validate_cache_for(Path("file.txt"))
+
+        assert len(cache.index_file_path.read_text().splitlines()) < 2
+
+    @staticmethod
+    def test_least_recently_used_entry_is_evicted_once_over_capacity(tmp_path: Path) -> None:
+        cache = Cache(cache_working_directory=tmp_path, block_size_in_bytes=4, maximum_size_in_bytes=10)
+        cache.put_in_cache(Path("first.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.put_in_cache(Path("second.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.put_in_cache(Path("third.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+
+        assert cache.get_file_paths() == [Path("second.txt"), Path("third.txt")]
+        assert cache.get_statistics()["size_in_bytes"] == 8
+        assert not (tmp_path / "first.txt").exists()
+
+    @staticmethod
+    def test_files_read_repeatedly_survive_a_scan(tmp_path: Path) -> None:
+        cache = Cache(cache_working_directory=tmp_path, block_size_in_bytes=4, maximum_number_of_files=4)
+        cache.put_in_cache(Path("hot.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.get_file_content(Path("hot.txt"))
+        cache.get_file_content(Path("hot.txt"))
+
+        for file_number in range(10):
+            cache.put_in_cache(Path(f"scan_{file_number}.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+            cache.get_file_content(Path(f"scan_{file_number}.txt"))
+
+        assert cache.is_in_cache(Path("hot.txt"))
+        assert cache.get_statistics()["number_of_evictions"] == 7
+
+    @staticmethod
+    def test_pinned_files_are_not_evicted(tmp_path: Path) -> None:
+        cache = Cache(
+            cache_working_directory=tmp_path,
+            block_size_in_bytes=4,
+            maximum_number_of_files=1,
+            pinned_file_paths=[Path("pinned.txt")],
+        )
+        cache.put_in_cache(Path("pinned.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.put_in_cache(Path("first.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.put_in_cache(Path("second.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+
+        assert cache.get_file_paths() == [Path("pinned.txt"), Path("second.txt")]
+
+        cache.unpin(Path("pinned.txt"))
+
+        assert cache.get_file_paths() == [Path("second.txt")]
+
+    @staticmethod
+    def test_capacity_is_applied_to_the_loaded_index(cache: Cache) -> None:
+        cache.put_in_cache(Path("older.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.put_in_cache(Path("newer.txt"), file_content=b"ABCD", validation_timestamp=2, version=1)
+
+        reloaded_cache = Cache(
+            cache_working_directory=cache.cache_working_directory, block_size_in_bytes=4, maximum_number_of_files=1
+        )
+
+        assert reloaded_cache.get_file_paths() == [Path("newer.txt")]
+
+    @staticmethod
+    def test_repeated_reads_are_served_from_memory(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEFGHIJ", validation_timestamp=1, version=1)
+        assert cache.get_file_content(file_path, offset=2, number_of_bytes=3) == b"CDE"
+        (cache.cache_working_directory / "file.txt").write_bytes(b"outdated!!")
+
+        assert cache.get_file_content(file_path, offset=6, number_of_bytes=4) == b"GHIJ"
+        assert cache.get_file_content(file_path) == b"ABCDEFGHIJ"
+        assert cache.get_statistics()["number_of_memory_hits"] == 2
+
+    @staticmethod
+    def test_copy_in_memory_is_dropped_when_the_cached_copy_changes(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEF", validation_timestamp=1, version=1)
+        cache.get_file_content(file_path)
+        cache.update_cache_after_write(file_path, offset=2, file_content=b"cd")
+        cache.update_cache_after_append(file_path, file_content=b"GH")
+
+        assert cache.get_file_content(file_path) == b"ABcdEFGH"
+
+    @staticmethod
+    def test_least_recently_read_files_are_dropped_from_memory(tmp_path: Path) -> None:
+        cache = Cache(
+            cache_working_directory=tmp_path,
+            block_size_in_bytes=4,
+            maximum_memory_size_in_bytes=9,
+            maximum_memory_file_size_in_bytes=6,
+        )
+        for file_name, file_content in [("first.txt", b"ABCD"), ("second.txt", b"ABCDEF"), ("large.txt", b"A" * 8)]:
+            cache.put_in_cache(Path(file_name), file_content=file_content, validation_timestamp=1, version=1)
+        cache.get_file_content(Path("first.txt"))
+        cache.get_file_content(Path("second.txt"))
+        cache.get_file_content(Path("large.txt"))
+        cache.get_file_content(Path("first.txt"))
+
+        assert list(cache.file_contents_in_memory) == [Path("first.txt")]
+        assert cache.memory_size_in_bytes == 4
+
+    @staticmethod
+    def test_ranges_of_large_files_are_read_through_a_memory_map(tmp_path: Path) -> None:
+        cache = Cache(
+            cache_working_directory=tmp_path,
+            block_size_in_bytes=4,
+            maximum_memory_file_size_in_bytes=4,
+            maximum_number_of_mapped_files=1,
+        )
+        file_path = Path("large.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEFGHIJ", validation_timestamp=1, version=1)
+        assert cache.get_file_content(file_path, offset=2, number_of_bytes=3) == b"CDE"
+        assert cache.get_file_content(file_path, offset=7, number_of_bytes=3) == b"HIJ"
+        assert list(cache.mapped_files) == [file_path]
+
+        cache.update_cache_after_append(file_path, file_content=b"KL")
+        assert cache.mapped_files == {}
+        assert cache.get_file_content(file_path, offset=8, number_of_bytes=4) == b"IJKL"
+
+        cache.put_in_cache(Path("other.txt"), file_content=b"ABCDEFGH", validation_timestamp=1, version=1)
+        cache.get_file_content(Path("other.txt"))
+        assert list(cache.mapped_files) == [Path("other.txt")]
+        assert cache.get_statistics()["number_of_memory_hits"] == 1
+
+    @staticmethod
+    def test_overlapping_and_adjacent_writes_to_cache_are_merged(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_in_cache(file_path, file_content=b"ABCDEFGHIJKLMNOP", validation_timestamp=1, version=1)
+        cache.write_to_cache(file_path, offset=1, file_content=b"bc")
+        cache.write_to_cache(file_path, offset=10, file_content=b"kl")
+        cache.write_to_cache(file_path, offset=3, file_content=b"de")
+        cache.write_to_cache(file_path, offset=2, file_content=b"C")
+        cache.write_to_cache(file_path, offset=16, file_content=b"QR")
+
+        assert cache.get_dirty_writes(file_path) == [(1, b"bCde"), (10, b"kl"), (16, b"QR")]
+        assert cache.get_dirty_size() == 8
+
+        cache.mark_as_flushed(file_path, offset=1, number_of_bytes=4, version=2)
+
+        assert cache.get_dirty_writes(file_path) == [(10, b"kl"), (16, b"QR")]
+        assert cache.get_version(file_path) == 2
+
+    @staticmethod
+    def test_nearby_dirty_ranges_are_written_together(cache: Cache) -> None:
+        file_path = Path("file.txt")
+        cache.put_range_in_cache(
+            file_path, offset=0, file_content=b"ABCDEFGH", file_size=20, validation_timestamp=1, version=1
+        )
+        cache.put_range_in_cache(
+            file_path, offset=16, file_content=b"QRST", file_size=20, validation_timestamp=1, version=1
+        )
+        cache.write_to_cache(file_path, offset=1, file_content=b"b")
+        cache.write_to_cache(file_path, offset=4, file_content=b"e")
+        cache.write_to_cache(file_path, offset=17, file_content=b"r")
+
+        # The blocks between the second and third write are not cached.
+        assert cache.get_dirty_writes(file_path, maximum_gap_in_bytes=4) == [(1, b"bCDe"), (17, b"r")]
+
+        cache.mark_as_flushed(file_path, offset=1, number_of_bytes=4, version=2)
+
+        assert cache.get_dirty_writes(file_path) == [(17, b"r")]
+
+    @staticmethod
+    def test_dirty_ranges_are_loaded_by_a_new_cache_and_not_evicted(cache: Cache) -> None:
+        cache.put_in_cache(Path("dirty.txt"), file_content=b"ABCD", validation_timestamp=1, version=1)
+        cache.write_to_cache(Path("dirty.txt"), offset=4, file_content=b"EF")
+        cache.put_in_cache(Path("clean.txt"), file_content=b"ABCD", validation_timestamp=2, version=1)
+
+        reloaded_cache = Cache(
+            cache_working_directory=cache.cache_working_directory, block_size_in_bytes=4, maximum_number_of_files=1
+        )
+
+        assert reloaded_cache.get_file_paths() == [Path("dirty.txt")]
+        assert reloaded_cache.get_dirty_writes(Path("dirty.txt")) == [(4, b"EF")]
@@ -1,4 +1,5 @@
 import multiprocessing
+import time
 from ipaddress import IPv4Address
 from pathlib import Path
 from typing import Generator
@@ -6,7 +7,9 @@ from typing import Generator
 import pytest
 
 from remote_file_system.client_interface import Client
+from remote_file_system.pipelined_client import PipelinedClient
 from remote_file_system.server import Server
+from remote_file_system.server_file_metadata import DEFAULT_REFRESH_INTERVAL_IN_SECONDS
 from remote_file_system.server_file_system import ServerFileSystem
 
 
@@ -26,6 +29,7 @@ class TestClientServer:
             server_ip_address=self.SERVER_IP_ADDRESS,
             server_port_number=self.SERVER_PORT_NUMBER,
             file_system=server_file_system,
+            maximum_lease_duration_in_seconds=10,
         )
         server_process = multiprocessing.Process(target=server.listen_for_messages)
         server_process.start()
@@ -58,3 +62,236 @@ class TestClientServer:
         )
 
         assert client.write_file(file_path=Path("digits.txt"), offset=1, content=b"1234567890")
+
+    def test_read_file_larger_than_a_datagram(self) -> None:
+        CLIENT_PORT_NUMBER = 9999
+        client = Client(
+            client_port_number=CLIENT_PORT_NUMBER,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_3_cache"),
+            freshness_interval_in_seconds=5,
+        )
+        large_file_content: bytes = bytes(range(256)) * 4096
+        large_file_path: Path = Path.cwd() / "tests" / "server" / "large_file.bin"
+        large_file_path.write_bytes(large_file_content)
+
+        try:
+            actual = client.read_file(
+                file_path=Path("large_file.bin"), offset=0, number_of_bytes=len(large_file_content)
+            )
+        finally:
+            large_file_path.unlink()
+
+        assert actual == large_file_content
+
+    def test_read_file_revalidates_outdated_cache_entry(self) -> None:
+        CLIENT_PORT_NUMBER = 9999
+        client = Client(
+            client_port_number=CLIENT_PORT_NUMBER,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_4_cache"),
+            freshness_interval_in_seconds=0,
+        )
+
+        first_read = client.read_file(file_path=Path("english_alphabets.txt"), offset=4, number_of_bytes=4)
+        version: int = client.cache.get_version(Path("english_alphabets.txt"))
+        second_read = client.read_file(file_path=Path("english_alphabets.txt"), offset=4, number_of_bytes=4)
+
+        assert first_read == second_read == b"EFGH"
+        assert client.cache.get_version(Path("english_alphabets.txt")) == version
+
+    def test_validate_cache_keeps_unchanged_entries(self) -> None:
+        CLIENT_PORT_NUMBER = 9999
+        client = Client(
+            client_port_number=CLIENT_PORT_NUMBER,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_5_cache"),
+            freshness_interval_in_seconds=0,
+        )
+        client.read_file(file_path=Path("english_alphabets.txt"), offset=0, number_of_bytes=4)
+        client.cache.put_in_cache(
+            file_path=Path("missing_file.txt"), file_content=b"outdated", validation_timestamp=0, version=1
+        )
+
+        assert client.validate_cache() == [Path("missing_file.txt")]
+        assert client.cache.is_in_cache(Path("english_alphabets.txt"))
+
+    def test_write_revokes_lease_of_other_client(self) -> None:
+        reading_client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_6_cache"),
+            freshness_interval_in_seconds=60,
+            lease_duration_in_seconds=10,
+        )
+        writing_client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_7_cache"),
+            freshness_interval_in_seconds=0,
+        )
+        file_path: Path = Path.cwd() / "tests" / "server" / "lease_file.txt"
+        file_path.write_bytes(b"ABCD")
+
+        try:
+            first_read = reading_client.read_file(file_path=Path("lease_file.txt"), offset=0, number_of_bytes=4)
+            assert writing_client.write_file(file_path=Path("lease_file.txt"), offset=0, content=b"WXYZ")
+            time.sleep(0.1)
+            second_read = reading_client.read_file(file_path=Path("lease_file.txt"), offset=0, number_of_bytes=4)
+        finally:
+            reading_client.close()
+            writing_client.close()
+            file_path.unlink()
+
+        assert first_read == b"ABCD"
+        assert second_read == b"WXYZ"
+
+    def test_write_back_client_flushes_writes_and_detects_conflicts(self) -> None:
+        write_back_client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_8_cache"),
+            freshness_interval_in_seconds=60,
+            write_back_delay_in_seconds=60,
+        )
+        other_client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_9_cache"),
+            freshness_interval_in_seconds=0,
+        )
+        file_path: Path = Path.cwd() / "tests" / "server" / "write_back_file.txt"
+        file_path.write_bytes(b"ABCD")
+
+        try:
+            write_back_client.read_file(file_path=Path("write_back_file.txt"), offset=0, number_of_bytes=4)
+            write_back_client.write_file(file_path=Path("write_back_file.txt"), offset=1, content=b"bc")
+            write_back_client.append_file(file_path=Path("write_back_file.txt"), content=b"EF")
+            content_before_flush: bytes = file_path.read_bytes()
+            first_write_conflicts = write_back_client.flush()
+            content_after_flush: bytes = file_path.read_bytes()
+
+            assert other_client.write_file(file_path=Path("write_back_file.txt"), offset=0, content=b"X")
+            write_back_client.write_file(file_path=Path("write_back_file.txt"), offset=0, content=b"Y")
+            second_write_conflicts = write_back_client.flush()
+        finally:
+            write_back_client.close()
+            other_client.close()
+            file_path.unlink()
+
+        assert content_before_flush == b"ABCD"
+        assert first_write_conflicts == []
+        assert content_after_flush == b"AbcDEF"
+        assert [write_conflict.unflushed_writes for write_conflict in second_write_conflicts] == [[(0, b"Y")]]
+
+    def test_compressing_client_reads_and_writes_files(self) -> None:
+        client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_10_cache"),
+            freshness_interval_in_seconds=5,
+            compression_codec_names=["lzma", "zlib"],
+        )
+        file_content: bytes = b"".join(f"{line_number}: log line\n".encode("utf-8") for line_number in range(10000))
+        file_path: Path = Path.cwd() / "tests" / "server" / "compressed_file.txt"
+        file_path.write_bytes(file_content)
+
+        try:
+            read_content = client.read_file(
+                file_path=Path("compressed_file.txt"), offset=0, number_of_bytes=len(file_content)
+            )
+            assert client.write_file(file_path=Path("compressed_file.txt"), offset=0, content=file_content[::-1])
+            written_content: bytes = file_path.read_bytes()
+            assert client.endpoint.compression_codec_ids
+        finally:
+            client.close()
+            file_path.unlink()
+
+        assert read_content == file_content
+        assert written_content == file_content[::-1]
+
+    def test_changed_file_is_refreshed_with_delta(self) -> None:
+        client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_11_cache"),
+            freshness_interval_in_seconds=0,
+        )
+        file_content: bytes = b"".join(f"{line_number:08}: log line\n".encode("utf-8") for line_number in range(10000))
+        changed_file_content: bytes = b"changed" + file_content[7:] + b"appended"
+        file_path: Path = Path.cwd() / "tests" / "server" / "delta_file.txt"
+        file_path.write_bytes(file_content)
+
+        try:
+            first_read = client.read_file(file_path=Path("delta_file.txt"), offset=0, number_of_bytes=len(file_content))
+            file_path.write_bytes(changed_file_content)
+            # The server notices the change made outside of it once its metadata of the file is refreshed.
+            time.sleep(DEFAULT_REFRESH_INTERVAL_IN_SECONDS)
+            second_read = client.read_file(
+                file_path=Path("delta_file.txt"), offset=0, number_of_bytes=len(changed_file_content)
+            )
+        finally:
+            client.close()
+            file_path.unlink()
+
+        assert first_read == file_content
+        assert second_read == changed_file_content
+
+    def test_rewritten_file_is_refreshed_without_delta(self) -> None:
+        client = Client(
+            client_port_number=9999,
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            cache_working_directory=Path("tests/client_12_cache"),
+            freshness_interval_in_seconds=0,
+        )
+        file_content: bytes = bytes(i % 251 for i in range(1024 * 1024))
+        rewritten_file_content: bytes = bytes(i % 13 for i in range(len(file_content)))
+        file_path: Path = Path.cwd() / "tests" / "server" / "rewritten_file.txt"
+        file_path.write_bytes(file_content)
+
+        try:
+            first_read = client.read_file(
+                file_path=Path("rewritten_file.txt"), offset=0, number_of_bytes=len(file_content)
+            )
+            file_path.write_bytes(rewritten_file_content)
+            time.sleep(DEFAULT_REFRESH_INTERVAL_IN_SECONDS)
+            second_read = client.read_file(
+                file_path=Path("rewritten_file.txt"), offset=0, number_of_bytes=len(rewritten_file_content)
+            )
+        finally:
+            client.close()
+            file_path.unlink()
+
+        assert first_read == file_content
+        assert second_read == rewritten_file_content
+
+    def test_pipelined_client_keeps_many_requests_in_flight(self) -> None:
+        client = PipelinedClient(
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            maximum_number_of_requests_in_flight=16,
+        )
+
+        try:
+            read_futures = [
+                client.read_file(file_path=Path("english_alphabets.txt"), offset=offset, number_of_bytes=1)
+                for offset in range(26)
+            ]
+            modification_timestamp_future = client.get_modification_timestamp(file_path=Path("english_alphabets.txt"))
+            missing_file_future = client.read_file(file_path=Path("missing.txt"), offset=0, number_of_bytes=1)
+
+            assert b"".join(future.result(timeout=10) for future in read_futures) == b"ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+            assert modification_timestamp_future.result(timeout=10) > 0
+            assert missing_file_future.result(timeout=10) is None
+        finally:
+            client.close()
@@ -0,0 +1,262 @@
+import time
+from uuid import uuid4
+
+from remote_file_system.communications import Endpoint, PipelinedEndpoint
+from remote_file_system.message import (
+    CompressedMessage,
+    Message,
+    MessageFragment,
+    LeaseRevocationNotification,
+    ReadFileRequest,
+    ReadFileResponse,
+    UpdateNotification,
+)
+
+
+class TestEndpoint:
+    @staticmethod
+    def test_late_reply_to_earlier_request_is_dropped() -> None:
+        client_endpoint = Endpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        try:
+            earlier_request_id = uuid4()
+            request = ReadFileRequest(request_id=uuid4(), filename="file.txt")
+            late_reply = ReadFileResponse(
+                reply_id=earlier_request_id, content=b"late", modification_timestamp=1, version=1
+            )
+            reply = ReadFileResponse(reply_id=request.request_id, content=b"ABCD", modification_timestamp=2, version=2)
+            # Both replies are queued on the client socket before the request is sent.
+            server_endpoint.send_message(late_reply, client_endpoint.get_address())
+            server_endpoint.send_message(reply, client_endpoint.get_address())
+
+            actual = client_endpoint.send_message_and_wait_for_reply(
+                request, server_endpoint.get_address(), max_attempts_to_send_message=1, timeout_in_seconds=1
+            )
+
+            assert actual == reply
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_endpoint_is_reused_across_requests() -> None:
+        client_endpoint = Endpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        server_endpoint.settimeout(1)
+        try:
+            client_address = client_endpoint.get_address()
+            for content in (b"first", b"second"):
+                reply = ReadFileResponse(reply_id=uuid4(), content=content, modification_timestamp=1, version=1)
+                client_endpoint.send_message(reply, server_endpoint.get_address())
+                received, sender_address = server_endpoint.receive_message()
+                assert received == reply
+                assert sender_address == client_address
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_messages_that_are_not_the_reply_go_to_the_unsolicited_message_handler() -> None:
+        client_endpoint = Endpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        unsolicited_messages = []
+        client_endpoint.unsolicited_message_handler = unsolicited_messages.append
+        try:
+            request = ReadFileRequest(request_id=uuid4(), filename="file.txt")
+            notification = LeaseRevocationNotification(file_name="file.txt")
+            reply = ReadFileResponse(reply_id=request.request_id, content=b"ABCD", modification_timestamp=1, version=1)
+            server_endpoint.send_message(notification, client_endpoint.get_address())
+            server_endpoint.send_message(reply, client_endpoint.get_address())
+
+            actual = client_endpoint.send_message_and_wait_for_reply(
+                request, server_endpoint.get_address(), max_attempts_to_send_message=1, timeout_in_seconds=1
+            )
+
+            assert actual == reply
+            assert unsolicited_messages == [notification]
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_receive_pending_messages_does_not_wait() -> None:
+        client_endpoint = Endpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        try:
+            assert client_endpoint.receive_pending_messages() == []
+
+            notifications = [LeaseRevocationNotification(file_name=f"file_{i}.txt") for i in range(3)]
+            for notification in notifications:
+                server_endpoint.send_message(notification, client_endpoint.get_address())
+            time.sleep(0.1)
+
+            assert client_endpoint.receive_pending_messages() == notifications
+            assert client_endpoint.receive_pending_messages() == []
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_messages_are_compressed_for_peers_with_a_codec() -> None:
+        server_endpoint = Endpoint("127.0.0.1")
+        compressing_endpoint = Endpoint("127.0.0.1")
+        uncompressing_endpoint = Endpoint("127.0.0.1")
+        server_endpoint.set_compression_codec(compressing_endpoint.get_address(), 1)
+        compressing_endpoint.settimeout(1)
+        uncompressing_endpoint.settimeout(1)
+        try:
+            notification = UpdateNotification(
+                file_name="file.txt", content=b"log line\n" * 10000, modification_timestamp=1, version=1
+            )
+            server_endpoint.send_message_to_recipients(
+                notification, [compressing_endpoint.get_address(), uncompressing_endpoint.get_address()]
+            )
+            compressed_datagram, _ = compressing_endpoint.sock.recvfrom(65535)
+            uncompressed_datagram, _ = uncompressing_endpoint.sock.recvfrom(65535)
+
+            # The compressed notification fits in a single datagram, while the uncompressed one is fragmented.
+            assert isinstance(Message.unmarshall(compressed_datagram), CompressedMessage)
+            assert isinstance(Message.unmarshall(uncompressed_datagram), MessageFragment)
+
+            server_endpoint.send_message(notification, compressing_endpoint.get_address())
+            received, _ = compressing_endpoint.receive_message()
+            assert received == notification
+        finally:
+            server_endpoint.close()
+            compressing_endpoint.close()
+            uncompressing_endpoint.close()
+
+    @staticmethod
+    def test_least_recently_sent_to_compressing_peer_is_forgotten() -> None:
+        endpoint = Endpoint("127.0.0.1", maximum_number_of_compressing_peers=2)
+        try:
+            endpoint.set_compression_codec(("127.0.0.1", 1), 1)
+            endpoint.set_compression_codec(("127.0.0.1", 2), 1)
+            endpoint.send_message_to_recipients(
+                UpdateNotification(file_name="file.txt", content=b"", modification_timestamp=1, version=1),
+                [("127.0.0.1", 1)],
+            )
+            endpoint.set_compression_codec(("127.0.0.1", 3), 1)
+
+            assert list(endpoint.compression_codec_ids) == [("127.0.0.1", 1), ("127.0.0.1", 3)]
+        finally:
+            endpoint.close()
+
+
+class TestPipelinedEndpoint:
+    @staticmethod
+    def test_replies_are_matched_to_requests_in_flight() -> None:
+        client_endpoint = PipelinedEndpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        server_endpoint.settimeout(1)
+        try:
+            requests = [ReadFileRequest(request_id=uuid4(), filename=f"file_{i}.txt") for i in range(3)]
+            futures = [
+                client_endpoint.send_message_and_get_future(
+                    request, server_endpoint.get_address(), max_attempts_to_send_message=1, timeout_in_seconds=5
+                )
+                for request in requests
+            ]
+            received_requests = [server_endpoint.receive_message()[0] for _ in requests]
+            assert received_requests == requests
+
+            # Reply in reverse order to show that replies need not arrive in the order the requests were sent.
+            for request in reversed(requests):
+                reply = ReadFileResponse(
+                    reply_id=request.request_id, content=request.file_name.encode(), modification_timestamp=1, version=1
+                )
+                server_endpoint.send_message(reply, client_endpoint.get_address())
+
+            assert [future.result(timeout=5).content for future in futures] == [
+                request.file_name.encode() for request in requests
+            ]
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_unanswered_request_resolves_to_none_after_retransmissions() -> None:
+        client_endpoint = PipelinedEndpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        server_endpoint.settimeout(1)
+        try:
+            request = ReadFileRequest(request_id=uuid4(), filename="file.txt")
+            future = client_endpoint.send_message_and_get_future(
+                request, server_endpoint.get_address(), max_attempts_to_send_message=2, timeout_in_seconds=0.2
+            )
+
+            assert future.result(timeout=5) is None
+            assert [server_endpoint.receive_message()[0] for _ in range(2)] == [request, request]
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_malformed_datagrams_do_not_stop_the_receiving_of_replies() -> None:
+        client_endpoint = PipelinedEndpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        server_endpoint.settimeout(1)
+        try:
+            request = ReadFileRequest(request_id=uuid4(), filename="file.txt")
+            future = client_endpoint.send_message_and_get_future(
+                request, server_endpoint.get_address(), max_attempts_to_send_message=1, timeout_in_seconds=5
+            )
+            server_endpoint.receive_message()
+            reply = ReadFileResponse(
+                reply_id=request.request_id, content=b"content", modification_timestamp=1, version=1
+            )
+            server_endpoint.sock.sendto(reply.marshall()[:10], client_endpoint.get_address())
+            server_endpoint.sock.sendto(b"\xff\xff\xff\xff", client_endpoint.get_address())
+            server_endpoint.send_message(reply, client_endpoint.get_address())
+
+            assert future.result(timeout=5) == reply
+            assert client_endpoint.receiver_thread.is_alive()
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_requests_resolve_to_none_once_replies_are_no_longer_received() -> None:
+        client_endpoint = PipelinedEndpoint("127.0.0.1")
+        server_endpoint = Endpoint("127.0.0.1")
+        try:
+            future = client_endpoint.send_message_and_get_future(
+                ReadFileRequest(request_id=uuid4(), filename="file.txt"),
+                server_endpoint.get_address(),
+                max_attempts_to_send_message=1,
+                timeout_in_seconds=5,
+            )
+
+            def fail() -> None:
+                raise RuntimeError("Simulated failure of the receiver thread.")
+
+            client_endpoint._retransmit_overdue_requests = fail
+            client_endpoint.receiver_thread.join(timeout=5)
+
+            assert future.result(timeout=5) is None
+            later_future = client_endpoint.send_message_and_get_future(
+                ReadFileRequest(request_id=uuid4(), filename="file.txt"),
+                server_endpoint.get_address(),
+                max_attempts_to_send_message=1,
+                timeout_in_seconds=5,
+            )
+            assert later_future.result(timeout=5) is None
+        finally:
+            client_endpoint.close()
+            server_endpoint.close()
+
+    @staticmethod
+    def test_recipients_after_one_that_cannot_be_sent_to_still_get_the_message() -> None:
+        sender_endpoint = Endpoint("127.0.0.1")
+        recipient_endpoint = Endpoint("127.0.0.1")
+        recipient_endpoint.settimeout(1)
+        try:
+            notification = LeaseRevocationNotification(file_name="file.txt")
+            sender_endpoint.send_message_to_recipients(
+                notification, [("255.255.255.255", 12345), recipient_endpoint.get_address()]
+            )
+
+            assert recipient_endpoint.receive_message()[0] == notification
+        finally:
+            sender_endpoint.close()
+            recipient_endpoint.close()
@@ -0,0 +1,75 @@
+from uuid import uuid4
+
+import pytest
+
+from remote_file_system.compression import (
+    choose_codec_id,
+    compress_message,
+    decompress_message,
+    get_codec_ids,
+    AVAILABLE_CODEC_NAMES,
+)
+from remote_file_system.message import CompressedMessage, Message, ReadFileResponse, WriteFileResponse
+
+
+class TestCompression:
+    @staticmethod
+    def test_compressed_message_is_decompressed() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=b"random content " * 1000, modification_timestamp=123, version=123
+        )
+        for codec_id in get_codec_ids(AVAILABLE_CODEC_NAMES):
+            compressed_message: Message = compress_message(read_file_response, codec_id, 0)
+
+            assert isinstance(compressed_message, CompressedMessage)
+            assert compressed_message.message_id == read_file_response.reply_id
+            assert len(compressed_message.marshall()) < len(read_file_response.marshall())
+            assert decompress_message(Message.unmarshall(compressed_message.marshall())) == read_file_response
+
+    @staticmethod
+    def test_small_incompressible_and_content_free_messages_are_not_compressed() -> None:
+        (codec_id,) = get_codec_ids(["zlib"])
+        small_read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=b"random content", modification_timestamp=123, version=123
+        )
+        incompressible_read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=bytes(range(256)), modification_timestamp=123, version=123
+        )
+        write_file_response: WriteFileResponse = WriteFileResponse(
+            reply_id=uuid4(), is_successful=True, modification_timestamp=123, version=123
+        )
+
+        assert compress_message(small_read_file_response, codec_id, 512) is small_read_file_response
+        assert compress_message(incompressible_read_file_response, codec_id, 0) is incompressible_read_file_response
+        assert compress_message(write_file_response, codec_id, 0) is write_file_response
+
+    @staticmethod
+    def test_first_offered_codec_that_is_supported_is_chosen() -> None:
+        zlib_codec_id, lzma_codec_id = get_codec_ids(["zlib", "lzma"])
+
+        assert choose_codec_id([lzma_codec_id, zlib_codec_id], ["zlib", "lzma"]) == lzma_codec_id
+        assert choose_codec_id([lzma_codec_id, zlib_codec_id], ["zlib"]) == zlib_codec_id
+        assert choose_codec_id([lzma_codec_id], []) == 0
+
+    @staticmethod
+    def test_unavailable_codec_is_rejected() -> None:
+        with pytest.raises(ValueError):
+            get_codec_ids(["brotli"])
+
+    @staticmethod
+    def test_message_decompressing_beyond_the_limit_is_dropped() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=bytes(1024 * 1024), modification_timestamp=123, version=123
+        )
+        for codec_id in get_codec_ids(AVAILABLE_CODEC_NAMES):
+            compressed_message: Message = compress_message(read_file_response, codec_id, 0)
+
+            assert decompress_message(compressed_message, maximum_size_in_bytes=64 * 1024) is None
+            assert decompress_message(compressed_message, maximum_size_in_bytes=2 * 1024 * 1024) == read_file_response
+
+    @staticmethod
+    def test_undecodable_compressed_message_is_dropped() -> None:
+        (codec_id,) = get_codec_ids(["zlib"])
+
+        assert decompress_message(CompressedMessage(uuid4(), codec_id, b"not compressed")) is None
+        assert decompress_message(CompressedMessage(uuid4(), 255, b"not compressed")) is None
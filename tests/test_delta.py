@@ -0,0 +1,61 @@
+import zlib
+
+from remote_file_system.delta import apply_delta, compute_block_hashes, compute_delta, get_block_size
+
+
+class TestDelta:
+    @staticmethod
+    def test_changed_and_moved_blocks_are_found() -> None:
+        block_size_in_bytes: int = 1024
+        cached_content: bytes = b"".join(f"{line_number:08}: log line\n".encode("utf-8") for line_number in range(1000))
+        changed_content: bytes = (
+            cached_content[:5000] + b"changed" + cached_content[5007:10000] + b"inserted" + cached_content[10000:]
+        )
+
+        block_hashes = compute_block_hashes(cached_content, 0, block_size_in_bytes)
+        instructions = compute_delta(changed_content, block_hashes, block_size_in_bytes)
+        number_of_bytes_sent: int = sum(
+            len(instruction) for instruction in instructions if isinstance(instruction, bytes)
+        )
+
+        assert apply_delta(instructions, cached_content, 0, block_size_in_bytes) == changed_content
+        assert number_of_bytes_sent < 3 * block_size_in_bytes
+
+    @staticmethod
+    def test_range_is_rebuilt_from_blocks_at_an_offset() -> None:
+        block_size_in_bytes: int = 1024
+        cached_content: bytes = bytes(i % 251 for i in range(4096))
+
+        block_hashes = compute_block_hashes(cached_content[1024:], 5120, block_size_in_bytes)
+        instructions = compute_delta(cached_content[1024:], block_hashes, block_size_in_bytes)
+
+        assert instructions == [5120, 6144, 7168]
+        assert apply_delta(instructions, cached_content[1024:], 5120, block_size_in_bytes) == cached_content[1024:]
+
+    @staticmethod
+    def test_content_is_sent_whole_without_matching_blocks() -> None:
+        assert compute_delta(b"random content", [], 1024) == [b"random content"]
+        assert compute_delta(b"random content", [(0, zlib.adler32(b"random content"), b"")], 0) == [b"random content"]
+        assert compute_delta(b"", [], 1024) == []
+
+    @staticmethod
+    def test_delta_is_given_up_once_too_few_blocks_match() -> None:
+        block_size_in_bytes: int = 1024
+        cached_content: bytes = bytes(i % 251 for i in range(8192))
+        changed_content: bytes = cached_content[:1024] + bytes(i % 13 for i in range(6144)) + cached_content[7168:]
+        block_hashes = compute_block_hashes(cached_content, 0, block_size_in_bytes)
+
+        assert (
+            compute_delta(changed_content, block_hashes, block_size_in_bytes, maximum_data_size_in_bytes=4096) is None
+        )
+        assert compute_delta(b"random content", [], block_size_in_bytes, maximum_data_size_in_bytes=8) is None
+        instructions = compute_delta(
+            changed_content, block_hashes, block_size_in_bytes, maximum_data_size_in_bytes=6144
+        )
+        assert apply_delta(instructions, cached_content, 0, block_size_in_bytes) == changed_content
+
+    @staticmethod
+    def test_block_size_grows_with_the_square_root_of_the_size() -> None:
+        assert get_block_size(1024) == 1024
+        assert get_block_size(64 * 1024 * 1024) == 8192
+        assert get_block_size(2**40) == 64 * 1024
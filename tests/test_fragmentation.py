@@ -0,0 +1,150 @@
+import tracemalloc
+from uuid import uuid4
+
+from remote_file_system.fragmentation import (
+    FragmentReassembler,
+    SentFragmentHistory,
+    split_into_datagrams,
+    MAXIMUM_DATAGRAM_SIZE_IN_BYTES,
+    MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES,
+    MAXIMUM_NUMBER_OF_FRAGMENTS,
+)
+from remote_file_system.message import Message, MessageFragment, ReadFileResponse
+
+
+class TestFragmentation:
+    @staticmethod
+    def test_small_message_is_not_fragmented() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=b"random content", modification_timestamp=123, version=123
+        )
+        message_id, datagrams = split_into_datagrams(read_file_response)
+        assert message_id == read_file_response.reply_id
+        assert datagrams == [read_file_response.marshall()]
+
+    @staticmethod
+    def test_large_message_is_reassembled() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=bytes(range(256)) * 1000, modification_timestamp=123, version=123
+        )
+        _, datagrams = split_into_datagrams(read_file_response)
+        assert len(datagrams) > 1
+        assert all(len(datagram) <= MAXIMUM_DATAGRAM_SIZE_IN_BYTES for datagram in datagrams)
+
+        fragment_reassembler = FragmentReassembler()
+        results = [fragment_reassembler.add_fragment(Message.unmarshall(datagram)) for datagram in reversed(datagrams)]
+        assert all(result is None for result in results[:-1])
+        assert Message.unmarshall(results[-1]) == read_file_response
+        assert fragment_reassembler.get_incomplete_message_ids() == []
+
+    @staticmethod
+    def test_fragments_hold_the_marshalled_message_in_order() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=bytes(range(256)) * 100, modification_timestamp=123, version=123
+        )
+        message_id, datagrams = split_into_datagrams(read_file_response)
+        fragments = [Message.unmarshall(datagram) for datagram in datagrams]
+
+        assert [fragment.fragment_number for fragment in fragments] == list(range(len(datagrams)))
+        assert all(fragment.message_id == message_id for fragment in fragments)
+        assert b"".join(fragment.content for fragment in fragments) == read_file_response.marshall()
+
+    @staticmethod
+    def test_missing_fragments_are_reported() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(),
+            content=b"x" * (5 * MAXIMUM_DATAGRAM_SIZE_IN_BYTES),
+            modification_timestamp=123,
+            version=123,
+        )
+        message_id, datagrams = split_into_datagrams(read_file_response)
+        fragment_reassembler = FragmentReassembler()
+        for fragment_number, datagram in enumerate(datagrams):
+            if fragment_number not in (1, 3):
+                fragment_reassembler.add_fragment(Message.unmarshall(datagram))
+
+        assert fragment_reassembler.get_missing_fragment_numbers(message_id) == [1, 3]
+
+        sent_fragment_history = SentFragmentHistory()
+        sent_fragment_history.record(message_id, datagrams)
+        retransmitted_datagrams = sent_fragment_history.get_datagrams(message_id, [1, 3])
+        fragment_reassembler.add_fragment(Message.unmarshall(retransmitted_datagrams[0]))
+        marshalled_message = fragment_reassembler.add_fragment(Message.unmarshall(retransmitted_datagrams[1]))
+        assert Message.unmarshall(marshalled_message) == read_file_response
+
+    @staticmethod
+    def test_fragments_of_oversized_messages_are_dropped() -> None:
+        fragment_reassembler = FragmentReassembler()
+        fragment = MessageFragment(uuid4(), 0, MAXIMUM_NUMBER_OF_FRAGMENTS + 1, b"12345678")
+
+        assert fragment_reassembler.add_fragment(fragment) is None
+        assert fragment_reassembler.get_incomplete_message_ids() == []
+
+    @staticmethod
+    def test_fragments_disagreeing_on_the_number_of_fragments_are_dropped() -> None:
+        fragment_reassembler = FragmentReassembler()
+        message_id = uuid4()
+        fragment_reassembler.add_fragment(MessageFragment(message_id, 0, 2, b"12345678"))
+
+        assert fragment_reassembler.add_fragment(MessageFragment(message_id, 1, 3, b"12345678")) is None
+        assert fragment_reassembler.get_missing_fragment_numbers(message_id) == [1]
+
+    @staticmethod
+    def test_forged_fragment_headers_do_not_allocate_whole_messages() -> None:
+        fragment_reassembler = FragmentReassembler(
+            maximum_size_in_bytes=64 * MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES, maximum_number_of_incomplete_messages=100
+        )
+        fragment_content: bytes = b"x" * MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES
+
+        tracemalloc.start()
+        for _ in range(1000):
+            fragment_reassembler.add_fragment(
+                MessageFragment(uuid4(), 0, MAXIMUM_NUMBER_OF_FRAGMENTS, fragment_content)
+            )
+        _, peak_size_in_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert len(fragment_reassembler.get_incomplete_message_ids()) == 64
+        assert fragment_reassembler.size_in_bytes == 64 * MAXIMUM_FRAGMENT_CONTENT_SIZE_IN_BYTES
+        assert peak_size_in_bytes < 4 * 1024 * 1024
+
+    @staticmethod
+    def test_least_recently_received_incomplete_messages_are_dropped() -> None:
+        fragment_reassembler = FragmentReassembler(maximum_number_of_incomplete_messages=2)
+        first_message_id, second_message_id, third_message_id = uuid4(), uuid4(), uuid4()
+        fragment_reassembler.add_fragment(MessageFragment(first_message_id, 0, 2, b"12345678"))
+        fragment_reassembler.add_fragment(MessageFragment(second_message_id, 0, 2, b"12345678"))
+        fragment_reassembler.add_fragment(MessageFragment(first_message_id, 0, 2, b"12345678"))
+        fragment_reassembler.add_fragment(MessageFragment(third_message_id, 0, 2, b"12345678"))
+
+        assert fragment_reassembler.get_incomplete_message_ids() == [first_message_id, third_message_id]
+        assert fragment_reassembler.size_in_bytes == 16
+
+    @staticmethod
+    def test_late_fragments_of_completed_messages_are_dropped() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=bytes(range(256)) * 100, modification_timestamp=123, version=123
+        )
+        message_id, datagrams = split_into_datagrams(read_file_response)
+        fragment_reassembler = FragmentReassembler()
+        for datagram in datagrams:
+            fragment_reassembler.add_fragment(Message.unmarshall(datagram))
+
+        assert fragment_reassembler.add_fragment(Message.unmarshall(datagrams[1])) is None
+        assert fragment_reassembler.get_incomplete_message_ids() == []
+
+        # A retransmission of the whole message, which starts from the first fragment, is reassembled again.
+        results = [fragment_reassembler.add_fragment(Message.unmarshall(datagram)) for datagram in datagrams]
+        assert Message.unmarshall(results[-1]) == read_file_response
+
+    @staticmethod
+    def test_sent_fragment_history_evicts_oldest_message() -> None:
+        sent_fragment_history = SentFragmentHistory(maximum_size_in_bytes=10)
+        first_message_id, second_message_id = uuid4(), uuid4()
+        first_fragment = MessageFragment(first_message_id, 0, 1, b"12345678").marshall()
+        second_fragment = MessageFragment(second_message_id, 0, 1, b"12345678").marshall()
+        sent_fragment_history.record(first_message_id, [first_fragment])
+        sent_fragment_history.record(second_message_id, [second_fragment])
+
+        assert sent_fragment_history.get_datagrams(first_message_id, [0]) == []
+        assert sent_fragment_history.get_datagrams(second_message_id, [0]) == [second_fragment]
@@ -1,3 +1,4 @@
+import pickle
 import time
 from ipaddress import IPv4Address
 from uuid import uuid4
@@ -11,12 +12,32 @@ from remote_file_system.message import (
     WriteFileResponse,
     SubscribeToUpdatesResponse,
     UpdateNotification,
+    UpdateDeltaNotification,
     ModifiedTimestampRequest,
     ModifiedTimestampResponse,
     DeleteFileRequest,
     DeleteFileResponse,
     AppendFileRequest,
     AppendFileResponse,
+    MessageFragment,
+    FragmentRetransmissionRequest,
+    ReadFileRangeRequest,
+    ReadFileRangeResponse,
+    RenewSubscriptionRequest,
+    RenewSubscriptionResponse,
+    UnsubscribeFromUpdatesRequest,
+    UnsubscribeFromUpdatesResponse,
+    ConditionalReadFileRangeRequest,
+    NotModifiedResponse,
+    ValidateFilesRequest,
+    ValidateFilesResponse,
+    LeaseRevocationNotification,
+    ConditionalWriteFileRequest,
+    CompressedMessage,
+    NegotiateCompressionRequest,
+    NegotiateCompressionResponse,
+    SynchronizeFileRangeRequest,
+    SynchronizeFileRangeResponse,
 )
 
 
@@ -92,7 +113,7 @@ class TestReadFileResponse:
     @staticmethod
     def test_marshall_unmarshall() -> None:
         read_file_response: ReadFileResponse = ReadFileResponse(
-            reply_id=uuid4(), content=b"random content", modification_timestamp=123
+            reply_id=uuid4(), content=b"random content", modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = read_file_response.marshall()
         unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
@@ -101,18 +122,38 @@ class TestReadFileResponse:
     @staticmethod
     def test_marshall_unmarshall_without_type_info() -> None:
         read_file_response: ReadFileResponse = ReadFileResponse(
-            reply_id=uuid4(), content=b"random content", modification_timestamp=123
+            reply_id=uuid4(), content=b"random content", modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = read_file_response._marshall_without_type_info()
         unmarshalled_obj: ReadFileResponse = ReadFileResponse._unmarshall_without_type_info(marshalled_data)
         assert unmarshalled_obj == read_file_response
 
+    @staticmethod
+    def test_unmarshalled_content_is_not_copied() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(), content=b"random content", modification_timestamp=int(time.time()), version=time.time_ns()
+        )
+        marshalled_data: bytes = read_file_response.marshall()
+        unmarshalled_obj: ReadFileResponse = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj.content.obj is marshalled_data
+        assert unmarshalled_obj == read_file_response
+
+    @staticmethod
+    def test_message_with_memoryview_content_can_be_pickled() -> None:
+        read_file_response: ReadFileResponse = ReadFileResponse(
+            reply_id=uuid4(),
+            content=memoryview(b"random content")[7:],
+            modification_timestamp=int(time.time()),
+            version=time.time_ns(),
+        )
+        assert pickle.loads(pickle.dumps(read_file_response)) == read_file_response
+
 
 class TestWriteFileResponse:
     @staticmethod
     def test_marshall_unmarshall() -> None:
         write_file_response: WriteFileResponse = WriteFileResponse(
-            reply_id=uuid4(), is_successful=False, modification_timestamp=123
+            reply_id=uuid4(), is_successful=False, modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = write_file_response.marshall()
         unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
@@ -121,7 +162,7 @@ class TestWriteFileResponse:
     @staticmethod
     def test_marshall_unmarshall_without_type_info() -> None:
         write_file_response: WriteFileResponse = WriteFileResponse(
-            reply_id=uuid4(), is_successful=False, modification_timestamp=123
+            reply_id=uuid4(), is_successful=False, modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = write_file_response._marshall_without_type_info()
         unmarshalled_obj: WriteFileResponse = WriteFileResponse._unmarshall_without_type_info(marshalled_data)
@@ -154,7 +195,7 @@ class TestUpdateNotification:
     @staticmethod
     def test_marshall_unmarshall() -> None:
         update_notification: UpdateNotification = UpdateNotification(
-            file_name="random_file.txt", content=b"hello world", modification_timestamp=123
+            file_name="random_file.txt", content=b"hello world", modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = update_notification.marshall()
         unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
@@ -163,13 +204,47 @@ class TestUpdateNotification:
     @staticmethod
     def test_marshall_unmarshall_without_type_info() -> None:
         update_notification: UpdateNotification = UpdateNotification(
-            file_name="random_file.txt", content=b"hello world", modification_timestamp=123
+            file_name="random_file.txt", content=b"hello world", modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = update_notification._marshall_without_type_info()
         unmarshalled_obj: UpdateNotification = UpdateNotification._unmarshall_without_type_info(marshalled_data)
         assert unmarshalled_obj == update_notification
 
 
+class TestUpdateDeltaNotification:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        update_delta_notification: UpdateDeltaNotification = UpdateDeltaNotification(
+            file_name="random_file.txt",
+            offset=5,
+            file_size=16,
+            previous_version=2**40,
+            version=2**40 + 1,
+            modification_timestamp=123,
+            content=b"hello world",
+        )
+        marshalled_data: bytes = update_delta_notification.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == update_delta_notification
+
+    @staticmethod
+    def test_marshall_unmarshall_without_type_info() -> None:
+        update_delta_notification: UpdateDeltaNotification = UpdateDeltaNotification(
+            file_name="random_file.txt",
+            offset=5,
+            file_size=16,
+            previous_version=2**40,
+            version=2**40 + 1,
+            modification_timestamp=123,
+            content=b"hello world",
+        )
+        marshalled_data: bytes = update_delta_notification._marshall_without_type_info()
+        unmarshalled_obj: UpdateDeltaNotification = UpdateDeltaNotification._unmarshall_without_type_info(
+            marshalled_data
+        )
+        assert unmarshalled_obj == update_delta_notification
+
+
 class TestModifiedTimestampRequest:
     @staticmethod
     def test_marshall_unmarshall() -> None:
@@ -194,7 +269,7 @@ class TestModifiedTimestampResponse:
     @staticmethod
     def test_marshall_unmarshall() -> None:
         modified_timestamp_response: ModifiedTimestampResponse = ModifiedTimestampResponse(
-            reply_id=uuid4(), modification_timestamp=int(time.time()), is_successful=False
+            reply_id=uuid4(), modification_timestamp=int(time.time()), version=time.time_ns(), is_successful=False
         )
         marshalled_data: bytes = modified_timestamp_response.marshall()
         unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
@@ -203,7 +278,7 @@ class TestModifiedTimestampResponse:
     @staticmethod
     def test_marshall_unmarshall_without_type_info() -> None:
         modified_timestamp_response: ModifiedTimestampResponse = ModifiedTimestampResponse(
-            reply_id=uuid4(), modification_timestamp=int(time.time()), is_successful=False
+            reply_id=uuid4(), modification_timestamp=int(time.time()), version=time.time_ns(), is_successful=False
         )
         marshalled_data: bytes = modified_timestamp_response._marshall_without_type_info()
         unmarshalled_obj: ModifiedTimestampResponse = ModifiedTimestampResponse._unmarshall_without_type_info(
@@ -268,7 +343,7 @@ class TestAppendFileResponse:
     @staticmethod
     def test_marshall_unmarshall() -> None:
         append_file_response: AppendFileResponse = AppendFileResponse(
-            reply_id=uuid4(), is_successful=False, modification_timestamp=123
+            reply_id=uuid4(), is_successful=False, modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = append_file_response.marshall()
         unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
@@ -277,8 +352,315 @@ class TestAppendFileResponse:
     @staticmethod
     def test_marshall_unmarshall_without_type_info() -> None:
         append_file_response: AppendFileResponse = AppendFileResponse(
-            reply_id=uuid4(), is_successful=False, modification_timestamp=123
+            reply_id=uuid4(), is_successful=False, modification_timestamp=123, version=2**40
         )
         marshalled_data: bytes = append_file_response._marshall_without_type_info()
         unmarshalled_obj: AppendFileResponse = AppendFileResponse._unmarshall_without_type_info(marshalled_data)
         assert unmarshalled_obj == append_file_response
+
+
+class TestMessageFragment:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        message_fragment: MessageFragment = MessageFragment(
+            message_id=uuid4(), fragment_number=3, number_of_fragments=7, content=b"random fragment content"
+        )
+        marshalled_data: bytes = message_fragment.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == message_fragment
+
+    @staticmethod
+    def test_marshall_unmarshall_without_type_info() -> None:
+        message_fragment: MessageFragment = MessageFragment(
+            message_id=uuid4(), fragment_number=3, number_of_fragments=7, content=b"random fragment content"
+        )
+        marshalled_data: bytes = message_fragment._marshall_without_type_info()
+        unmarshalled_obj: MessageFragment = MessageFragment._unmarshall_without_type_info(marshalled_data)
+        assert unmarshalled_obj == message_fragment
+
+
+class TestFragmentRetransmissionRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        retransmission_request: FragmentRetransmissionRequest = FragmentRetransmissionRequest(
+            message_id=uuid4(), missing_fragment_numbers=[0, 4, 5, 100]
+        )
+        marshalled_data: bytes = retransmission_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == retransmission_request
+
+    @staticmethod
+    def test_marshall_unmarshall_without_type_info() -> None:
+        retransmission_request: FragmentRetransmissionRequest = FragmentRetransmissionRequest(
+            message_id=uuid4(), missing_fragment_numbers=[]
+        )
+        marshalled_data: bytes = retransmission_request._marshall_without_type_info()
+        unmarshalled_obj: FragmentRetransmissionRequest = FragmentRetransmissionRequest._unmarshall_without_type_info(
+            marshalled_data
+        )
+        assert unmarshalled_obj == retransmission_request
+
+
+class TestReadFileRangeRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        read_file_range_request: ReadFileRangeRequest = ReadFileRangeRequest(
+            request_id=uuid4(),
+            file_name="random_file_name",
+            offset=2**33,
+            number_of_bytes=100,
+            lease_duration_in_seconds=30,
+        )
+        marshalled_data: bytes = read_file_range_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == read_file_range_request
+
+    @staticmethod
+    def test_marshall_unmarshall_without_type_info() -> None:
+        read_file_range_request: ReadFileRangeRequest = ReadFileRangeRequest(
+            request_id=uuid4(), file_name="random_file_name", offset=2**33, number_of_bytes=100
+        )
+        marshalled_data: bytes = read_file_range_request._marshall_without_type_info()
+        unmarshalled_obj: ReadFileRangeRequest = ReadFileRangeRequest._unmarshall_without_type_info(marshalled_data)
+        assert unmarshalled_obj == read_file_range_request
+
+
+class TestReadFileRangeResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        read_file_range_response: ReadFileRangeResponse = ReadFileRangeResponse(
+            reply_id=uuid4(),
+            is_successful=True,
+            offset=2**33,
+            file_size=2**34,
+            modification_timestamp=123,
+            version=2**40,
+            content=b"random content",
+            lease_duration_in_seconds=30,
+        )
+        marshalled_data: bytes = read_file_range_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == read_file_range_response
+
+    @staticmethod
+    def test_marshall_unmarshall_without_type_info() -> None:
+        read_file_range_response: ReadFileRangeResponse = ReadFileRangeResponse(
+            reply_id=uuid4(),
+            is_successful=False,
+            offset=0,
+            file_size=0,
+            modification_timestamp=0,
+            version=0,
+            content=b"",
+        )
+        marshalled_data: bytes = read_file_range_response._marshall_without_type_info()
+        unmarshalled_obj: ReadFileRangeResponse = ReadFileRangeResponse._unmarshall_without_type_info(marshalled_data)
+        assert unmarshalled_obj == read_file_range_response
+
+
+class TestRenewSubscriptionRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        renew_subscription_request: RenewSubscriptionRequest = RenewSubscriptionRequest(
+            request_id=uuid4(),
+            client_ip_address=IPv4Address("192.168.1.1"),
+            client_port_number=12345,
+            monitoring_interval_in_seconds=60,
+            file_name="random_file_name",
+        )
+        marshalled_data: bytes = renew_subscription_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == renew_subscription_request
+
+
+class TestRenewSubscriptionResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        renew_subscription_response: RenewSubscriptionResponse = RenewSubscriptionResponse(
+            reply_id=uuid4(), is_successful=False
+        )
+        marshalled_data: bytes = renew_subscription_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == renew_subscription_response
+
+
+class TestUnsubscribeFromUpdatesRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        unsubscribe_request: UnsubscribeFromUpdatesRequest = UnsubscribeFromUpdatesRequest(
+            request_id=uuid4(),
+            client_ip_address=IPv4Address("192.168.1.1"),
+            client_port_number=12345,
+            file_name="random_file_name",
+        )
+        marshalled_data: bytes = unsubscribe_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == unsubscribe_request
+
+
+class TestUnsubscribeFromUpdatesResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        unsubscribe_response: UnsubscribeFromUpdatesResponse = UnsubscribeFromUpdatesResponse(
+            reply_id=uuid4(), is_successful=True
+        )
+        marshalled_data: bytes = unsubscribe_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == unsubscribe_response
+
+
+class TestConditionalReadFileRangeRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        conditional_read_file_range_request: ConditionalReadFileRangeRequest = ConditionalReadFileRangeRequest(
+            request_id=uuid4(),
+            file_name="random_file_name",
+            offset=2**33,
+            number_of_bytes=4096,
+            version=2**40,
+            lease_duration_in_seconds=30,
+        )
+        marshalled_data: bytes = conditional_read_file_range_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == conditional_read_file_range_request
+
+
+class TestNotModifiedResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        not_modified_response: NotModifiedResponse = NotModifiedResponse(reply_id=uuid4(), version=time.time_ns())
+        marshalled_data: bytes = not_modified_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == not_modified_response
+
+    @staticmethod
+    def test_marshall_unmarshall_with_lease() -> None:
+        not_modified_response: NotModifiedResponse = NotModifiedResponse(
+            reply_id=uuid4(), version=time.time_ns(), lease_duration_in_seconds=30
+        )
+        marshalled_data: bytes = not_modified_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == not_modified_response
+
+
+class TestValidateFilesRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        validate_files_request: ValidateFilesRequest = ValidateFilesRequest(
+            request_id=uuid4(), file_versions=[("random_file_name", 2**40), ("ディレクトリ/ファイル.txt", 1)]
+        )
+        marshalled_data: bytes = validate_files_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == validate_files_request
+
+
+class TestValidateFilesResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        validate_files_response: ValidateFilesResponse = ValidateFilesResponse(
+            reply_id=uuid4(), changed_file_versions=[("random_file_name", 0)]
+        )
+        marshalled_data: bytes = validate_files_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == validate_files_response
+
+    @staticmethod
+    def test_marshall_unmarshall_without_changed_files() -> None:
+        validate_files_response: ValidateFilesResponse = ValidateFilesResponse(
+            reply_id=uuid4(), changed_file_versions=[]
+        )
+        marshalled_data: bytes = validate_files_response._marshall_without_type_info()
+        unmarshalled_obj: ValidateFilesResponse = ValidateFilesResponse._unmarshall_without_type_info(marshalled_data)
+        assert unmarshalled_obj == validate_files_response
+
+
+class TestLeaseRevocationNotification:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        lease_revocation_notification: LeaseRevocationNotification = LeaseRevocationNotification(
+            file_name="ディレクトリ/ファイル.txt"
+        )
+        marshalled_data: bytes = lease_revocation_notification.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == lease_revocation_notification
+
+
+class TestConditionalWriteFileRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        conditional_write_file_request: ConditionalWriteFileRequest = ConditionalWriteFileRequest(
+            request_id=uuid4(), offset=2**33, file_name="random_file_name", content=b"random content", version=2**40
+        )
+        marshalled_data: bytes = conditional_write_file_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == conditional_write_file_request
+
+
+class TestCompressedMessage:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        compressed_message: CompressedMessage = CompressedMessage(
+            message_id=uuid4(), codec_id=1, content=b"random compressed content"
+        )
+        marshalled_data: bytes = compressed_message.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == compressed_message
+
+
+class TestNegotiateCompressionRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        negotiate_compression_request: NegotiateCompressionRequest = NegotiateCompressionRequest(
+            request_id=uuid4(), codec_ids=[3, 1, 2]
+        )
+        marshalled_data: bytes = negotiate_compression_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == negotiate_compression_request
+
+
+class TestNegotiateCompressionResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        negotiate_compression_response: NegotiateCompressionResponse = NegotiateCompressionResponse(
+            reply_id=uuid4(), codec_id=0
+        )
+        marshalled_data: bytes = negotiate_compression_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == negotiate_compression_response
+
+
+class TestSynchronizeFileRangeRequest:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        synchronize_file_range_request: SynchronizeFileRangeRequest = SynchronizeFileRangeRequest(
+            request_id=uuid4(),
+            file_name="ディレクトリ/ファイル.txt",
+            offset=2**33,
+            number_of_bytes=2**20,
+            version=2**40,
+            block_size_in_bytes=1024,
+            block_hashes=[(2**33, 2**31, b"0123456789abcdef"), (2**33 + 1024, 1, b"fedcba9876543210")],
+            lease_duration_in_seconds=30,
+        )
+        marshalled_data: bytes = synchronize_file_range_request.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == synchronize_file_range_request
+
+
+class TestSynchronizeFileRangeResponse:
+    @staticmethod
+    def test_marshall_unmarshall() -> None:
+        synchronize_file_range_response: SynchronizeFileRangeResponse = SynchronizeFileRangeResponse(
+            reply_id=uuid4(),
+            is_successful=True,
+            offset=0,
+            file_size=2**33,
+            modification_timestamp=123,
+            version=2**40,
+            checksum=2**32 - 1,
+            instructions=[b"random content", 0, 1024, b"", b"more random content"],
+            lease_duration_in_seconds=30,
+        )
+        marshalled_data: bytes = synchronize_file_range_response.marshall()
+        unmarshalled_obj: Message = Message.unmarshall(marshalled_data)
+        assert unmarshalled_obj == synchronize_file_range_response
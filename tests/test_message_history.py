@@ -0,0 +1,64 @@
+import time
+from uuid import uuid4
+
+from remote_file_system.message import ReadFileResponse, DeleteFileResponse
+from remote_file_system.message_history import MessageHistory, REPLY_OVERHEAD_IN_BYTES
+
+CLIENT_ADDRESS = ("127.0.0.1", 9999)
+
+
+class TestMessageHistory:
+    @staticmethod
+    def test_get_reply_counts_hits_and_misses() -> None:
+        message_history = MessageHistory()
+        request_id = uuid4()
+        reply = DeleteFileResponse(reply_id=request_id, is_successful=True)
+        message_history.add_reply(request_id, reply, CLIENT_ADDRESS)
+
+        assert message_history.get_reply(request_id) == reply
+        assert message_history.get_reply(uuid4()) is None
+        statistics = message_history.get_statistics()
+        assert (statistics["number_of_hits"], statistics["number_of_misses"]) == (1, 1)
+
+    @staticmethod
+    def test_replies_expire_after_time_to_live() -> None:
+        message_history = MessageHistory(time_to_live_in_seconds=0.1)
+        request_id = uuid4()
+        reply = DeleteFileResponse(reply_id=request_id, is_successful=True)
+        message_history.add_reply(request_id, reply, CLIENT_ADDRESS)
+        time.sleep(0.2)
+
+        assert not message_history.has_reply(request_id)
+        assert message_history.get_statistics()["number_of_expirations"] == 1
+
+    @staticmethod
+    def test_least_recently_used_reply_is_evicted_when_over_byte_budget() -> None:
+        message_history = MessageHistory(maximum_size_in_bytes=2 * (REPLY_OVERHEAD_IN_BYTES + 100))
+        request_ids = [uuid4() for _ in range(3)]
+        for request_id in request_ids[:2]:
+            reply = ReadFileResponse(reply_id=request_id, content=b"x" * 100, modification_timestamp=0, version=0)
+            message_history.add_reply(request_id, reply, CLIENT_ADDRESS)
+        message_history.get_reply(request_ids[0])
+        reply = ReadFileResponse(reply_id=request_ids[2], content=b"x" * 100, modification_timestamp=0, version=0)
+        message_history.add_reply(request_ids[2], reply, CLIENT_ADDRESS)
+
+        assert message_history.has_reply(request_ids[0])
+        assert not message_history.has_reply(request_ids[1])
+        assert message_history.has_reply(request_ids[2])
+        assert message_history.get_statistics()["number_of_evictions"] == 1
+
+    @staticmethod
+    def test_oldest_reply_of_a_client_is_trimmed_once_its_window_is_full() -> None:
+        message_history = MessageHistory(maximum_number_of_replies_per_client=2)
+        request_ids = [uuid4() for _ in range(3)]
+        for request_id in request_ids:
+            message_history.add_reply(
+                request_id, DeleteFileResponse(reply_id=request_id, is_successful=True), CLIENT_ADDRESS
+            )
+        other_request_id = uuid4()
+        message_history.add_reply(
+            other_request_id, DeleteFileResponse(reply_id=other_request_id, is_successful=True), ("127.0.0.1", 8888)
+        )
+
+        assert [message_history.has_reply(request_id) for request_id in request_ids] == [False, True, True]
+        assert message_history.has_reply(other_request_id)
@@ -1,3 +1,4 @@
+import multiprocessing
 import threading
 import time
 
@@ -8,6 +9,7 @@ from uuid import uuid4, UUID
 from loguru import logger
 
 from remote_file_system.communications import send_message_and_wait_for_reply
+from remote_file_system.message_history import SharedStateManager
 from remote_file_system.server import Server, InvocationSemantics
 from remote_file_system.server_file_system import ServerFileSystem
 from remote_file_system.message import (
@@ -239,3 +241,107 @@ class TestNetworkExperimentDuplicateMessages:
         assert response_1 == response_2, "Expected server to use cached reply to respond to the second message"
         same = open("tests/server/appendme.txt", "rb").read() == b"Hello? Is it me you're looking for?a"
         assert same is True, "Expected original file to be the same from the appended file"
+
+    def test_network_failure_experiment_7(self) -> None:
+        """
+        Network experiment 7: simulate duplicate of append request message on a server with worker threads.
+
+        Things to test:
+        - Server should invoke the append_file method only once for the first message.
+        - Server should use the message history to respond to the second message.
+
+        innovcation     : at most once
+        operation type  : non-idempotent
+
+        """
+        with open("tests/server/appendme.txt", "w") as file:
+            file.write("Hello? Is it me you're looking for?")
+
+        server_root_directory: Path = Path.cwd() / "tests" / "server"
+        server_file_system = ServerFileSystem(server_root_directory=server_root_directory)
+        mock_server_file_system = Mock(wraps=server_file_system)
+        server = Server(
+            server_ip_address=self.SERVER_IP_ADDRESS,
+            server_port_number=self.SERVER_PORT_NUMBER,
+            file_system=mock_server_file_system,
+            invocation_semantics=InvocationSemantics.AT_MOST_ONCE,
+            number_of_worker_threads=4,
+        )
+        logger.info("SERVER START")
+        server_thread = threading.Thread(target=server.listen_for_messages)
+        server_thread.start()
+
+        fixed_uuid: UUID = uuid4()
+        responses = [
+            send_message_and_wait_for_reply(
+                message=AppendFileRequest(request_id=fixed_uuid, file_name="appendme.txt", content=b"a"),
+                recipient_ip_address=self.SERVER_IP_ADDRESS,
+                recipient_port_number=self.SERVER_PORT_NUMBER,
+                max_attempts_to_send_message=3,
+                timeout_in_seconds=5,
+            )
+            for _ in range(2)
+        ]
+
+        mock_append_file: Mock = mock_server_file_system.append_file
+        server.stop_listening()
+        server_thread.join()
+        mock_append_file.assert_called_once(), "Expected server to invoke append_file method only once"
+        assert responses[0], "Expected server to respond to first message"
+        assert responses[0] == responses[1], "Expected server to use cached reply to respond to the second message"
+        same = open("tests/server/appendme.txt", "rb").read() == b"Hello? Is it me you're looking for?a"
+        assert same is True, "Expected original file to be the same from the appended file"
+
+    def test_network_failure_experiment_8(self) -> None:
+        """
+        Network experiment 8: simulate duplicate of append request message on several server processes sharing a port.
+
+        Things to test:
+        - The file should be appended to only once, whichever server process receives the duplicate.
+        - Server should use the shared message history to respond to the duplicates.
+
+        innovcation     : at most once
+        operation type  : non-idempotent
+
+        """
+        with open("tests/server/appendme.txt", "w") as file:
+            file.write("Hello? Is it me you're looking for?")
+
+        server_root_directory: Path = Path.cwd() / "tests" / "server"
+        with SharedStateManager() as manager:
+            message_history = manager.MessageHistory()
+            server_processes = []
+            for _ in range(2):
+                server = Server(
+                    server_ip_address=self.SERVER_IP_ADDRESS,
+                    server_port_number=self.SERVER_PORT_NUMBER,
+                    file_system=ServerFileSystem(server_root_directory=server_root_directory),
+                    invocation_semantics=InvocationSemantics.AT_MOST_ONCE,
+                    message_history=message_history,
+                    reuse_port=True,
+                )
+                server_process = multiprocessing.Process(target=server.listen_for_messages)
+                server_process.start()
+                server_processes.append(server_process)
+            time.sleep(1)
+
+            fixed_uuid: UUID = uuid4()
+            # Every call sends from a new socket, so the duplicates are spread over the server processes.
+            responses = [
+                send_message_and_wait_for_reply(
+                    message=AppendFileRequest(request_id=fixed_uuid, file_name="appendme.txt", content=b"a"),
+                    recipient_ip_address=self.SERVER_IP_ADDRESS,
+                    recipient_port_number=self.SERVER_PORT_NUMBER,
+                    max_attempts_to_send_message=3,
+                    timeout_in_seconds=5,
+                )
+                for _ in range(8)
+            ]
+
+            for server_process in server_processes:
+                server_process.terminate()
+                server_process.join()
+
+        assert all(response == responses[0] for response in responses), "Expected the same reply to every duplicate"
+        same = open("tests/server/appendme.txt", "rb").read() == b"Hello? Is it me you're looking for?a"
+        assert same is True, "Expected the file to be appended to only once"
@@ -0,0 +1,57 @@
+import pytest
+
+from remote_file_system.round_trip_time import RoundTripTimeEstimator
+
+
+class TestRoundTripTimeEstimator:
+    @staticmethod
+    def test_first_sample_sets_smoothed_round_trip_time_and_variation() -> None:
+        estimator = RoundTripTimeEstimator(initial_timeout_in_seconds=5, minimum_timeout_in_seconds=0.01)
+
+        estimator.add_sample(0.1)
+
+        statistics = estimator.get_statistics()
+        assert statistics["smoothed_round_trip_time_in_seconds"] == pytest.approx(0.1)
+        assert statistics["round_trip_time_variation_in_seconds"] == pytest.approx(0.05)
+        assert statistics["retransmission_timeout_in_seconds"] == pytest.approx(0.3)
+
+    @staticmethod
+    def test_later_samples_are_smoothed() -> None:
+        estimator = RoundTripTimeEstimator(minimum_timeout_in_seconds=0.01)
+        estimator.add_sample(0.1)
+
+        estimator.add_sample(0.2)
+
+        statistics = estimator.get_statistics()
+        assert statistics["round_trip_time_variation_in_seconds"] == pytest.approx(0.75 * 0.05 + 0.25 * 0.1)
+        assert statistics["smoothed_round_trip_time_in_seconds"] == pytest.approx(0.875 * 0.1 + 0.125 * 0.2)
+        assert statistics["number_of_samples"] == 2
+
+    @staticmethod
+    def test_timeouts_back_off_exponentially_up_to_the_maximum() -> None:
+        estimator = RoundTripTimeEstimator(
+            initial_timeout_in_seconds=1, maximum_timeout_in_seconds=3, jitter_fraction=0.1
+        )
+
+        estimator.record_timeout()
+        assert 2 <= estimator.get_timeout() <= 2.2
+        estimator.record_timeout()
+        assert 3 <= estimator.get_timeout() <= 3.3
+        assert estimator.get_statistics()["number_of_timeouts"] == 2
+
+    @staticmethod
+    def test_sample_after_timeouts_resets_the_backoff() -> None:
+        estimator = RoundTripTimeEstimator(initial_timeout_in_seconds=1, minimum_timeout_in_seconds=0.2)
+        estimator.record_timeout()
+
+        estimator.add_sample(0.01)
+
+        assert estimator.get_statistics()["retransmission_timeout_in_seconds"] == pytest.approx(0.2)
+
+    @staticmethod
+    def test_backoff_delay_after_connection_reset_grows_with_attempts() -> None:
+        estimator = RoundTripTimeEstimator(initial_timeout_in_seconds=5, minimum_timeout_in_seconds=0.2)
+
+        assert 0 <= estimator.get_backoff_delay(attempt_number=0) <= 0.2
+        assert 0 <= estimator.get_backoff_delay(attempt_number=2) <= 0.8
+        assert 0 <= estimator.get_backoff_delay(attempt_number=10) <= 5
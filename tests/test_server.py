@@ -0,0 +1,175 @@
+import threading
+from ipaddress import IPv4Address
+from pathlib import Path
+from typing import Dict, Generator
+from uuid import uuid4
+
+import pytest
+
+from remote_file_system.communications import Endpoint
+from remote_file_system.message import (
+    ConditionalWriteFileRequest,
+    LeaseRevocationNotification,
+    ReadFileRangeRequest,
+    ReadFileRangeResponse,
+    UpdateDeltaNotification,
+    WriteFileRequest,
+    WriteFileResponse,
+)
+from remote_file_system.server import InvocationSemantics, Server
+from remote_file_system.server_file_cache import FileContentCache
+from remote_file_system.server_file_metadata import FileMetadataTable, VersionRecord
+from remote_file_system.server_file_system import ServerFileSystem
+
+BROADCAST_IP_ADDRESS = IPv4Address("255.255.255.255")
+
+
+@pytest.fixture
+def server() -> Generator[Server, None, None]:
+    """
+    A server whose messages are dispatched by the tests rather than received from its socket.
+    """
+    server_root_directory: Path = Path.cwd() / "tests" / "server"
+    file_path: Path = server_root_directory / "notified_file.txt"
+    file_path.write_bytes(b"abcdef")
+    server = Server(
+        server_ip_address=IPv4Address("127.0.0.1"),
+        server_port_number=0,
+        file_system=ServerFileSystem(server_root_directory=server_root_directory),
+        maximum_lease_duration_in_seconds=10,
+    )
+    server.endpoint = Endpoint("127.0.0.1")
+    yield server
+    server.endpoint.close()
+    file_path.unlink()
+
+
+class TestServer:
+    @staticmethod
+    def test_subscriber_that_cannot_be_notified_does_not_stop_the_write(server: Server) -> None:
+        subscriber_endpoint = Endpoint("127.0.0.1")
+        writer_endpoint = Endpoint("127.0.0.1")
+        subscriber_endpoint.settimeout(1)
+        writer_endpoint.settimeout(1)
+        try:
+            subscriber_ip_address, subscriber_port_number = subscriber_endpoint.get_address()
+            server.server_file_system.subscribe_to_updates(BROADCAST_IP_ADDRESS, 12345, 60, "notified_file.txt")
+            server.server_file_system.subscribe_to_updates(
+                IPv4Address(subscriber_ip_address), subscriber_port_number, 60, "notified_file.txt"
+            )
+            writer_ip_address, writer_port_number = writer_endpoint.get_address()
+
+            server._dispatch_message(
+                WriteFileRequest(request_id=uuid4(), offset=2, file_name="notified_file.txt", content=b"XY"),
+                IPv4Address(writer_ip_address),
+                writer_port_number,
+            )
+
+            assert isinstance(writer_endpoint.receive_message()[0], WriteFileResponse)
+            assert isinstance(subscriber_endpoint.receive_message()[0], UpdateDeltaNotification)
+        finally:
+            subscriber_endpoint.close()
+            writer_endpoint.close()
+
+    @staticmethod
+    def test_lease_holder_that_cannot_be_sent_a_revocation_does_not_stop_the_write(server: Server) -> None:
+        lease_holder_endpoint = Endpoint("127.0.0.1")
+        writer_endpoint = Endpoint("127.0.0.1")
+        lease_holder_endpoint.settimeout(1)
+        writer_endpoint.settimeout(1)
+        try:
+            lease_holder_ip_address, lease_holder_port_number = lease_holder_endpoint.get_address()
+            server.server_file_system.grant_lease(BROADCAST_IP_ADDRESS, 12345, 10, "notified_file.txt")
+            server.server_file_system.grant_lease(
+                IPv4Address(lease_holder_ip_address), lease_holder_port_number, 10, "notified_file.txt"
+            )
+            writer_ip_address, writer_port_number = writer_endpoint.get_address()
+
+            server._dispatch_message(
+                WriteFileRequest(request_id=uuid4(), offset=2, file_name="notified_file.txt", content=b"XY"),
+                IPv4Address(writer_ip_address),
+                writer_port_number,
+            )
+
+            assert isinstance(lease_holder_endpoint.receive_message()[0], LeaseRevocationNotification)
+            assert isinstance(writer_endpoint.receive_message()[0], WriteFileResponse)
+        finally:
+            lease_holder_endpoint.close()
+            writer_endpoint.close()
+
+    @staticmethod
+    def test_reply_with_a_range_of_cached_content_is_stored_as_a_copy(tmp_path: Path) -> None:
+        (tmp_path / "cached_file.bin").write_bytes(bytes(range(256)) * 4096)
+        server = Server(
+            server_ip_address=IPv4Address("127.0.0.1"),
+            server_port_number=0,
+            file_system=ServerFileSystem(server_root_directory=tmp_path, file_content_cache=FileContentCache()),
+            invocation_semantics=InvocationSemantics.AT_MOST_ONCE,
+        )
+        server.endpoint = Endpoint("127.0.0.1")
+        reader_endpoint = Endpoint("127.0.0.1")
+        reader_endpoint.settimeout(1)
+        try:
+            reader_ip_address, reader_port_number = reader_endpoint.get_address()
+            request = ReadFileRangeRequest(
+                request_id=uuid4(), file_name="cached_file.bin", offset=0, number_of_bytes=100
+            )
+
+            server._dispatch_message(request, IPv4Address(reader_ip_address), reader_port_number)
+
+            reply: ReadFileRangeResponse = server.message_history.get_reply(request.request_id)
+            assert bytes(reply.content) == bytes(range(100))
+            assert len(reply.content.obj) < 1024
+        finally:
+            reader_endpoint.close()
+            server.endpoint.close()
+
+    @staticmethod
+    def test_conditional_write_sees_a_change_made_through_another_server_process(tmp_path: Path) -> None:
+        (tmp_path / "shared_file.txt").write_bytes(b"abcdef")
+        version_records: Dict[str, VersionRecord] = {}
+        version_lock = threading.Lock()
+        servers = [
+            Server(
+                server_ip_address=IPv4Address("127.0.0.1"),
+                server_port_number=0,
+                file_system=ServerFileSystem(
+                    server_root_directory=tmp_path,
+                    file_metadata_table=FileMetadataTable(version_records=version_records, version_lock=version_lock),
+                ),
+            )
+            for _ in range(2)
+        ]
+        writer_endpoint = Endpoint("127.0.0.1")
+        writer_endpoint.settimeout(1)
+        try:
+            for server in servers:
+                server.endpoint = Endpoint("127.0.0.1")
+            writer_ip_address, writer_port_number = writer_endpoint.get_address()
+            first_server, second_server = servers
+            version: int = first_server.server_file_system.get_file_metadata("shared_file.txt").version
+
+            second_server._dispatch_message(
+                WriteFileRequest(request_id=uuid4(), offset=2, file_name="shared_file.txt", content=b"zz"),
+                IPv4Address(writer_ip_address),
+                writer_port_number,
+            )
+            plain_reply: WriteFileResponse = writer_endpoint.receive_message()[0]
+            first_server._dispatch_message(
+                ConditionalWriteFileRequest(
+                    request_id=uuid4(), offset=0, file_name="shared_file.txt", content=b"XY", version=version
+                ),
+                IPv4Address(writer_ip_address),
+                writer_port_number,
+            )
+            conditional_reply: WriteFileResponse = writer_endpoint.receive_message()[0]
+
+            assert plain_reply.is_successful
+            assert not conditional_reply.is_successful
+            assert conditional_reply.version == plain_reply.version
+            assert (tmp_path / "shared_file.txt").read_bytes() == b"abzzef"
+        finally:
+            writer_endpoint.close()
+            for server in servers:
+                if server.endpoint is not None:
+                    server.endpoint.close()
@@ -0,0 +1,75 @@
+import mmap
+from pathlib import Path
+
+from remote_file_system.server_file_cache import FileContentCache, MappedFileCache
+
+
+class TestFileContentCache:
+    @staticmethod
+    def test_hit_requires_same_modification_time_and_size() -> None:
+        file_content_cache = FileContentCache()
+        file_content_cache.put_file_content("file.txt", b"ABCD", modification_time_in_nanoseconds=1, file_size=4)
+
+        assert (
+            file_content_cache.get_file_content("file.txt", modification_time_in_nanoseconds=1, file_size=4) == b"ABCD"
+        )
+        assert file_content_cache.get_file_content("file.txt", modification_time_in_nanoseconds=2, file_size=4) is None
+        assert file_content_cache.get_file_content("file.txt", modification_time_in_nanoseconds=1, file_size=4) is None
+        statistics = file_content_cache.get_statistics()
+        assert (statistics["number_of_hits"], statistics["number_of_misses"]) == (1, 2)
+        assert statistics["hit_rate"] == 1 / 3
+        assert statistics["number_of_invalidations"] == 1
+
+    @staticmethod
+    def test_least_recently_used_file_is_evicted_when_over_byte_budget() -> None:
+        file_content_cache = FileContentCache(maximum_size_in_bytes=8)
+        file_content_cache.put_file_content("first.txt", b"1111", 1, 4)
+        file_content_cache.put_file_content("second.txt", b"2222", 1, 4)
+        file_content_cache.get_file_content("first.txt", 1, 4)
+
+        file_content_cache.put_file_content("third.txt", b"3333", 1, 4)
+
+        assert list(file_content_cache.files) == ["first.txt", "third.txt"]
+        assert file_content_cache.get_statistics()["size_in_bytes"] == 8
+        assert file_content_cache.get_statistics()["number_of_evictions"] == 1
+
+    @staticmethod
+    def test_files_larger_than_the_limit_are_not_cached() -> None:
+        file_content_cache = FileContentCache(maximum_file_size_in_bytes=3)
+
+        file_content_cache.put_file_content("file.txt", b"ABCD", 1, 4)
+
+        assert file_content_cache.get_statistics()["number_of_files"] == 0
+
+
+class TestMappedFileCache:
+    @staticmethod
+    def test_file_is_mapped_again_after_it_changes(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.bin"
+        file_path.write_bytes(b"ABCD")
+        mapped_file_cache = MappedFileCache(minimum_file_size_in_bytes=1)
+
+        mapping: mmap.mmap = mapped_file_cache.get_mapping(str(file_path), 1, 4)
+        assert mapped_file_cache.get_mapping(str(file_path), 1, 4) is mapping
+        file_path.write_bytes(b"ABCDEF")
+        remapping: mmap.mmap = mapped_file_cache.get_mapping(str(file_path), 2, 6)
+
+        assert remapping[:] == b"ABCDEF"
+        statistics = mapped_file_cache.get_statistics()
+        assert (statistics["number_of_hits"], statistics["number_of_misses"]) == (1, 2)
+        assert statistics["number_of_invalidations"] == 1
+
+    @staticmethod
+    def test_least_recently_used_mapping_is_dropped(tmp_path: Path) -> None:
+        mapped_file_cache = MappedFileCache(minimum_file_size_in_bytes=1, maximum_number_of_files=1)
+        for file_name in ("first.bin", "second.bin"):
+            (tmp_path / file_name).write_bytes(b"ABCD")
+            mapped_file_cache.get_mapping(str(tmp_path / file_name), 1, 4)
+
+        assert list(mapped_file_cache.files) == [str(tmp_path / "second.bin")]
+        assert mapped_file_cache.get_statistics()["number_of_evictions"] == 1
+
+    @staticmethod
+    def test_empty_and_small_files_are_not_mapped() -> None:
+        assert not MappedFileCache(minimum_file_size_in_bytes=0).can_map(0)
+        assert not MappedFileCache(minimum_file_size_in_bytes=5).can_map(4)
@@ -0,0 +1,106 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+from remote_file_system.server_file_metadata import FileMetadataTable, VersionRecord
+
+
+class TestFileMetadataTable:
+    @staticmethod
+    def test_first_lookup_scans_the_directory(tmp_path: Path) -> None:
+        for file_name in ("first.txt", "second.txt"):
+            (tmp_path / file_name).write_bytes(b"ABCD")
+        file_metadata_table = FileMetadataTable(refresh_interval_in_seconds=60)
+
+        file_metadata = file_metadata_table.get_file_metadata(str(tmp_path / "first.txt"))
+        assert file_metadata.file_size == 4
+        assert file_metadata.modification_time_in_nanoseconds == os.stat(tmp_path / "first.txt").st_mtime_ns
+        assert file_metadata_table.get_file_metadata(str(tmp_path / "second.txt")).file_size == 4
+
+        statistics = file_metadata_table.get_statistics()
+        assert (statistics["number_of_files"], statistics["number_of_hits"]) == (2, 2)
+
+    @staticmethod
+    def test_recorded_change_gets_a_new_version(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.txt"
+        file_path.write_bytes(b"ABCD")
+        file_metadata_table = FileMetadataTable(refresh_interval_in_seconds=60)
+        version: int = file_metadata_table.get_file_metadata(str(file_path)).version
+
+        # The size and modification time stay the same, as they do for a quick write of the same length.
+        modification_time_in_nanoseconds: int = os.stat(file_path).st_mtime_ns
+        file_path.write_bytes(b"WXYZ")
+        os.utime(file_path, ns=(modification_time_in_nanoseconds, modification_time_in_nanoseconds))
+        file_metadata_table.record_change(str(file_path))
+
+        assert file_metadata_table.get_file_metadata(str(file_path)).version > version
+        assert os.stat(file_path).st_mtime_ns == modification_time_in_nanoseconds
+
+    @staticmethod
+    def test_external_changes_are_noticed_once_entries_are_refreshed(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.txt"
+        file_path.write_bytes(b"ABCD")
+        file_metadata_table = FileMetadataTable(refresh_interval_in_seconds=0)
+        version: int = file_metadata_table.get_file_metadata(str(file_path)).version
+        assert file_metadata_table.get_file_metadata(str(file_path)).version == version
+
+        file_path.write_bytes(b"ABCDEF")
+        file_metadata = file_metadata_table.get_file_metadata(str(file_path))
+        assert (file_metadata.file_size, file_metadata.version > version) == (6, True)
+
+        file_path.unlink()
+        assert file_metadata_table.get_file_metadata(str(file_path)) is None
+
+    @staticmethod
+    def test_versions_are_not_reused_after_deletion(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.txt"
+        file_path.write_bytes(b"ABCD")
+        file_metadata_table = FileMetadataTable()
+        version: int = file_metadata_table.get_file_metadata(str(file_path)).version
+        modification_time_in_nanoseconds: int = os.stat(file_path).st_mtime_ns
+
+        file_path.unlink()
+        file_metadata_table.record_deletion(str(file_path))
+        file_path.write_bytes(b"ABCD")
+        # A file created again later, with the same size and possibly the same inode number.
+        os.utime(file_path, ns=(modification_time_in_nanoseconds + 1, modification_time_in_nanoseconds + 1))
+
+        assert file_metadata_table.get_file_metadata(str(file_path)).version > version
+
+    @staticmethod
+    def test_tables_sharing_version_records_agree_on_versions(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.txt"
+        file_path.write_bytes(b"ABCD")
+        # As in server processes sharing a port.
+        version_records: Dict[str, VersionRecord] = {}
+        version_lock = threading.Lock()
+        first_file_metadata_table = FileMetadataTable(
+            refresh_interval_in_seconds=0, version_records=version_records, version_lock=version_lock
+        )
+        second_file_metadata_table = FileMetadataTable(
+            refresh_interval_in_seconds=0, version_records=version_records, version_lock=version_lock
+        )
+        version: int = first_file_metadata_table.get_file_metadata(str(file_path)).version
+        assert second_file_metadata_table.get_file_metadata(str(file_path)).version == version
+
+        # A write through the first table that leaves the size and modification time as they were.
+        modification_time_in_nanoseconds: int = os.stat(file_path).st_mtime_ns
+        file_path.write_bytes(b"WXYZ")
+        os.utime(file_path, ns=(modification_time_in_nanoseconds, modification_time_in_nanoseconds))
+        changed_version: int = first_file_metadata_table.record_change(str(file_path)).version
+
+        assert changed_version > version
+        assert second_file_metadata_table.get_file_metadata(str(file_path)).version == changed_version
+
+    @staticmethod
+    def test_lookups_within_the_refresh_interval_do_not_check_the_file(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.txt"
+        file_path.write_bytes(b"ABCD")
+        file_metadata_table = FileMetadataTable()
+        file_metadata_table.get_file_metadata(str(file_path))
+
+        file_path.write_bytes(b"ABCDEF")
+
+        assert file_metadata_table.get_file_metadata(str(file_path)).file_size == 4
+        assert file_metadata_table.get_statistics()["number_of_hits"] == 2
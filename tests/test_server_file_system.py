@@ -1,5 +1,11 @@
+import mmap
+import os
+import time
+from ipaddress import IPv4Address
 from pathlib import Path
 
+from remote_file_system.server_file_cache import FileContentCache, MappedFileCache
+from remote_file_system.server_file_metadata import FileMetadataTable
 from remote_file_system.server_file_system import ServerFileSystem
 
 
@@ -14,6 +20,14 @@ class TestServerFileSystem:
         expected = "ABCDEFGHIJKLMNOPQRSTUVWXYZ".encode("UTF-8")
         assert actual == expected
 
+    @staticmethod
+    def test_read_file_range() -> None:
+        server_root_directory: Path = Path.cwd() / "tests" / "server"
+        server_file_system = ServerFileSystem(server_root_directory=server_root_directory)
+        content, file_size = server_file_system.read_file_range("english_alphabets.txt", offset=4, number_of_bytes=4)
+        assert content == "EFGH".encode("UTF-8")
+        assert file_size == 26
+
     @staticmethod
     def test_delete_file() -> None:
         server_root_directory: Path = Path.cwd() / "tests" / "server"
@@ -21,3 +35,173 @@ class TestServerFileSystem:
         f = open(f"{server_root_directory}/deleteme.txt", "w")
         f.close()
         assert server.delete_file("deleteme.txt")
+
+    @staticmethod
+    def test_subscribe_to_updates_stores_subscription_in_shared_mapping() -> None:
+        server_root_directory: Path = Path.cwd() / "tests" / "server"
+        shared_subscribed_clients = {}
+        server_file_system = ServerFileSystem(
+            server_root_directory=server_root_directory, subscribed_clients=shared_subscribed_clients
+        )
+        server_file_system.subscribe_to_updates(
+            client_ip_address=IPv4Address("127.0.0.1"),
+            client_port_number=9999,
+            monitoring_interval_in_seconds=10,
+            relative_file_path="english_alphabets.txt",
+        )
+
+        assert [client.port_number for client in shared_subscribed_clients["english_alphabets.txt"].values()] == [9999]
+
+    @staticmethod
+    def test_subscribing_again_replaces_the_subscription() -> None:
+        server_file_system = ServerFileSystem(server_root_directory=Path.cwd() / "tests" / "server")
+        for monitoring_interval_in_seconds in (10, 20):
+            server_file_system.subscribe_to_updates(
+                client_ip_address=IPv4Address("127.0.0.1"),
+                client_port_number=9999,
+                monitoring_interval_in_seconds=monitoring_interval_in_seconds,
+                relative_file_path="english_alphabets.txt",
+            )
+
+        subscribed_clients = server_file_system.get_subscribed_clients("english_alphabets.txt")
+        assert len(subscribed_clients) == 1
+        assert subscribed_clients[0].monitoring_expiration_timestamp >= int(time.time()) + 19
+
+    @staticmethod
+    def test_expired_subscriptions_are_removed() -> None:
+        server_file_system = ServerFileSystem(server_root_directory=Path.cwd() / "tests" / "server")
+        server_file_system.subscribe_to_updates(
+            client_ip_address=IPv4Address("127.0.0.1"),
+            client_port_number=9998,
+            monitoring_interval_in_seconds=0,
+            relative_file_path="english_alphabets.txt",
+        )
+        server_file_system.subscribe_to_updates(
+            client_ip_address=IPv4Address("127.0.0.1"),
+            client_port_number=9999,
+            monitoring_interval_in_seconds=10,
+            relative_file_path="english_alphabets.txt",
+        )
+
+        assert [
+            client.port_number for client in server_file_system.get_subscribed_clients("english_alphabets.txt")
+        ] == [9999]
+        assert list(server_file_system.subscribed_clients["english_alphabets.txt"]) == [("127.0.0.1", 9999)]
+        assert len(server_file_system.subscription_expirations) == 1
+
+    @staticmethod
+    def test_renew_subscription() -> None:
+        server_file_system = ServerFileSystem(server_root_directory=Path.cwd() / "tests" / "server")
+        client_ip_address = IPv4Address("127.0.0.1")
+        assert not server_file_system.renew_subscription(client_ip_address, 9999, 10, "english_alphabets.txt")
+
+        server_file_system.subscribe_to_updates(client_ip_address, 9999, 10, "english_alphabets.txt")
+        assert server_file_system.renew_subscription(client_ip_address, 9999, 20, "english_alphabets.txt")
+
+        subscribed_clients = server_file_system.get_subscribed_clients("english_alphabets.txt")
+        assert len(subscribed_clients) == 1
+        assert subscribed_clients[0].monitoring_expiration_timestamp >= int(time.time()) + 19
+
+    @staticmethod
+    def test_unsubscribe_from_updates() -> None:
+        server_file_system = ServerFileSystem(server_root_directory=Path.cwd() / "tests" / "server")
+        client_ip_address = IPv4Address("127.0.0.1")
+        server_file_system.subscribe_to_updates(client_ip_address, 9999, 10, "english_alphabets.txt")
+
+        assert server_file_system.unsubscribe_from_updates(client_ip_address, 9999, "english_alphabets.txt")
+        assert not server_file_system.unsubscribe_from_updates(client_ip_address, 9999, "english_alphabets.txt")
+        assert server_file_system.get_subscribed_clients("english_alphabets.txt") == []
+        assert "english_alphabets.txt" not in server_file_system.subscribed_clients
+
+    @staticmethod
+    def test_revoke_leases_returns_holders_of_unexpired_leases() -> None:
+        server_file_system = ServerFileSystem(server_root_directory=Path.cwd() / "tests" / "server")
+        client_ip_address = IPv4Address("127.0.0.1")
+        server_file_system.grant_lease(client_ip_address, 9997, 0, "english_alphabets.txt")
+        server_file_system.grant_lease(client_ip_address, 9998, 10, "english_alphabets.txt")
+        server_file_system.grant_lease(client_ip_address, 9999, 10, "digits.txt")
+
+        assert server_file_system.revoke_leases("english_alphabets.txt") == [("127.0.0.1", 9998)]
+        assert server_file_system.revoke_leases("english_alphabets.txt") == []
+        assert list(server_file_system.leases) == ["digits.txt"]
+
+    @staticmethod
+    def test_expired_leases_are_removed() -> None:
+        server_file_system = ServerFileSystem(server_root_directory=Path.cwd() / "tests" / "server")
+        client_ip_address = IPv4Address("127.0.0.1")
+        server_file_system.grant_lease(client_ip_address, 9998, 0, "english_alphabets.txt")
+        server_file_system.grant_lease(client_ip_address, 9999, 10, "digits.txt")
+
+        server_file_system.remove_expired_leases()
+
+        assert list(server_file_system.leases) == ["digits.txt"]
+
+    @staticmethod
+    def test_cached_file_content_is_kept_coherent_with_writes_and_appends(tmp_path: Path) -> None:
+        (tmp_path / "file.txt").write_bytes(b"ABCD")
+        file_content_cache = FileContentCache()
+        server_file_system = ServerFileSystem(server_root_directory=tmp_path, file_content_cache=file_content_cache)
+        assert server_file_system.read_file("file.txt") == b"ABCD"
+        assert server_file_system.read_file("file.txt") == b"ABCD"
+
+        server_file_system.write_file("file.txt", offset=1, file_content=b"X")
+        assert server_file_system.read_file("file.txt") == b"AXCD"
+        server_file_system.append_file("file.txt", file_content=b"EF")
+        content, file_size = server_file_system.read_file_range("file.txt", offset=3, number_of_bytes=2)
+
+        assert (bytes(content), file_size) == (b"DE", 6)
+        assert file_content_cache.get_statistics()["number_of_hits"] == 1
+        assert server_file_system.delete_file("file.txt")
+        assert server_file_system.read_file("file.txt") is None
+
+    @staticmethod
+    def test_cached_file_content_is_revalidated_against_external_changes(tmp_path: Path) -> None:
+        file_path: Path = tmp_path / "file.txt"
+        file_path.write_bytes(b"ABCD")
+        # The cached content is checked against the file on disk, not against the metadata table, which is only
+        # refreshed once a second.
+        server_file_system = ServerFileSystem(server_root_directory=tmp_path, file_content_cache=FileContentCache())
+        assert server_file_system.read_file("file.txt") == b"ABCD"
+
+        file_path.write_bytes(b"WXYZ")
+        # Make sure the change is visible even on file systems with coarse modification times.
+        os.utime(file_path, ns=(0, 0))
+
+        assert server_file_system.read_file("file.txt") == b"WXYZ"
+
+    @staticmethod
+    def test_large_files_are_served_from_a_mapping(tmp_path: Path) -> None:
+        (tmp_path / "large_file.bin").write_bytes(bytes(range(256)) * 4)
+        server_file_system = ServerFileSystem(
+            server_root_directory=tmp_path,
+            file_content_cache=FileContentCache(maximum_file_size_in_bytes=256),
+            mapped_file_cache=MappedFileCache(minimum_file_size_in_bytes=512),
+        )
+
+        content, file_size = server_file_system.read_file_range("large_file.bin", offset=510, number_of_bytes=4)
+        assert isinstance(content.obj, mmap.mmap)
+        assert (bytes(content), file_size) == (bytes([254, 255, 0, 1]), 1024)
+
+        server_file_system.append_file("large_file.bin", file_content=b"EF")
+        content, file_size = server_file_system.read_file_range("large_file.bin", offset=1023, number_of_bytes=4)
+        assert (bytes(content), file_size) == (b"\xffEF", 1026)
+
+    @staticmethod
+    def test_metadata_is_updated_by_writes_appends_and_deletes(tmp_path: Path) -> None:
+        (tmp_path / "file.txt").write_bytes(b"ABCD")
+        server_file_system = ServerFileSystem(
+            server_root_directory=tmp_path, file_metadata_table=FileMetadataTable(refresh_interval_in_seconds=60)
+        )
+        version: int = server_file_system.get_file_metadata("file.txt").version
+
+        server_file_system.write_file("file.txt", offset=1, file_content=b"X")
+        assert server_file_system.get_file_metadata("file.txt").version != version
+        server_file_system.append_file("file.txt", file_content=b"EF")
+        assert server_file_system.get_file_size("file.txt") == (True, 6)
+        assert server_file_system.get_modified_timestamp("file.txt") == (
+            True,
+            int(os.path.getmtime(tmp_path / "file.txt")),
+        )
+
+        server_file_system.delete_file("file.txt")
+        assert server_file_system.get_file_size("file.txt") == (False, None)
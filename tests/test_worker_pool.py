@@ -0,0 +1,84 @@
+import threading
+from typing import List
+
+from remote_file_system.worker_pool import KeyedWorkerPool
+
+
+class TestKeyedWorkerPool:
+    @staticmethod
+    def test_tasks_with_same_key_run_in_submission_order() -> None:
+        worker_pool = KeyedWorkerPool(number_of_worker_threads=4)
+        completed_tasks: List[int] = []
+        for task_number in range(100):
+            worker_pool.submit("same_file.txt", lambda task_number=task_number: completed_tasks.append(task_number))
+        worker_pool.shutdown()
+
+        assert completed_tasks == list(range(100))
+
+    @staticmethod
+    def test_tasks_with_different_keys_run_in_parallel() -> None:
+        worker_pool = KeyedWorkerPool(number_of_worker_threads=2)
+        slow_task_may_finish = threading.Event()
+        fast_task_finished = threading.Event()
+
+        def slow_task() -> None:
+            slow_task_may_finish.wait(timeout=5)
+
+        worker_pool.submit("slow_file.txt", slow_task)
+        worker_pool.submit("fast_file.txt", fast_task_finished.set)
+
+        assert fast_task_finished.wait(timeout=5), "Expected task for another file not to wait for the slow task"
+        slow_task_may_finish.set()
+        worker_pool.shutdown()
+
+    @staticmethod
+    def test_tasks_that_are_not_exclusive_run_in_parallel() -> None:
+        worker_pool = KeyedWorkerPool(number_of_worker_threads=2)
+        slow_read_may_finish = threading.Event()
+        fast_read_finished = threading.Event()
+
+        def slow_read() -> None:
+            slow_read_may_finish.wait(timeout=5)
+
+        worker_pool.submit("same_file.txt", slow_read, is_exclusive=False)
+        worker_pool.submit("same_file.txt", fast_read_finished.set, is_exclusive=False)
+
+        assert fast_read_finished.wait(timeout=5), "Expected a read not to wait for another read of the same file"
+        slow_read_may_finish.set()
+        worker_pool.shutdown()
+
+    @staticmethod
+    def test_exclusive_task_runs_alone() -> None:
+        worker_pool = KeyedWorkerPool(number_of_worker_threads=4)
+        slow_read_may_finish = threading.Event()
+        completed_tasks: List[str] = []
+
+        def slow_read() -> None:
+            slow_read_may_finish.wait(timeout=5)
+            completed_tasks.append("first read")
+
+        worker_pool.submit("same_file.txt", slow_read, is_exclusive=False)
+        worker_pool.submit("same_file.txt", lambda: completed_tasks.append("write"), is_exclusive=True)
+        worker_pool.submit("same_file.txt", lambda: completed_tasks.append("second read"), is_exclusive=False)
+        slow_read_may_finish.set()
+        worker_pool.shutdown()
+
+        assert completed_tasks == ["first read", "write", "second read"]
+
+    @staticmethod
+    def test_tasks_beyond_the_maximum_number_of_pending_tasks_are_rejected() -> None:
+        worker_pool = KeyedWorkerPool(number_of_worker_threads=1, maximum_number_of_pending_tasks=2)
+        slow_task_may_finish = threading.Event()
+        completed_tasks: List[str] = []
+
+        def slow_task() -> None:
+            slow_task_may_finish.wait(timeout=5)
+            completed_tasks.append("slow")
+
+        assert worker_pool.submit("slow_file.txt", slow_task)
+        assert worker_pool.submit("other_file.txt", lambda: completed_tasks.append("queued"))
+        assert not worker_pool.submit("third_file.txt", lambda: completed_tasks.append("rejected"))
+        slow_task_may_finish.set()
+        worker_pool.shutdown()
+
+        assert completed_tasks == ["slow", "queued"]